@@ -9,6 +9,7 @@ export default class DrawBoard {
       this.tempLineId = 'temp-line';
       this.billboards = [];
       this.currentBillboardIndex=-1;  //初始状态：无活动广告牌
+      this.billboardCount = 0;  // 已创建的广告牌数，用于生成广告牌id
       console.log(`DrawLine初始化完成: 广告牌高度=${billboardHeight}米, 距地面高度=${groundHeight}米`);
       this.initLayers();
     }
@@ -150,6 +151,8 @@ export default class DrawBoard {
             ]]
           },
           properties: {
+            // 广告牌唯一id，后端的曝光、遮挡和显示区域都以此关联到广告牌
+            billboard_id: `billboard-${Date.now().toString(36)}-${this.billboardCount++}`,
             base: this.groundHeight,
             height: this.groundHeight + this.billboardHeight,
             color: '#FF0000'  // 修改为红色
@@ -1,8 +1,18 @@
 class TimeAnalysis {
     static processTimeData(data){
+        //服务端 /gps-temporal 已按小时聚合,直接使用统计结果
+        if(data&&data.hourly){
+            return data.hourly.counts;
+        }
+
         //创建24小时的计数数组
         const hourCounts=new Array(24).fill(0);
 
+        //请求失败时返回的是错误信息对象,按无数据处理
+        if(!Array.isArray(data)){
+            return hourCounts;
+        }
+
         //遍历数据点
         data.forEach(point=>{
             try{
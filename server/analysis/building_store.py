@@ -0,0 +1,72 @@
+'''
+@zyh 2026-10-18
+进程内共享的建筑物数据
+启动时从geojson表加载一次,之后仅在表数据发生变化时重新加载
+对外提供只读的要素、高度和几何数组,供曝光分析使用
+'''
+from collections import namedtuple
+import json
+import time
+
+import numpy as np
+import shapely
+
+from analysis.spatial_index import BuildingIndex
+from analysis.table_store import TableStore
+
+# 一次加载得到的建筑物数据快照,重新加载时整体替换,保证读取方看到的数据一致
+BuildingSnapshot = namedtuple('BuildingSnapshot', [
+    'version',      # geojson表版本号
+    'features',     # GeoJSON要素(tuple)
+    'heights',      # 建筑物高度(米),只读float数组
+    'geometries',   # shapely几何对象,只读object数组
+    'footprints',   # 每个建筑物第一个多边形的外轮廓,只读(N,2)数组组成的tuple
+    'index',        # 建筑物空间索引(BuildingIndex)
+])
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+class BuildingStore(TableStore):
+    def __init__(self, check_interval=5.0):
+        super().__init__('geojson', check_interval)
+
+    def _load(self, db, version):
+        print("[INFO] 开始加载建筑物数据...")
+        start_time = time.time()
+        rows = db.fetch_geojson()
+
+        features = []
+        heights = np.zeros(len(rows), dtype=float)
+        footprints = []
+        for i, row in enumerate(rows):
+            geojson = json.loads(row['st_asgeojson'])
+            properties = row['properties']
+            features.append({
+                "type": "Feature",
+                "geometry": geojson,
+                "properties": properties
+            })
+            heights[i] = float(properties.get('height', 0) or 0)
+            footprints.append(_readonly(np.asarray(geojson['coordinates'][0][0], dtype=float)))
+
+        geometries = np.empty(len(rows), dtype=object)
+        geometries[:] = shapely.from_geojson([row['st_asgeojson'] for row in rows]) if rows else []
+
+        snapshot = BuildingSnapshot(
+            version=version,
+            features=tuple(features),
+            heights=_readonly(heights),
+            geometries=_readonly(geometries),
+            footprints=tuple(footprints),
+            index=BuildingIndex(features),
+        )
+        print(f"[SUCCESS] 成功加载 {len(features)} 个建筑物, 耗时: {time.time() - start_time:.2f} 秒")
+        return snapshot
+
+
+# 全局共享的建筑物数据
+building_store = BuildingStore()
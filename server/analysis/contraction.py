@@ -0,0 +1,283 @@
+'''
+@zyh 2026-10-18
+路网收缩层次(Contraction Hierarchies)预处理与多对多距离查询
+预处理: 按重要性依次收缩节点,必要时添加捷径边,最终只保留"低层节点 -> 高层节点"的向上边
+查询: 对每个终点做一次向上搜索并把距离记入途经节点的桶中,
+      再对每个起点做一次向上搜索,在途经节点的桶中取最小的 起点距离+终点距离
+预处理结果按路网版本保存到磁盘,路网未变化时直接读取
+'''
+import heapq
+import os
+import threading
+import time
+
+import numpy as np
+
+# 预处理结果保存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'db_data', 'cache')
+
+
+class ContractionHierarchy:
+    def __init__(self, rank, up_indptr, up_indices, up_weights, version=None):
+        '''
+        rank: 每个节点的收缩顺序(越大越重要)
+        up_indptr, up_indices, up_weights: CSR格式的向上边(包括捷径边),边权单位为米
+        '''
+        self.version = version
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weights = up_weights
+        self._indptr = up_indptr.tolist()
+        self._indices = up_indices.tolist()
+        self._weights = up_weights.tolist()
+
+    @property
+    def node_count(self):
+        return len(self.rank)
+
+    @classmethod
+    def build(cls, graph, witness_limit=60, version=None):
+        """
+        对路网做收缩预处理
+        graph: RoadGraph
+        witness_limit: 见证路径搜索最多访问的节点数,超出后直接添加捷径边(不影响正确性,只会多一些边)
+        """
+        print("[INFO] 开始路网收缩预处理...")
+        start_time = time.time()
+        n = graph.node_count
+        adj = [dict() for _ in range(n)]
+        for u in range(n):
+            for k in range(graph._indptr[u], graph._indptr[u + 1]):
+                adj[u][graph._indices[k]] = graph._weights[k]
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+
+        def witness_distances(source, excluded, max_dist):
+            """从source出发、绕开excluded节点的局部Dijkstra"""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < witness_limit:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > max_dist:
+                    break
+                settled += 1
+                for v, w in adj[u].items():
+                    if v == excluded or contracted[v]:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts_for(v):
+            """收缩节点v需要添加的捷径边 [(u, w, 长度)]"""
+            neighbors = list(adj[v].items())
+            shortcuts = []
+            for i, (u, w_uv) in enumerate(neighbors):
+                others = neighbors[i + 1:]
+                if not others:
+                    continue
+                max_dist = w_uv + max(w for _, w in others)
+                dist = witness_distances(u, v, max_dist)
+                for x, w_vx in others:
+                    length = w_uv + w_vx
+                    if dist.get(x, float('inf')) > length:
+                        shortcuts.append((u, x, length))
+            return shortcuts
+
+        def priority(v):
+            # 边差(新增捷径数 - 删除的边数) + 已收缩的邻居数,使收缩在路网中均匀推进
+            return len(shortcuts_for(v)) - len(adj[v]) + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+
+        rank = np.zeros(n, dtype=np.int64)
+        up_src, up_dst, up_weights = [], [], []
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # 延迟更新: 重新计算优先级,如果不再是最小的就放回队列
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, x, length in shortcuts_for(v):
+                if length < adj[u].get(x, float('inf')):
+                    adj[u][x] = length
+                    adj[x][u] = length
+
+            # 剩余邻居都比v晚收缩,v的当前边即为向上边
+            for u, w in adj[v].items():
+                up_src.append(v)
+                up_dst.append(u)
+                up_weights.append(w)
+                del adj[u][v]
+                deleted_neighbors[u] += 1
+            adj[v] = {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        up_src = np.asarray(up_src, dtype=np.int64)
+        order = np.argsort(up_src, kind='stable')
+        up_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(up_src, minlength=n), out=up_indptr[1:])
+        ch = cls(rank,
+                 up_indptr,
+                 np.asarray(up_dst, dtype=np.int64)[order],
+                 np.asarray(up_weights, dtype=float)[order],
+                 version)
+        print(f"[INFO] 收缩预处理完成: {n} 个节点, {len(up_src)} 条向上边, 耗时: {time.time() - start_time:.2f} 秒")
+        return ch
+
+    def save(self, path):
+        np.savez(path,
+                 version=np.array(str(self.version)),
+                 rank=self.rank,
+                 up_indptr=self.up_indptr,
+                 up_indices=self.up_indices,
+                 up_weights=self.up_weights)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['rank'], data['up_indptr'], data['up_indices'], data['up_weights'],
+                   str(data['version']))
+
+    def _upward_search(self, source):
+        """在向上边上做完整的Dijkstra,返回 {节点: 距离}"""
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def many_to_many(self, sources, targets):
+        """
+        计算多对多最短路径距离矩阵
+        sources, targets: 节点编号列表
+        返回: (len(sources), len(targets)) 距离矩阵(米),不可达为inf
+        """
+        buckets = {}
+        for j, target in enumerate(targets):
+            for v, d in self._upward_search(target).items():
+                buckets.setdefault(v, []).append((j, d))
+
+        matrix = np.full((len(sources), len(targets)), np.inf)
+        for i, source in enumerate(sources):
+            row = matrix[i]
+            for u, d in self._upward_search(source).items():
+                for j, dt in buckets.get(u, ()):
+                    if d + dt < row[j]:
+                        row[j] = d + dt
+        return matrix
+
+
+class ContractionHierarchyStore:
+    """
+    按路网快照缓存的收缩层次
+    收缩层次中的节点编号来自构建时使用的路网快照,只有版本与当前路网快照一致时才能使用,
+    因此总是由调用方传入的路网快照构建,不单独检查roads表版本
+    预处理耗时较长,不在请求中执行: 启动时或用 scripts/build_contraction.py 预先构建,
+    路网变化后在后台线程中重新构建,构建完成前get()返回None
+    """
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_path = os.path.join(cache_dir, 'road_ch.npz')
+        self._ch = None
+        self._building = None  # 正在后台构建的路网版本
+        self._cache_mtime = None  # 上次读取的预处理文件修改时间
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _matches(ch, graph):
+        return ch is not None and str(ch.version) == str(graph.version) and ch.node_count == graph.node_count
+
+    def _read_cache(self, graph):
+        """读取磁盘上与路网快照版本一致的预处理结果,文件未变化时不重复读取"""
+        try:
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return None
+        if mtime == self._cache_mtime:
+            return None
+        self._cache_mtime = mtime
+        try:
+            ch = ContractionHierarchy.load(self.cache_path)
+        except Exception as e:
+            print(f"[WARNING] 读取路网收缩预处理结果失败: {str(e)}")
+            return None
+        if not self._matches(ch, graph):
+            return None
+        print(f"[INFO] 从 {self.cache_path} 读取路网收缩预处理结果")
+        ch.version = graph.version
+        return ch
+
+    def get(self, graph):
+        """
+        返回由graph这一路网快照构建的收缩层次
+        尚未预处理时返回None,并在后台开始构建
+        """
+        with self._lock:
+            if not self._matches(self._ch, graph):
+                ch = self._read_cache(graph)
+                if ch is not None:
+                    self._ch = ch
+            if self._matches(self._ch, graph):
+                return self._ch
+            if self._building != graph.version:
+                self._building = graph.version
+                threading.Thread(target=self.build, args=(graph,), daemon=True).start()
+            return None
+
+    def build(self, graph):
+        """
+        由路网快照构建收缩层次并保存到磁盘,磁盘上已有相同版本的结果时直接读取
+        graph: RoadGraph
+        """
+        with self._lock:
+            if self._matches(self._ch, graph):
+                return self._ch
+            self._cache_mtime = None
+            ch = self._read_cache(graph)
+            if ch is not None:
+                self._ch = ch
+                return ch
+        try:
+            ch = ContractionHierarchy.build(graph, version=graph.version)
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                ch.save(self.cache_path)
+            except Exception as e:
+                print(f"[WARNING] 保存路网收缩预处理结果失败: {str(e)}")
+            with self._lock:
+                # 构建期间路网可能已经再次变化,只保留较新的结果
+                if self._building in (None, graph.version):
+                    self._ch = ch
+            return ch
+        finally:
+            with self._lock:
+                if self._building == graph.version:
+                    self._building = None
+
+
+# 全局共享的路网收缩层次
+contraction_store = ContractionHierarchyStore()
@@ -3,105 +3,334 @@
 曝光分析主要计算逻辑
 '''
 from config.database import Database
+from analysis.building_store import building_store
+from analysis.exposure_cache import BillboardResult, exposure_cache, billboard_fingerprint
+from analysis.parallel_occlusion import map_occlusions
+from analysis.visible_area import billboard_visible_area, combine
+from analysis.visibility_sweep import sweep_visible_area
 from analysis.geometry import calculate_billboard_direction, calculate_exposure_area, create_circle_polygon,calculate_IA_arc,create_IA_polygon,filter_buildings_in_circle
 
-import json
+import time
+
 import numpy as np
+from shapely.geometry import shape, mapping
+from shapely.ops import unary_union
+
+
+def _feature_collection(features):
+    return {
+        "type": "FeatureCollection",
+        "features": features
+    }
+
+
+def _visible_feature(geometry, **properties):
+    return {
+        "type": "Feature",
+        "geometry": mapping(geometry),
+        "properties": {
+            "type": "visible_area",
+            **properties
+        }
+    }
+
+
+def _visible_collection(geometry, **properties):
+    """显示区域几何转换为GeoJSON,与calculate_visible_area的输出格式一致"""
+    return _feature_collection([_visible_feature(geometry, **properties)])
+
+
+def _tag(features, billboard_id):
+    """复制要素并在properties中加入广告牌id,缓存中的要素不被修改"""
+    return [{**feature, "properties": {**feature['properties'], "billboard_id": billboard_id}}
+            for feature in features]
+
+
+def _group_by_billboard(features):
+    """按广告牌id建立要素索引: billboard_id -> 要素列表"""
+    index = {}
+    for feature in features:
+        index.setdefault(feature['properties'].get('billboard_id'), []).append(feature)
+    return index
+
+
+def _valid(geom):
+    """验证并修复几何图形"""
+    if not geom.is_valid:
+        print(f"[WARNING] 检测到无效几何图形，尝试修复...")
+        return geom.buffer(0)  # 使用buffer(0)修复几何图形
+    return geom
+
+
+def _same_circles(exposures, others):
+    """两组曝光圆形区域的圆心和半径是否一致"""
+    def circles(features):
+        return [(feature['properties'].get('center'), feature['properties'].get('radius')) for feature in features]
+    return circles(exposures) == circles(others)
+
 
 class ExposureAnalyzer:
-    def __init__(self):
+    def __init__(self, d=0.01, alpha=3, cache=exposure_cache, workers=1, occlusion_engine='polygon'):
+        '''
+        d, alpha: 曝光区域参数,见 calculate_exposure_area
+        cache: 单个广告牌结果的缓存,为None时不使用缓存
+        workers: 计算遮挡区域的进程数,1表示在当前进程中串行计算
+        occlusion_engine: 显示区域的计算方式
+            polygon 为每个建筑物生成弧形/投影遮挡多边形,合并后从曝光区域中扣除
+            sweep   对高于广告牌的建筑物做角度扫描直接得到可见多边形,只有投影遮挡仍生成多边形
+        '''
         self.db = Database()
         self.buildings = None
+        self.snapshot = None
+        self.d = d
+        self.alpha = alpha
+        self.cache = cache
+        self.workers = workers
+        self.occlusion_engine = occlusion_engine
     
     def load_buildings(self):
-        """加载建筑物geojson数据"""
+        """从进程内共享的建筑物数据中获取建筑物geojson数据"""
         try:
-            rows = self.db.fetch_geojson()
-            self.buildings = []
-            for row in rows:
-                geojson = json.loads(row['st_asgeojson'])  # 将GeoJSON字符串转换为Python字典
-                properties = row['properties']
-                feature = {
-                    "type": "Feature",
-                    "geometry": geojson,
-                    "properties": properties
-                }
-                self.buildings.append(feature)
+            self.snapshot = building_store.get(self.db)
+            self.buildings = self.snapshot.features
             return True
         except Exception as e:
             print(f"加载数据失败: {str(e)}")
             return False
 
 
+    @staticmethod
+    def billboard_features(billboards):
+        """
+        取出广告牌要素
+        billboards: 广告牌GeoJSON FeatureCollection,或前端保存的图层列表(id为billboards-3d的图层)
+        """
+        if isinstance(billboards, dict) and billboards.get('type') == 'FeatureCollection':
+            return list(billboards.get('features', []))
+        features = []
+        for billboard in billboards or []:
+            if billboard.get('id') == 'billboards-3d':
+                features.extend(billboard['data']['features'])
+        return features
+
+    @staticmethod
+    def billboard_id(feature, index):
+        """
+        广告牌id: 前端绘制时生成的properties.billboard_id,其次为要素id,
+        都没有时(旧数据)按在列表中的序号生成
+        """
+        billboard_id = feature.get('properties', {}).get('billboard_id') or feature.get('id')
+        return str(billboard_id) if billboard_id is not None else f"billboard-{index}"
+
+    @staticmethod
+    def billboard_position(feature):
+        """
+        计算广告牌的朝向基准顶点和中心点
+        OUTPUT:
+            (广告牌前两个顶点[[lon, lat], [lon, lat]],用于计算朝向; 中心点[lon, lat, 高度])
+        """
+        coords = feature['geometry']['coordinates'][0]
+        lons = [point[0] for point in coords]
+        lats = [point[1] for point in coords]
+        center_lon = sum(lons) / len(lons)
+        center_lat = sum(lats) / len(lats)
+        base_height = feature['properties']['base']
+        height = feature['properties']['height']
+        center_height = base_height + height/2
+        return [coords[0], coords[1]], [center_lon, center_lat, center_height]
+
+    @staticmethod
+    def exposure_features_for(billboard_coords, billboard_center, d=0.01, alpha=3):
+        """计算单个广告牌的曝光圆形区域要素"""
+        direction_vector = calculate_billboard_direction(billboard_coords)
+        exposure_area = calculate_exposure_area(billboard_center, direction_vector, d, alpha)
+        features = []
+        for circle in exposure_area:
+            center = [circle[0], circle[1]]
+            radius = circle[2]
+            polygon_coords = create_circle_polygon(center, radius)
+            features.append({
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [polygon_coords]  # 注意这里需要是嵌套数组
+                },
+                "properties": {
+                    "billboard_height": billboard_center[2],
+                    "radius": radius,
+                    "center": center,
+                    "type": "exposure_area"
+                }
+            })
+        return features
+
+    def buildings_in_exposure(self, exposure):
+        """筛选曝光圆形区域内的建筑物要素"""
+        buildings_geojson = {
+            "type": "FeatureCollection",
+            "features": self.buildings
+        }
+        building_index = self.snapshot.index if self.snapshot else None
+        circle_center = exposure['properties'].get('center',[])
+        circle_radius = exposure['properties'].get('radius',0)
+        return filter_buildings_in_circle(buildings_geojson,circle_center, circle_radius,index=building_index)['features']
+
+    @staticmethod
+    def occlusion_feature(billboard_center, building, circle_center, circle_radius):
+        """计算单个建筑物对广告牌造成的遮挡区域要素,没有遮挡时返回None"""
+        center_height = billboard_center[2]
+        building_height = float(building['properties'].get('height',0))
+        building_coords = building['geometry']['coordinates'][0][0]
+
+        #根据高度关系决定遮挡类型
+        if building_height > center_height:
+            #建筑物高于广告牌，计算弧形遮挡
+            occlusion_polygon=calculate_IA_arc(
+                billboard_center[:2],
+                building_coords,
+                circle_center,
+                circle_radius
+            )
+        else:
+            #建筑物低于广告牌，计算投影遮挡
+            occlusion_polygon=create_IA_polygon(
+                billboard_center,
+                building_coords,
+                building_height
+            )
+        if not occlusion_polygon:
+            return None
+        return {
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [occlusion_polygon]
+            },
+            "properties": {
+                "type": "occlusion_area",
+                "type_of_occlusion": "arc" if building_height > center_height else "projection"
+            }
+        }
+
+    def occlusion_features_for(self, billboard_center, exposure_features):
+        """计算单个广告牌在给定曝光圆形区域内的遮挡区域要素"""
+        features = []
+        for exposure in exposure_features:
+            circle_center = exposure['properties'].get('center',[])
+            circle_radius = exposure['properties'].get('radius',0)
+
+            #处理范围内的每个建筑物
+            for building in self.buildings_in_exposure(exposure):
+                feature = self.occlusion_feature(billboard_center, building, circle_center, circle_radius)
+                if feature is not None:
+                    features.append(feature)
+        return features
+
+    def occlusions_for_many(self, items):
+        """
+        计算多个广告牌的遮挡区域
+        items: [(广告牌中心点, 曝光要素列表)],返回与之一一对应的遮挡要素列表
+        workers大于1时把 广告牌×候选建筑物 的计算分配到进程池,结果与串行计算一致
+        """
+        if self.workers > 1 and self.snapshot is not None and self.snapshot.index is not None:
+            return map_occlusions(self, items, self.workers)
+        return [self.occlusion_features_for(billboard_center, exposures) for billboard_center, exposures in items]
+
+    @staticmethod
+    def visible_geometry(exposure_features, occlusion_features):
+        """曝光区域并集减去遮挡区域并集,返回shapely几何(不区分广告牌的原有算法)"""
+        exposure_union = _valid(unary_union([_valid(shape(feature['geometry'])) for feature in exposure_features]))
+        occlusion_union = _valid(unary_union([_valid(shape(feature['geometry'])) for feature in occlusion_features]))
+        intersection = _valid(exposure_union.intersection(occlusion_union))
+        return _valid(exposure_union.difference(intersection))
+
+    def fingerprint(self, feature):
+        """广告牌指纹,建筑物数据重新加载后指纹随之改变"""
+        version = self.snapshot.version if self.snapshot else None
+        return billboard_fingerprint(feature, self.d, self.alpha, version, self.occlusion_engine)
+
+    def billboard_results(self, features, timings=None):
+        '''
+        获取多个广告牌的分析结果,只有新增或修改过的广告牌才重新计算,
+        未命中缓存的广告牌一起计算遮挡区域(workers大于1时并行)
+        INPUT:
+            features: 广告牌要素列表
+            timings: 传入时累加 GEA/IA/VA 各阶段耗时(秒),VA_phases中为显示区域各步骤的耗时
+        OUTPUT:
+            (与features一一对应的BillboardResult列表, 重新计算的广告牌数)
+        '''
+        if timings is None:
+            timings = {"GEA": 0.0, "IA": 0.0, "VA": 0.0}
+        va_phases = timings.setdefault("VA_phases", {})
+        fingerprints = [self.fingerprint(feature) for feature in features]
+        if self.cache is not None:
+            entries = [self.cache.get(fingerprint) for fingerprint in fingerprints]
+        else:
+            entries = [None] * len(features)
+        misses = [i for i, entry in enumerate(entries) if entry is None]
+
+        start = time.perf_counter()
+        positions = [self.billboard_position(features[i]) for i in misses]
+        exposures = [self.exposure_features_for(billboard_coords, billboard_center, self.d, self.alpha)
+                     for billboard_coords, billboard_center in positions]
+        timings["GEA"] += time.perf_counter() - start
+
+        if self.occlusion_engine == 'sweep':
+            # 扫描同时得到遮挡和显示区域,耗时计入VA
+            start = time.perf_counter()
+            for i, (_, billboard_center), exposure_features in zip(misses, positions, exposures):
+                visible_area, occlusion_features = sweep_visible_area(self, billboard_center, exposure_features,
+                                                                      va_phases)
+                entries[i] = BillboardResult(fingerprints[i], exposure_features, occlusion_features, visible_area)
+                if self.cache is not None:
+                    self.cache.put(entries[i])
+            timings["VA"] += time.perf_counter() - start
+            return entries, len(misses)
+
+        start = time.perf_counter()
+        occlusions = self.occlusions_for_many([(billboard_center, exposure_features)
+                                               for (_, billboard_center), exposure_features in zip(positions, exposures)])
+        timings["IA"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i, exposure_features, occlusion_features in zip(misses, exposures, occlusions):
+            entries[i] = BillboardResult(fingerprints[i], exposure_features, occlusion_features,
+                                         billboard_visible_area(exposure_features, occlusion_features, va_phases))
+            if self.cache is not None:
+                self.cache.put(entries[i])
+        timings["VA"] += time.perf_counter() - start
+        return entries, len(misses)
+
+
     def calculate_GEA(self, billboards):
         """计算所有广告牌的GEA"""
         try:
             print("\n=== 开始计算曝光区域 ===")
             exposure_features = []
+            features = self.billboard_features(billboards)
+            print(f"\n[INFO] 正在处理 {len(features)} 个广告牌...")
             
-            for billboard in billboards:
-                if billboard.get('id') == 'billboards-3d':
-                    features = billboard['data']['features']
-                    print(f"\n[INFO] 正在处理 {len(features)} 个广告牌...")
-                    
-                    for i, feature in enumerate(features):
-                        print(f"\n--- 广告牌 {i+1}/{len(features)} ---")
-                        
-                        # 获取广告牌坐标
-                        coords = feature['geometry']['coordinates'][0]
-                        billboard_coords = [coords[0], coords[1]]
-                        print(f"[DEBUG] 广告牌坐标: {billboard_coords}")
-                        
-                        # 计算中心点和高度
-                        lons = [point[0] for point in coords]
-                        lats = [point[1] for point in coords]
-                        center_lon = sum(lons) / len(lons)
-                        center_lat = sum(lats) / len(lats)
-                        base_height = feature['properties']['base']
-                        height = feature['properties']['height']
-                        center_height = base_height + height/2
-                        print(f"[DEBUG] 中心点: ({center_lon}, {center_lat}), 高度: {center_height}")
-                        
-                        # 计算方向向量
-                        try:
-                            direction_vector = calculate_billboard_direction(
-                                billboard_coords
-                            )
-                            print(f"[SUCCESS] 方向向量计算完成: {direction_vector}")
-                        except Exception as e:
-                            print(f"[ERROR] 方向向量计算失败: {str(e)}")
-                            continue
-                        
-                        # 计算曝光区域
-                        try:
-                            billboard_center = [center_lon, center_lat, center_height]
-                            exposure_area = calculate_exposure_area(
-                                billboard_center, 
-                                direction_vector
-                            )
-                            print(f"[SUCCESS] 曝光区域计算完成: {exposure_area}")
-                        except Exception as e:
-                            print(f"[ERROR] 曝光区域计算失败: {str(e)}")
-                            continue
-                        
-                        # 添加到特征集合
-                        for circle in exposure_area:
-                            center = [circle[0], circle[1]]
-                            radius = circle[2]
-                            polygon_coords = create_circle_polygon(center, radius)
-                            exposure_features.append({
-                                "type": "Feature",
-                                "geometry": {
-                                    "type": "Polygon",
-                                    "coordinates": [polygon_coords]  # 注意这里需要是嵌套数组
-                                },
-                                "properties": {
-                                    "billboard_height": center_height,
-                                    "radius": radius,
-                                    "center": center,
-                                    "type": "exposure_area"
-                                }
-                            })
+            for i, feature in enumerate(features):
+                print(f"\n--- 广告牌 {i+1}/{len(features)} ---")
+                billboard_id = self.billboard_id(feature, i)
+                billboard_coords, billboard_center = self.billboard_position(feature)
+                print(f"[DEBUG] 广告牌坐标: {billboard_coords}")
+                print(f"[DEBUG] 中心点: ({billboard_center[0]}, {billboard_center[1]}), 高度: {billboard_center[2]}")
+                
+                # 已缓存的广告牌直接使用缓存的曝光区域
+                cached = self.cache.get(self.fingerprint(feature)) if self.cache is not None else None
+                if cached is not None:
+                    exposure_features.extend(_tag(cached.exposure_features, billboard_id))
+                    continue
+
+                # 计算方向向量和曝光区域
+                try:
+                    exposure_features.extend(_tag(
+                        self.exposure_features_for(billboard_coords, billboard_center, self.d, self.alpha),
+                        billboard_id))
+                except Exception as e:
+                    print(f"[ERROR] 曝光区域计算失败: {str(e)}")
+                    continue
             
             print(f"\n[SUCCESS] 成功生成 {len(exposure_features)} 个曝光区域")
             print("=== 计算完成 ===\n")
@@ -130,77 +359,29 @@ class ExposureAnalyzer:
                 print("[ERROR] 建筑物数据未加载")
                 return None
 
-            #建筑物geojson数据
-            buildings_geojson = {
-                "type": "FeatureCollection",
-                "features": self.buildings
-            }
-            
             #遍历广告牌
-            for billboard in billboards:
-                if billboard.get('id') == 'billboards-3d':
-                    features = billboard['data']['features']
-                    print(f"\n[INFO] 正在处理 {len(features)} 个广告牌的遮挡区域...")
-                    for i, feature in enumerate(features):
-                        print(f"\n--- 广告牌 {i+1}/{len(features)} ---")
-                        #获取广告牌信息
-                        coords = feature['geometry']['coordinates'][0]
-                        base_height = feature['properties']['base']
-                        height = feature['properties']['height']
-                        #计算广告牌中心点和高度
-                        lons = [point[0] for point in coords]
-                        lats = [point[1] for point in coords]
-                        center_lon = sum(lons) / len(lons)
-                        center_lat = sum(lats) / len(lats)
-                        center_height = base_height + height/2
-                        billboard_center = [center_lon, center_lat, center_height]
-                        billboard_xy=billboard_center[:2]
-                        
-                        #获取对应的曝光区域
-                        for exposure in exposure_geojson['features']:
-                            if exposure['properties'].get('billboard_height',0) == center_height:  #根据高度相同筛选广告牌对应GEA
-                                circle_center = exposure['properties'].get('center',[])
-                                circle_radius = exposure['properties'].get('radius',0)
-                                
-                                #筛选范围内的建筑物
-                                buildings_in_circle = filter_buildings_in_circle(buildings_geojson,circle_center, circle_radius)
-
-                                #处理每个建筑物
-                                for building in buildings_in_circle['features']:
-                                    building_height = building['properties'].get('height',0)
-                                    building_height=float(building_height)
-                                    building_coords = building['geometry']['coordinates'][0][0]
-
-                                    #根据高度关系决定遮挡类型
-                                    if building_height > center_height:
-                                        #建筑物高于广告牌，计算弧形遮挡
-                                        occlusion_polygon=calculate_IA_arc(
-                                            billboard_xy,
-                                            building_coords,
-                                            circle_center,
-                                            circle_radius
-                                        )
-                                    else:
-                                        #建筑物低于广告牌，计算投影遮挡
-                                        occlusion_polygon=create_IA_polygon(
-                                            billboard_center,
-                                            building_coords,
-                                            building_height
-                                        )
-
-                                    #添加遮挡多边形到结果中
-                                    if occlusion_polygon:
-                                        occlusion_features.append({
-                                            "type": "Feature",
-                                            "geometry": {
-                                                "type": "Polygon",
-                                                "coordinates": [occlusion_polygon]
-                                            },
-                                            "properties": {
-                                                "type": "occlusion_area",
-                                                "type_of_occlusion": "arc" if building_height > center_height else "projection"
-                                            }
-                                        })
+            features = self.billboard_features(billboards)
+            exposure_index = _group_by_billboard(exposure_geojson['features'])
+            print(f"\n[INFO] 正在处理 {len(features)} 个广告牌的遮挡区域...")
+
+            #按广告牌id获取对应的曝光区域,只计算遮挡区域,显示区域由 /VA 和 analyze 计算
+            #缓存中有该广告牌且曝光区域一致时直接使用缓存的遮挡区域(角度扫描的缓存只有投影遮挡,不能使用)
+            billboard_ids = [self.billboard_id(feature, i) for i, feature in enumerate(features)]
+            exposures = [exposure_index.get(billboard_id, []) for billboard_id in billboard_ids]
+            occlusions = [None] * len(features)
+            if self.cache is not None and self.occlusion_engine == 'polygon':
+                for i, feature in enumerate(features):
+                    cached = self.cache.get(self.fingerprint(feature))
+                    if cached is not None and _same_circles(exposures[i], cached.exposure_features):
+                        occlusions[i] = cached.occlusion_features
+            misses = [i for i, occlusion in enumerate(occlusions) if occlusion is None]
+            computed = self.occlusions_for_many([(self.billboard_position(features[i])[1], exposures[i])
+                                                 for i in misses])
+            for i, occlusion in zip(misses, computed):
+                occlusions[i] = occlusion
+            print(f"[INFO] 重新计算 {len(misses)} 个广告牌, {len(features) - len(misses)} 个使用缓存结果")
+            for billboard_id, occlusion in zip(billboard_ids, occlusions):
+                occlusion_features.extend(_tag(occlusion, billboard_id))
             print(f"[SUCCESS] 成功生成 {len(occlusion_features)} 个遮挡区域")
             print("=== 计算完成 ===\n")
             return {
@@ -217,52 +398,90 @@ class ExposureAnalyzer:
             return None
 
 
-    def calculate_visible_area(self, exposure_geojson, occlusion_geojson):
+    def cached_billboard_results(self, billboards, exposure_index, occlusion_index, timings=None):
+        '''
+        按广告牌获取显示区域,缓存中有该广告牌且曝光区域一致时直接使用缓存的显示区域,
+        其余广告牌用传入的曝光和遮挡区域计算后写入缓存
+        没有曝光区域的广告牌(曝光区域计算后新增的广告牌)不参与计算
+        OUTPUT:
+            (BillboardResult列表, 对应的广告牌id列表, 重新计算的广告牌数)
+        '''
+        entries, billboard_ids = [], []
+        computed = 0
+        for i, feature in enumerate(self.billboard_features(billboards)):
+            billboard_id = self.billboard_id(feature, i)
+            exposures = exposure_index.get(billboard_id, [])
+            if not exposures:
+                continue
+            fingerprint = self.fingerprint(feature)
+            entry = self.cache.get(fingerprint)
+            if entry is None or not _same_circles(exposures, entry.exposure_features):
+                occlusions = occlusion_index.get(billboard_id, [])
+                entry = BillboardResult(fingerprint, exposures, occlusions,
+                                        billboard_visible_area(exposures, occlusions, timings))
+                self.cache.put(entry)
+                computed += 1
+            entries.append(entry)
+            billboard_ids.append(billboard_id)
+        return entries, billboard_ids, computed
+
+    def calculate_visible_area(self, exposure_geojson, occlusion_geojson, by_billboard=False, engine='global',
+                               billboards=None):
         '''
         计算显示区域
         INPUT:
             exposure_geojson: 曝光区域的GeoJSON数据 (FeatureCollection)
             occlusion_geojson: 遮挡区域的GeoJSON数据 (FeatureCollection)
+            by_billboard: 是否返回每个广告牌各自的显示区域
+            engine: global(默认) 原有算法,全部曝光区域的并集减去全部遮挡区域的并集;
+                    billboard 按广告牌id分组,每个广告牌的曝光区域只减去裁剪到其中的自己的遮挡区域,再合并
+                    by_billboard为True时总是按广告牌分组计算
+            billboards: engine为billboard时传入当前的广告牌图层,使用分析结果缓存:
+                        未变化的广告牌直接使用缓存的显示区域,只计算新增或修改过的广告牌,并用缓存的并集树合并;
+                        需先调用load_buildings,指纹中包含建筑物数据版本
         OUTPUT:
             visible_area: 显示区域的GeoJSON数据 (FeatureCollection)
+                by_billboard为False时只有一个要素,properties.billboard_ids为参与计算的广告牌
+                by_billboard为True时每个广告牌一个要素,properties.billboard_id为对应广告牌
         '''
         try:
             print("\n--- 计算显示区域 ---")
-            from shapely.geometry import shape, mapping
-            from shapely.ops import unary_union
-            
-            # 验证并修复几何图形
-            def validate_and_fix_geometry(geom):
-                if not geom.is_valid:
-                    print(f"[WARNING] 检测到无效几何图形，尝试修复...")
-                    return geom.buffer(0)  # 使用buffer(0)修复几何图形
-                return geom
-
-            # 处理曝光区域
-            exposure_shapes = [validate_and_fix_geometry(shape(feature['geometry'])) 
-                             for feature in exposure_geojson['features']]
-            exposure_union = validate_and_fix_geometry(unary_union(exposure_shapes))
-            
-            # 处理遮挡区域
-            occlusion_shapes = [validate_and_fix_geometry(shape(feature['geometry'])) 
-                              for feature in occlusion_geojson['features']]
-            occlusion_union = validate_and_fix_geometry(unary_union(occlusion_shapes))
-            
-            # 计算交集和差集
-            intersection = validate_and_fix_geometry(exposure_union.intersection(occlusion_union))
-            visible_area = validate_and_fix_geometry(exposure_union.difference(intersection))
+            exposure_index = _group_by_billboard(exposure_geojson['features'])
+            if engine == 'global' and not by_billboard:
+                visible_area = self.visible_geometry(exposure_geojson['features'], occlusion_geojson['features'])
+            elif billboards is not None and self.cache is not None and not by_billboard:
+                timings = {}
+                occlusion_index = _group_by_billboard(occlusion_geojson['features'])
+                entries, billboard_ids, computed = self.cached_billboard_results(
+                    billboards, exposure_index, occlusion_index, timings)
+                print(f"[INFO] 重新计算 {computed} 个广告牌, {len(entries) - computed} 个使用缓存结果")
+                start = time.perf_counter()
+                visible_area = self.cache.union(entries) if entries else None
+                timings["combine"] = timings.get("combine", 0.0) + time.perf_counter() - start
+                print("[INFO] 显示区域各阶段耗时: " +
+                      ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in timings.items()))
+                print(f"[SUCCESS] 显示区域计算完成")
+                if visible_area is None:
+                    return _feature_collection([])
+                return _visible_collection(visible_area, billboard_ids=billboard_ids)
+            else:
+                timings = {}
+                occlusion_index = _group_by_billboard(occlusion_geojson['features'])
+                areas = {billboard_id: billboard_visible_area(exposures, occlusion_index.get(billboard_id, []), timings)
+                         for billboard_id, exposures in exposure_index.items()}
+                if by_billboard:
+                    result_geojson = _feature_collection([
+                        _visible_feature(area, billboard_id=billboard_id) for billboard_id, area in areas.items()
+                    ])
+                    print(f"[SUCCESS] {len(result_geojson['features'])} 个广告牌的显示区域计算完成")
+                    return result_geojson
+                visible_area = combine(list(areas.values()), timings)
+                print("[INFO] 显示区域各阶段耗时: " +
+                      ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in timings.items()))
             
             # 转换结果为GeoJSON格式
-            result_geojson = {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "geometry": mapping(visible_area),
-                    "properties": {
-                        "type": "visible_area"
-                    }
-                }]
-            }
+            billboard_ids = [billboard_id for billboard_id in exposure_index if billboard_id is not None]
+            result_geojson = _visible_collection(visible_area, billboard_ids=billboard_ids)
             
             print(f"[SUCCESS] 显示区域计算完成")
             return result_geojson
@@ -273,3 +492,73 @@ class ExposureAnalyzer:
             print(f"[ERROR] 错误信息: {str(e)}")
             print(f"[ERROR] 位置: {e.__traceback__.tb_frame.f_code.co_filename}:{e.__traceback__.tb_lineno}")
             raise e
+
+
+    def analyze(self, billboards, gps_analyzer=None, gps_engine='postgis', start_time=None, end_time=None):
+        '''
+        一次完成 GEA -> IA -> VA -> GPS计数 的曝光分析,所有广告牌共用已加载的建筑物数据和空间索引
+        每个广告牌的遮挡只在自己的曝光区域内计算,未变化的广告牌直接使用缓存结果,
+        显示区域并集也只重新合并发生变化的部分
+        INPUT:
+            billboards: 广告牌FeatureCollection或前端保存的图层列表
+            gps_analyzer: GPSAnalyzer,为None时不统计GPS点
+            gps_engine: postgis / memory,GPS计数使用的引擎
+            start_time, end_time: GPS计数的时间窗口
+        OUTPUT:
+            {
+                "billboards": [{"index", "billboard_id", "properties", "GEA", "IA", "VA", "gps"}],  每个广告牌的结果
+                "union": {"GEA", "IA", "VA", "gps"},                               全部广告牌合并的结果
+                "timings": 各阶段耗时(毫秒),VA_phases为显示区域计算各步骤的耗时,
+                "cache": {"hits", "computed"}  使用缓存和重新计算的广告牌数
+            }
+        '''
+        if not self.buildings and not self.load_buildings():
+            raise RuntimeError("加载建筑物数据失败")
+        timings = {"GEA": 0.0, "IA": 0.0, "VA": 0.0}
+        features = self.billboard_features(billboards)
+        entries, computed = self.billboard_results(features, timings)
+        cache_counts = {"hits": len(features) - computed, "computed": computed}
+
+        results = []
+        for i, (feature, entry) in enumerate(zip(features, entries)):
+            billboard_id = self.billboard_id(feature, i)
+            results.append({
+                "index": i,
+                "billboard_id": billboard_id,
+                "properties": feature.get('properties', {}),
+                "GEA": _feature_collection(_tag(entry.exposure_features, billboard_id)),
+                "IA": _feature_collection(_tag(entry.occlusion_features, billboard_id)),
+                "VA": _visible_collection(entry.visible_area, billboard_id=billboard_id),
+            })
+        visible_areas = [entry.visible_area for entry in entries]
+
+        start = time.perf_counter()
+        if self.cache is not None:
+            union_area = self.cache.union(entries)
+        else:
+            union_area = combine(visible_areas, timings["VA_phases"]) if visible_areas else None
+        timings["VA"] += time.perf_counter() - start
+        union = {
+            "GEA": _feature_collection([f for result in results for f in result["GEA"]["features"]]),
+            "IA": _feature_collection([f for result in results for f in result["IA"]["features"]]),
+            "VA": (_visible_collection(union_area, billboard_ids=[result["billboard_id"] for result in results])
+                   if union_area is not None else _feature_collection([])),
+        }
+
+        if gps_analyzer is not None and union_area is not None:
+            start = time.perf_counter()
+            # 各广告牌的显示区域和并集一起计数,并集内的点不会因区域重叠被重复计算
+            counts = gps_analyzer.count_in_areas(visible_areas + [union_area], start_time, end_time, gps_engine)
+            for result, count in zip(results, counts):
+                result["gps"] = count
+            union["gps"] = counts[-1]
+            timings["GPS"] = time.perf_counter() - start
+
+        return {
+            "billboards": results,
+            "union": union,
+            "timings": {name: ({phase: round(value * 1000, 1) for phase, value in seconds.items()}
+                               if isinstance(seconds, dict) else round(seconds * 1000, 1))
+                        for name, seconds in timings.items()},
+            "cache": cache_counts,
+        }
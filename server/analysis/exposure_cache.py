@@ -0,0 +1,141 @@
+'''
+@zyh 2026-10-18
+广告牌曝光分析结果缓存
+每个广告牌的曝光圆形区域、遮挡区域和显示区域按"指纹"缓存,指纹由广告牌坐标、底高、高度、
+曝光参数alpha/d和建筑物数据版本计算,超出条目上限时按LRU淘汰。
+多个广告牌显示区域的并集用按2的幂对齐的二叉树合并,每个节点的结果按其覆盖的指纹序列缓存,
+只移动或新增少量广告牌时只需重新合并从变化的叶子到根的路径
+'''
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import threading
+
+from shapely.ops import unary_union
+
+# 单个广告牌的分析结果
+BillboardResult = namedtuple('BillboardResult', [
+    'fingerprint',          # 广告牌指纹
+    'exposure_features',    # 曝光圆形区域要素列表
+    'occlusion_features',   # 遮挡区域要素列表
+    'visible_area',         # 显示区域(shapely几何)
+])
+
+
+def billboard_fingerprint(feature, d, alpha, building_version=None, engine='polygon'):
+    """根据广告牌几何、底高、高度、曝光参数、建筑物数据版本和显示区域计算方式计算指纹"""
+    properties = feature.get('properties', {})
+    key = json.dumps([
+        feature['geometry']['coordinates'],
+        properties.get('base'),
+        properties.get('height'),
+        d,
+        alpha,
+        str(building_version),
+        engine,
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class ExposureCache:
+    def __init__(self, max_entries=1000):
+        '''
+        max_entries: 缓存的广告牌结果数上限
+        '''
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # 并集树节点: 覆盖的指纹序列 -> 显示区域并集,只保留最近一次合并用到的节点
+        self._unions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "union_reused": 0, "union_computed": 0}
+
+    def get(self, fingerprint):
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, result):
+        with self._lock:
+            self._entries[result.fingerprint] = result
+            self._entries.move_to_end(result.fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return result
+
+    def union(self, results):
+        '''
+        合并各广告牌的显示区域
+        results: BillboardResult列表,顺序决定并集树中的位置
+        OUTPUT:
+            显示区域并集(shapely几何)
+        '''
+        fingerprints = tuple(result.fingerprint for result in results)
+        areas = [result.visible_area for result in results]
+        with self._lock:
+            previous = self._unions
+        current = {}
+        counts = {"union_reused": 0, "union_computed": 0}
+
+        def build(lo, hi):
+            # 节点覆盖 [lo, hi) 的叶子,区间按2的幂对齐,在末尾新增广告牌不会改变已有节点
+            if lo >= len(areas):
+                return None
+            key = fingerprints[lo:min(hi, len(areas))]
+            if key in current:
+                return current[key]
+            if key in previous:
+                counts["union_reused"] += 1
+                geometry = previous[key]
+            elif hi - lo == 1:
+                geometry = areas[lo]
+            else:
+                mid = (lo + hi) // 2
+                children = [child for child in (build(lo, mid), build(mid, hi)) if child is not None]
+                counts["union_computed"] += 1
+                geometry = unary_union(children)
+                if not geometry.is_valid:
+                    geometry = geometry.buffer(0)
+            current[key] = geometry
+            return geometry
+
+        size = 1
+        while size < len(areas):
+            size *= 2
+        geometry = build(0, size) if areas else None
+
+        # 复用的节点没有访问其子节点,从上一次的结果中保留仍属于当前并集树的子节点
+        width = 2
+        while width <= size:
+            for lo in range(0, len(areas), width):
+                key = fingerprints[lo:lo + width]
+                if key not in current and key in previous:
+                    current[key] = previous[key]
+            width *= 2
+        with self._lock:
+            self._unions = current
+            for name, count in counts.items():
+                self._stats[name] += count
+        return geometry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._unions = {}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["union_nodes"] = len(self._unions)
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+# 全局共享的广告牌分析结果缓存
+exposure_cache = ExposureCache()
@@ -2,6 +2,8 @@
 @zyh 2024-11-17
 几何计算相关函数
 '''
+import numpy as np
+
 
 def calculate_exposure_area(billboard_center, direction_vector, d=0.01, alpha=3):
     '''
@@ -19,7 +21,6 @@ def calculate_exposure_area(billboard_center, direction_vector, d=0.01, alpha=3)
         print(f"[INPUT] 广告牌中心点: {billboard_center}")
         print(f"[INPUT] 方向向量: {direction_vector}")
         
-        import numpy as np
         exposure_area = []
         alpha = alpha*np.pi/180/3600
         
@@ -73,8 +74,6 @@ def calculate_billboard_direction(billboard_coords):
         print("\n--- 计算广告牌方向 ---")
         print(f"[INPUT] 广告牌坐标: {billboard_coords}")
         
-        import numpy as np
-        
         # 提取坐标点
         lon1, lat1 = billboard_coords[0]
         lon2, lat2 = billboard_coords[1]
@@ -113,40 +112,55 @@ def calculate_billboard_direction(billboard_coords):
 
 def create_circle_polygon(center, radius, num_points=64):
     """创建圆形多边形"""
-    import math
-    coordinates = []
-    for i in range(num_points):
-        angle = (i * 2 * math.pi) / num_points
-        dx = radius * math.cos(angle)
-        dy = radius * math.sin(angle)
-        # 由于经纬度不是等距的，需要进行调整
-        lat = center[1] + (dy / 111000)  # 1度纬度约等于111km
-        lon = center[0] + (dx / (111000 * math.cos(math.radians(center[1]))))
-        coordinates.append([lon, lat])
+    angles = np.arange(num_points) * 2 * np.pi / num_points
+    points = points_at_distance(center[0], center[1], angles, radius)
+    coordinates = points.tolist()
     coordinates.append(coordinates[0])  # 闭合多边形
     return coordinates
 
 
-def haversine_distance(lon1, lat1, lon2, lat2):
+def points_at_distance(center_lon, center_lat, angles, distance):
     """
-    计算两个经纬度点之间的距离(单位:米)
+    从中心点出发，给定角度数组和距离(米)，批量计算目标点的经纬度
+    angles: 弧度数组，相对于正东方向
+    distance: 距离(米)，标量或与angles等长的数组
+    返回: (N,2)数组 [[lon, lat], ...]
+    """
+    angles = np.asarray(angles, dtype=float)
+    # 纬度方向上1度对应的距离约为111000米
+    # 经度方向上1度对应的距离需要根据纬度进行调整
+    lat = center_lat + (distance * np.sin(angles)) / 111000
+    lon = center_lon + (distance * np.cos(angles)) / (111000 * np.cos(np.radians(center_lat)))
+    return np.column_stack([lon, lat])
+
+
+def haversine_distances(lon1, lat1, lon2, lat2):
+    """
+    批量计算经纬度点之间的距离(单位:米)，参数可以是标量或数组(按numpy规则广播)
     使用 Haversine 公式计算球面两点间的距离
     """
-    import math
     R = 6371000  # 地球平均半径(米)
     
     # 将经纬度转换为弧度
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
     
     # haversine 公式
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
     return R * c
 
 
-def filter_buildings_in_circle(geojson_data,circle_center,circle_radius):
+def haversine_distance(lon1, lat1, lon2, lat2):
+    """
+    计算两个经纬度点之间的距离(单位:米)
+    haversine_distances 的标量版本
+    """
+    return float(haversine_distances(lon1, lat1, lon2, lat2))
+
+
+def filter_buildings_in_circle(geojson_data,circle_center,circle_radius,index=None):
     """
     筛选圆形范围内的建筑物
     
@@ -154,6 +168,7 @@ def filter_buildings_in_circle(geojson_data,circle_center,circle_radius):
     geojson_data: GeoJSON 数据字典
     circle_center: 圆心坐标，格式为 [lon, lat]
     circle_radius: 圆形半径(米)
+    index: 基于geojson_data["features"]建立的BuildingIndex(可选),传入时使用空间索引查询
     
     返回:
     包含在圆形范围内建筑物的新 GeoJSON 数据
@@ -167,6 +182,13 @@ def filter_buildings_in_circle(geojson_data,circle_center,circle_radius):
         "type": "FeatureCollection",
         "features": []
     }
+
+    # 使用空间索引: 外包矩形粗筛 + 顶点距离精确判断
+    if index is not None:
+        result["features"] = [geojson_data["features"][i]
+                              for i in index.query_circle(circle_center, circle_radius)]
+        print(f"[SUCCESS] 筛选完成,共找到 {len(result['features'])} 个圆内建筑物")
+        return result
     
     # 遍历所有建筑物
     total_buildings = len(geojson_data["features"])
@@ -201,6 +223,32 @@ def filter_buildings_in_circle(geojson_data,circle_center,circle_radius):
     return result
 
 
+def calculate_ground_intersections(billboard_pos,building_vertices,height):
+    '''
+    批量计算广告牌视线经过建筑物顶点与地面的交点
+    INPUT:
+        billboard_pos: 广告牌位置，格式为 [x, y, z]
+        building_vertices: 建筑物顶点，(N,2)数组 [[x,y],[x,y],...]
+        height: 建筑物高度
+    OUTPUT:
+        ground_points: 地面交点，(N,2)数组
+    '''
+    #广告牌坐标
+    x1,y1,z1 = billboard_pos
+    #建筑物顶点坐标
+    vertices = np.asarray(building_vertices, dtype=float).reshape(-1, 2)
+    z2 = height
+    if z1 == z2:
+        z2=z2-1  # 防止建筑物顶点在广告牌正下方,导致视线与建筑物顶点重合
+    #参数方程：P(t) = P1 + t*(P2-P1)
+    #当z=0时求解t
+    t = -z1/(z2-z1)
+    #地面交点坐标
+    x = x1 + t*(vertices[:, 0]-x1)
+    y = y1 + t*(vertices[:, 1]-y1)
+    return np.column_stack([x, y])
+
+
 def calculate_ground_intersection(billboard_pos,building_vertex,height):
     '''
     计算广告牌视线经过建筑物顶点与地面的交点
@@ -212,20 +260,7 @@ def calculate_ground_intersection(billboard_pos,building_vertex,height):
         ground_point: 地面交点，格式为 [x, y]
     '''
     try:
-        #广告牌坐标
-        x1,y1,z1 = billboard_pos
-        #建筑物顶点坐标
-        x2,y2 = building_vertex
-        z2 = height
-        if z1 == z2:
-            z2=z2-1  # 防止建筑物顶点在广告牌正下方,导致视线与建筑物顶点重合
-        #参数方程：P(t) = P1 + t*(P2-P1)
-        #当z=0时求解t
-        t = -z1/(z2-z1)
-        #地面交点坐标
-        x = x1 + t*(x2-x1)
-        y = y1 + t*(y2-y1)
-        return [x,y]
+        return calculate_ground_intersections(billboard_pos, [building_vertex], height)[0].tolist()
     except Exception as e:
         print("\n[ERROR] 地面交点计算失败")
         print(f"[ERROR] 错误类型: {type(e).__name__}")
@@ -244,43 +279,27 @@ def create_IA_polygon(billboard_pos, building_vertices, height):
         occlusion_polygon: 遮挡多边形，格式为 [[x,y],[x,y],[x,y]]
     '''
     try:
-        import numpy as np
+        vertices = np.asarray(building_vertices, dtype=float).reshape(-1, 2)
+        billboard_xy = np.array(billboard_pos[:2], dtype=float)
         
         # 计算所有地面交点
-        points_data = []
-        billboard_xy = np.array(billboard_pos[:2])
-        
-        for vertex in building_vertices:
-            ground_point = calculate_ground_intersection(billboard_pos, vertex, height)
-            
-            # 计算从广告牌到顶点和地面点的向量
-            vertex_vector = np.array(vertex) - billboard_xy
-            ground_vector = np.array(ground_point) - billboard_xy
-            
-            # 计算向量的角度（相对于x轴正方向）
-            vertex_angle = np.arctan2(vertex_vector[1], vertex_vector[0])
-            ground_angle = np.arctan2(ground_vector[1], ground_vector[0])
-            
-            points_data.append({
-                'vertex': vertex,
-                'ground_point': ground_point,
-                'vertex_angle': vertex_angle,
-                'ground_angle': ground_angle
-            })
+        ground_points = calculate_ground_intersections(billboard_pos, vertices, height)
         
-        # 按角度排序
-        points_data.sort(key=lambda x: x['ground_angle'])
+        # 计算从广告牌到顶点和地面点的向量角度（相对于x轴正方向）
+        vertex_vectors = vertices - billboard_xy
+        ground_vectors = ground_points - billboard_xy
+        vertex_angles = np.arctan2(vertex_vectors[:, 1], vertex_vectors[:, 0])
+        ground_angles = np.arctan2(ground_vectors[:, 1], ground_vectors[:, 0])
         
-        # 构建多边形
-        polygon_coords = []
+        # 按角度排序(稳定排序)
+        order = np.argsort(ground_angles, kind='stable')
+        ground_points = ground_points[order]
+        vertices = vertices[order]
+        vertex_angles = vertex_angles[order]
         
-        # 添加所有地面点
-        for point_data in points_data:
-            polygon_coords.append(point_data['ground_point'])
-        
-        # 添加所有建筑物顶点（按角度逆序）
-        for point_data in sorted(points_data, key=lambda x: x['vertex_angle'], reverse=True):
-            polygon_coords.append(point_data['vertex'])
+        # 构建多边形：所有地面点 + 所有建筑物顶点（按角度逆序）
+        reverse_order = np.argsort(-vertex_angles, kind='stable')
+        polygon_coords = ground_points.tolist() + vertices[reverse_order].tolist()
             
         # 闭合多边形
         polygon_coords.append(polygon_coords[0])
@@ -305,98 +324,52 @@ def calculate_IA_arc(billboard_pos, building_points, circle_center, circle_radiu
     OUTPUT:
         occlusion_polygon: 遮挡多边形，格式为 [[lon,lat],[lon,lat],...]
     '''
-    import numpy as np
     try:
-        def get_point_at_distance(center_lon, center_lat, angle, distance):
-            """
-            从中心点出发，给定角度和距离(米)，计算目标点的经纬度
-            angle: 弧度，相对于正东方向
-            """
-            # 纬度方向上1度对应的距离约为111000米
-            # 经度方向上1度对应的距离需要根据纬度进行调整
-            lat_offset = (distance * np.sin(angle)) / 111000
-            lon_offset = (distance * np.cos(angle)) / (111000 * np.cos(np.radians(center_lat)))
-            return [center_lon + lon_offset, center_lat + lat_offset]
+        points = np.asarray(building_points, dtype=float).reshape(-1, 2)
+        lon0, lat0 = billboard_pos[0], billboard_pos[1]
 
-        arc_points = []
-        # 计算每个建筑物点对应的射线与圆的交点
-        for building_point in building_points:
-            # 计算广告牌到建筑物点的方向角度
-            dx = haversine_distance(billboard_pos[0], billboard_pos[1], 
-                                  building_point[0], billboard_pos[1])
-            dy = haversine_distance(billboard_pos[0], billboard_pos[1], 
-                                  billboard_pos[0], building_point[1])
-            if building_point[0] < billboard_pos[0]:
-                dx = -dx
-            if building_point[1] < billboard_pos[1]:
-                dy = -dy
-            angle = np.arctan2(dy, dx)
+        # 计算广告牌到各建筑物点的方向角度
+        dx = haversine_distances(lon0, lat0, points[:, 0], lat0)
+        dy = haversine_distances(lon0, lat0, lon0, points[:, 1])
+        dx = np.where(points[:, 0] < lon0, -dx, dx)
+        dy = np.where(points[:, 1] < lat0, -dy, dy)
+        angles = np.arctan2(dy, dx)
 
-            # 计算广告牌到圆心的距离
-            distance_to_center = haversine_distance(billboard_pos[0], billboard_pos[1],
-                                                  circle_center[0], circle_center[1])
-            
-            # 计算广告牌到圆心的方向角度
-            dx_center = haversine_distance(billboard_pos[0], billboard_pos[1], 
-                                         circle_center[0], billboard_pos[1])
-            dy_center = haversine_distance(billboard_pos[0], billboard_pos[1], 
-                                         billboard_pos[0], circle_center[1])
-            if circle_center[0] < billboard_pos[0]:
-                dx_center = -dx_center
-            if circle_center[1] < billboard_pos[1]:
-                dy_center = -dy_center
-            angle_to_center = np.arctan2(dy_center, dx_center)
+        # 计算广告牌到圆心的距离
+        distance_to_center = haversine_distance(lon0, lat0, circle_center[0], circle_center[1])
+        
+        # 计算广告牌到圆心的方向角度
+        dx_center = haversine_distance(lon0, lat0, circle_center[0], lat0)
+        dy_center = haversine_distance(lon0, lat0, lon0, circle_center[1])
+        if circle_center[0] < lon0:
+            dx_center = -dx_center
+        if circle_center[1] < lat0:
+            dy_center = -dy_center
+        angle_to_center = np.arctan2(dy_center, dx_center)
 
-            # 计算射线与圆的交点
-            theta = angle - angle_to_center
-            d = distance_to_center * np.sin(theta)
-            
-            # 如果射线与圆相交
-            if abs(d) <= circle_radius:
-                # 计算交点到圆心的距离
-                l = np.sqrt(circle_radius**2 - d**2)
-                # 计算交点
-                intersection_point = get_point_at_distance(
-                    circle_center[0], circle_center[1],
-                    angle,
-                    circle_radius
-                )
-                arc_points.append({
-                    'point': intersection_point,
-                    'building_point': building_point,
-                    'angle': angle
-                })
+        # 筛选与圆相交的射线
+        d = distance_to_center * np.sin(angles - angle_to_center)
+        hit = np.abs(d) <= circle_radius
 
-        if len(arc_points) >= 2:
-            # 按角度排序
-            arc_points.sort(key=lambda x: x['angle'])
+        if np.count_nonzero(hit) >= 2:
+            # 按角度排序(稳定排序)
+            hit_points = points[hit]
+            hit_angles = angles[hit]
+            order = np.argsort(hit_angles, kind='stable')
+            first, last = order[0], order[-1]
             
-            # 构建多边形
-            occlusion_polygon = []
-            
-            # 1. 添加第一个建筑点
-            occlusion_polygon.append(arc_points[0]['building_point'])
-            
-            # 2. 添加圆弧上的点
-            start_angle = arc_points[0]['angle']
-            end_angle = arc_points[-1]['angle']
+            # 圆弧上的点
+            start_angle = hit_angles[first]
+            end_angle = hit_angles[last]
             if end_angle < start_angle:
                 end_angle += 2*np.pi
                 
             num_points = 32
-            for i in range(num_points + 1):
-                angle = start_angle + i*(end_angle-start_angle)/num_points
-                point = get_point_at_distance(
-                    circle_center[0], circle_center[1],
-                    angle,
-                    circle_radius
-                )
-                occlusion_polygon.append(point)
+            arc_angles = start_angle + np.arange(num_points + 1)*(end_angle-start_angle)/num_points
+            arc = points_at_distance(circle_center[0], circle_center[1], arc_angles, circle_radius)
             
-            # 3. 添加最后一个建筑点
-            occlusion_polygon.append(arc_points[-1]['building_point'])
-            
-            # 4. 闭合多边形
+            # 第一个建筑点 + 圆弧 + 最后一个建筑点，并闭合多边形
+            occlusion_polygon = [hit_points[first].tolist()] + arc.tolist() + [hit_points[last].tolist()]
             occlusion_polygon.append(occlusion_polygon[0])
             
             return occlusion_polygon
@@ -409,4 +382,3 @@ def calculate_IA_arc(billboard_pos, building_points, circle_center, circle_radiu
         print(f"[ERROR] 错误信息: {str(e)}")
         print(f"[ERROR] 位置: {e.__traceback__.tb_frame.f_code.co_filename}:{e.__traceback__.tb_lineno}")
         return None
-
@@ -0,0 +1,299 @@
+'''
+@zyh 2026-10-18
+进程内GPS查询引擎
+将gps表按列加载为NumPy数组(taxi_id, epoch, 经度, 纬度),按Hilbert曲线编码排序,
+使空间上相邻的点在数组中也相邻。多边形查询时:
+1.把多边形外包矩形逐级四分为Hilbert网格单元,完全落在多边形内的单元直接计数,
+  与边界相交的单元继续细分,到最大深度后作为候选单元
+2.每个网格单元对应排序数组中的一段连续区间,用二分查找得到区间位置
+3.只对候选区间内的点用 shapely.intersects_xy 精确判断(与ST_Intersects一致,边界上的点也算在内)
+适合交互式反复调整广告牌位置时的曝光统计,结果与PostGIS查询一致
+'''
+from collections import namedtuple
+import time
+
+import numpy as np
+import shapely
+
+from analysis.table_store import TableStore
+
+# Hilbert曲线阶数,数据范围被划分为 2^HILBERT_ORDER x 2^HILBERT_ORDER 个格子
+HILBERT_ORDER = 16
+# 多边形覆盖时网格单元在起始层级之下最多细分的层数
+COVER_DEPTH = 6
+
+GPSPoints = namedtuple('GPSPoints', [
+    'version',      # gps表版本号
+    'taxi_id',      # int32数组
+    'epoch',        # 时间(秒, 与PostgreSQL的 extract(epoch FROM timestamp) 一致),int64数组
+    'longitude',    # float64数组
+    'latitude',     # float64数组
+    'keys',         # Hilbert编码,uint64升序数组
+    'bounds',       # 编码所用的范围 (min_lon, min_lat, max_lon, max_lat)
+])
+
+
+def hilbert_keys(x, y, order=HILBERT_ORDER):
+    """
+    计算整数格子坐标的Hilbert编码(向量化)
+    x, y: [0, 2^order) 范围内的整数数组
+    """
+    x = np.asarray(x, dtype=np.int64).copy()
+    y = np.asarray(y, dtype=np.int64).copy()
+    d = np.zeros(x.shape, dtype=np.uint64)
+    n = 1 << order
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += np.uint64(s) * np.uint64(s) * ((3 * rx) ^ ry).astype(np.uint64)
+        # 旋转象限,使低位的编码方向与曲线一致
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        swap = ~ry
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= 1
+    return d
+
+
+class GPSEngine:
+    def __init__(self, points):
+        '''
+        points: GPSPoints
+        '''
+        self.points = points
+        min_lon, min_lat, max_lon, max_lat = points.bounds
+        self.cells = 1 << HILBERT_ORDER
+        # 略微放大格子尺寸,保证最大值也落在 [0, cells) 内
+        self.cell_width = max(max_lon - min_lon, 1e-9) / self.cells * (1 + 1e-9)
+        self.cell_height = max(max_lat - min_lat, 1e-9) / self.cells * (1 + 1e-9)
+
+    @property
+    def version(self):
+        return self.points.version
+
+    def __len__(self):
+        return len(self.points.keys)
+
+    @classmethod
+    def from_arrays(cls, taxi_id, epoch, longitude, latitude, version=None):
+        """由列数组建立引擎,按Hilbert编码重新排序"""
+        longitude = np.asarray(longitude, dtype=np.float64)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        if len(longitude):
+            bounds = (longitude.min(), latitude.min(), longitude.max(), latitude.max())
+        else:
+            bounds = (0.0, 0.0, 1.0, 1.0)
+        engine = cls(GPSPoints(version, None, None, None, None, np.zeros(0, dtype=np.uint64), bounds))
+        keys = hilbert_keys(*engine._cell_of(longitude, latitude))
+        order = np.argsort(keys, kind='stable')
+        engine.points = GPSPoints(
+            version=version,
+            taxi_id=np.asarray(taxi_id, dtype=np.int32)[order],
+            epoch=np.asarray(epoch, dtype=np.int64)[order],
+            longitude=longitude[order],
+            latitude=latitude[order],
+            keys=keys[order],
+            bounds=bounds,
+        )
+        for array in engine.points[1:6]:
+            array.setflags(write=False)
+        return engine
+
+    def _cell_of(self, longitude, latitude):
+        """经纬度所在的格子坐标"""
+        min_lon, min_lat = self.points.bounds[:2]
+        x = np.clip(((longitude - min_lon) / self.cell_width).astype(np.int64), 0, self.cells - 1)
+        y = np.clip(((latitude - min_lat) / self.cell_height).astype(np.int64), 0, self.cells - 1)
+        return x, y
+
+    def cover(self, polygon, depth=COVER_DEPTH):
+        '''
+        用Hilbert网格单元覆盖多边形
+        OUTPUT:
+            (完全在多边形内的编码区间列表, 与边界相交的编码区间列表),区间为 [起点, 终点)
+        '''
+        min_lon, min_lat = self.points.bounds[:2]
+        x0, y0 = self._cell_of(*np.asarray(polygon.bounds[:2]))
+        x1, y1 = self._cell_of(*np.asarray(polygon.bounds[2:]))
+        shapely.prepare(polygon)
+
+        inside, boundary = [], []
+        # 从能覆盖多边形外包矩形的最小单元层级开始,逐级细分depth层
+        level = max(0, HILBERT_ORDER - int(max(x1 - x0, y1 - y0, 1)).bit_length())
+        max_level = min(level + depth, HILBERT_ORDER)
+        size = self.cells >> level
+        cx, cy = np.meshgrid(np.arange(x0 // size, x1 // size + 1), np.arange(y0 // size, y1 // size + 1))
+        cx, cy = cx.ravel(), cy.ravel()
+        while len(cx):
+            size = self.cells >> level
+            boxes = shapely.box(min_lon + cx * size * self.cell_width,
+                                min_lat + cy * size * self.cell_height,
+                                min_lon + (cx + 1) * size * self.cell_width,
+                                min_lat + (cy + 1) * size * self.cell_height)
+            hits = shapely.intersects(polygon, boxes)
+            full = hits & shapely.contains(polygon, boxes)
+            partial = hits & ~full
+            inside.extend(_cell_ranges(cx[full], cy[full], level))
+            if level >= max_level:
+                boundary.extend(_cell_ranges(cx[partial], cy[partial], level))
+                break
+            # 与边界相交的单元细分为4个子单元
+            cx, cy = cx[partial] * 2, cy[partial] * 2
+            cx = np.concatenate([cx, cx + 1, cx, cx + 1])
+            cy = np.concatenate([cy, cy, cy + 1, cy + 1])
+            level += 1
+        return _merge_ranges(inside), _merge_ranges(boundary)
+
+    def query(self, polygon, start_time=None, end_time=None):
+        '''
+        查询多边形内(含边界)、时间窗口 [start_time, end_time) 内的点
+        polygon: shapely几何
+        start_time, end_time: epoch秒,None表示不限
+        OUTPUT:
+            排序数组中的下标(int64数组)
+        '''
+        points = self.points
+        if not len(points.keys) or polygon is None or polygon.is_empty:
+            return np.zeros(0, dtype=np.int64)
+        inside, boundary = self.cover(polygon)
+
+        parts = [_range_indices(points.keys, inside)]
+        candidates = _range_indices(points.keys, boundary)
+        if len(candidates):
+            # 与 ST_Intersects 一致,边界上的点也算在内
+            hit = shapely.intersects_xy(polygon, points.longitude[candidates], points.latitude[candidates])
+            parts.append(candidates[hit])
+        indices = np.sort(np.concatenate(parts))
+
+        if start_time is not None or end_time is not None:
+            epoch = points.epoch[indices]
+            mask = np.ones(len(indices), dtype=bool)
+            if start_time is not None:
+                mask &= epoch >= start_time
+            if end_time is not None:
+                mask &= epoch < end_time
+            indices = indices[mask]
+        return indices
+
+    def count(self, polygon, start_time=None, end_time=None):
+        """多边形内的点数"""
+        return len(self.query(polygon, start_time, end_time))
+
+    def temporal_stats(self, polygon, start_time=None, end_time=None, bin_unit=None, bin_minutes=None):
+        """
+        按时间统计多边形内的点数和出租车数,返回结构与 GPSAnalyzer.temporal_stats 相同
+        """
+        indices = self.query(polygon, start_time, end_time)
+        taxi_id = self.points.taxi_id[indices]
+        epoch = self.points.epoch[indices]
+
+        hours = (epoch // 3600) % 24
+        # 1970-01-01为星期四,isodow从周一=1开始
+        weekdays = (epoch // 86400 + 3) % 7
+        stats = {
+            "total": int(len(indices)),
+            "taxis": int(len(np.unique(taxi_id))),
+            "hourly": _bucket_stats(hours, taxi_id, 24),
+            "weekday": _bucket_stats(weekdays, taxi_id, 7),
+        }
+
+        starts = None
+        if bin_minutes is not None:
+            width = bin_minutes * 60
+            starts = epoch // width * width
+        elif bin_unit == 'week':
+            starts = (epoch // 86400 - weekdays) * 86400
+        elif bin_unit is not None:
+            unit = {'minute': 'm', 'hour': 'h', 'day': 'D', 'month': 'M'}[bin_unit]
+            starts = epoch.astype('datetime64[s]').astype(f'datetime64[{unit}]').astype('datetime64[s]').astype(np.int64)
+        if starts is not None:
+            values, inverse = np.unique(starts, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(values))
+            taxis = _unique_counts(inverse, taxi_id, len(values))
+            stats["bins"] = [
+                {"start": np.datetime64(int(value), 's').item().isoformat(), "count": int(count), "taxis": int(taxi_count)}
+                for value, count, taxi_count in zip(values, counts, taxis)
+            ]
+        return stats
+
+
+def _cell_ranges(cx, cy, level):
+    """level级网格单元对应的编码区间,每个单元覆盖完整阶数下一段连续的编码"""
+    if not len(cx):
+        return []
+    span = np.uint64(1) << np.uint64(2 * (HILBERT_ORDER - level))
+    starts = hilbert_keys(cx, cy, level) * span
+    return list(zip(starts.tolist(), (starts + span).tolist()))
+
+
+def _merge_ranges(ranges):
+    """合并相邻或重叠的编码区间"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _range_indices(keys, ranges):
+    """编码区间对应的排序数组下标"""
+    if not ranges:
+        return np.zeros(0, dtype=np.int64)
+    bounds = np.asarray(ranges, dtype=np.uint64)
+    starts = np.searchsorted(keys, bounds[:, 0], side='left')
+    lengths = np.searchsorted(keys, bounds[:, 1], side='left') - starts
+    # 把各区间的下标拼接起来: 每个区间内为 起点 + 0,1,2,...
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def _unique_counts(buckets, taxi_id, size):
+    """每个桶内不同taxi_id的数量"""
+    pairs = np.unique(np.stack([buckets.astype(np.int64), taxi_id.astype(np.int64)]), axis=1)
+    return np.bincount(pairs[0], minlength=size)
+
+
+def _bucket_stats(buckets, taxi_id, size):
+    return {
+        "counts": np.bincount(buckets, minlength=size).tolist(),
+        "taxis": _unique_counts(buckets, taxi_id, size).tolist(),
+    }
+
+
+class GPSEngineStore(TableStore):
+    def __init__(self, check_interval=60.0, chunk_size=200000):
+        super().__init__('gps', check_interval, key_column='timestamp')
+        self.chunk_size = chunk_size
+
+    def _load(self, db, version):
+        print("[INFO] 开始加载GPS数据到内存...")
+        start_time = time.time()
+        columns = ([], [], [], [])
+        rows = db.stream_rows("""
+            SELECT taxi_id, extract(epoch FROM timestamp)::bigint, longitude, latitude
+            FROM gps
+        """, itersize=self.chunk_size)
+        # 分块转换为数组,避免保存大量Python元组
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                for column, values in zip(columns, zip(*chunk)):
+                    column.append(np.asarray(values))
+                chunk = []
+        if chunk:
+            for column, values in zip(columns, zip(*chunk)):
+                column.append(np.asarray(values))
+        taxi_id, epoch, longitude, latitude = (
+            np.concatenate(column) if column else np.zeros(0) for column in columns)
+        engine = GPSEngine.from_arrays(taxi_id, epoch, longitude, latitude, version)
+        print(f"[SUCCESS] 成功加载 {len(engine)} 条GPS数据到内存, 耗时: {time.time() - start_time:.2f} 秒")
+        return engine
+
+
+# 全局共享的GPS查询引擎,首次使用时加载
+gps_engine_store = GPSEngineStore()
@@ -3,9 +3,64 @@
 已知曝光区域的geojson数据和GPS数据
 从中获取价值信息供前端分析
 1.统计曝光区域内的出租车GPS信息
+查询均可指定时间窗口 [start_time, end_time),gps表按天分区,只扫描窗口内的分区
 '''
 from config.database import Database
+from analysis.gps_engine import gps_engine_store
+from datetime import datetime
+from itertools import islice
 import json
+import numpy as np
+import shapely
+
+
+def format_gps_row(row):
+    """(taxi_id, epoch, 时间文本, 经度, 纬度) -> [taxi_id, 时间文本, 经度, 纬度],与原接口的列顺序一致"""
+    return [row[0], row[2], row[3], row[4]]
+
+
+def format_gps_rows(rows, layout='rows'):
+    """按布局格式化GPS点,columnar布局为 {taxi_id, epoch, longitude, latitude} 四个等长数组"""
+    if layout != 'columnar':
+        return [format_gps_row(row) for row in rows]
+    taxi_ids, epochs, _, longitudes, latitudes = zip(*rows) if rows else ((),) * 5
+    return {
+        "taxi_id": list(taxi_ids),
+        "epoch": list(epochs),
+        "longitude": list(longitudes),
+        "latitude": list(latitudes),
+    }
+
+
+def to_epoch(value):
+    """无时区的时间转换为epoch秒(按UTC计算,与PostgreSQL的 extract(epoch FROM timestamp) 一致)"""
+    if value is None:
+        return None
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+
+def chunked(iterable, size):
+    """将可迭代对象按size分块"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def empty_temporal_stats(with_bins=False):
+    """没有GPS点时的时间统计结果,各时间段的点数和出租车数均为0"""
+    stats = {
+        "total": 0,
+        "taxis": 0,
+        "hourly": {"counts": [0] * 24, "taxis": [0] * 24},
+        "weekday": {"counts": [0] * 7, "taxis": [0] * 7},
+    }
+    if with_bins:
+        stats["bins"] = []
+    return stats
+
 
 class GPSAnalyzer:
     def __init__(self):
@@ -13,6 +68,21 @@ class GPSAnalyzer:
         self.db = Database()
         self.gps_data = None
 
+    @staticmethod
+    def time_filter(start_time=None, end_time=None, column='timestamp'):
+        """
+        生成时间窗口过滤条件
+        返回: (以AND开头的SQL片段, 参数列表),未指定时间时为空
+        """
+        sql, params = "", []
+        if start_time is not None:
+            sql += f" AND {column} >= %s"
+            params.append(start_time)
+        if end_time is not None:
+            sql += f" AND {column} < %s"
+            params.append(end_time)
+        return sql, params
+
     def load_gps_data(self):
         try:
             print("[INFO] 开始加载GPS数据...")
@@ -23,45 +93,61 @@ class GPSAnalyzer:
             print(f"[ERROR] 加载GPS数据失败: {str(e)}")
             return False
 
+    @staticmethod
+    def exposure_geometry(exposure_geojson):
+        """
+        从曝光区域FeatureCollection中提取第一个要素的几何,返回GeoJSON文本
+        传入的已是几何对象或文本时直接使用,无效时返回None
+        """
+        # 确保exposure_geojson是有效的GeoJSON
+        if exposure_geojson is None:
+            print("[ERROR] 曝光区域数据为空")
+            return None
+            
+        # 标准化GeoJSON格式
+        if isinstance(exposure_geojson, dict) and 'coordinates' in exposure_geojson:
+            return json.dumps(exposure_geojson)
+        if isinstance(exposure_geojson, dict):
+            if 'type' not in exposure_geojson or 'features' not in exposure_geojson:
+                print("[ERROR] 无效的GeoJSON格式")
+                return None
+                
+            # 提取MultiPolygon geometry
+            try:
+                geometry = exposure_geojson['features'][0]['geometry']
+                if geometry['type'] != 'MultiPolygon':
+                    print(f"[WARNING] 预期geometry类型为MultiPolygon，实际为{geometry['type']}")
+            except (KeyError, IndexError) as e:
+                print(f"[ERROR] 无法提取geometry: {str(e)}")
+                return None
+                
+            return json.dumps(geometry)
+        if isinstance(exposure_geojson, str):
+            return exposure_geojson
+        print("[ERROR] 无效的GeoJSON格式")
+        return None
+
     #筛选出在曝光区域内的出租车GPS信息
-    def filter_gps_in_exposure(self, exposure_geojson):
+    def filter_gps_in_exposure(self, exposure_geojson, start_time=None, end_time=None):
         try:
             print("\n=== 开始筛选曝光区域内的GPS数据 ===")
             
-            # 确保exposure_geojson是有效的GeoJSON
+            exposure_geojson = self.exposure_geometry(exposure_geojson)
             if exposure_geojson is None:
-                print("[ERROR] 曝光区域数据为空")
                 return []
-                
-            # 标准化GeoJSON格式
-            if isinstance(exposure_geojson, dict):
-                if 'type' not in exposure_geojson or 'features' not in exposure_geojson:
-                    print("[ERROR] 无效的GeoJSON格式")
-                    return []
-                    
-                # 提取MultiPolygon geometry
-                try:
-                    geometry = exposure_geojson['features'][0]['geometry']
-                    if geometry['type'] != 'MultiPolygon':
-                        print(f"[WARNING] 预期geometry类型为MultiPolygon，实际为{geometry['type']}")
-                except (KeyError, IndexError) as e:
-                    print(f"[ERROR] 无法提取geometry: {str(e)}")
-                    return []
-                    
-                import json
-                exposure_geojson = json.dumps(geometry)
             
             print(f"[DEBUG] 处理后的GeoJSON类型: {type(exposure_geojson)}")
             
             # 构建空间查询SQL
             print("[INFO] 构建空间查询SQL...")
-            sql = """
+            time_sql, time_params = self.time_filter(start_time, end_time, 'g.timestamp')
+            sql = f"""
                 WITH exposure AS (
                     SELECT ST_GeomFromGeoJSON(%s) as geom
                 )
                 SELECT DISTINCT g.* 
                 FROM gps g, exposure e
-                WHERE ST_Intersects(g.geometry, e.geom)
+                WHERE ST_Intersects(g.geometry, e.geom){time_sql}
             """
             
             # 执行查询
@@ -69,7 +155,7 @@ class GPSAnalyzer:
             conn = self.db.get_connection()
             try:
                 with conn.cursor() as cur:
-                    cur.execute(sql, (exposure_geojson,))
+                    cur.execute(sql, [exposure_geojson] + time_params)
                     filtered_gps = cur.fetchall()
                     print(f"[SUCCESS] 查询完成,找到 {len(filtered_gps)} 条符合条件的GPS数据")
                     return filtered_gps
@@ -82,10 +168,246 @@ class GPSAnalyzer:
             print(traceback.format_exc())
             return []
 
-    def generate_heatmap(self, cell_size=0.0001):
+    def exposure_points_query(self, geometry, start_time=None, end_time=None, after=None, limit=None):
+        """
+        生成曝光区域内GPS点的查询,每行为 (taxi_id, epoch秒, 时间文本, 经度, 纬度)
+        @param geometry: 曝光区域几何的GeoJSON文本
+        @param after: 分页游标 (taxi_id, epoch秒),只返回排在其后的点
+        @param limit: 每页行数,指定时按 (taxi_id, timestamp) 排序,可以利用主键索引做键集分页
+        @return: (sql, params)
+        """
+        time_sql, params = self.time_filter(start_time, end_time, 'g.timestamp')
+        params = [geometry] + params
+        sql = f"""
+            SELECT
+                g.taxi_id,
+                extract(epoch FROM g.timestamp)::bigint AS epoch,
+                to_char(g.timestamp, 'YYYY-MM-DD HH24:MI:SS') AS timestamp,
+                g.longitude,
+                g.latitude
+            FROM gps g
+            WHERE ST_Intersects(g.geometry, ST_GeomFromGeoJSON(%s)){time_sql}
+        """
+        if after is not None:
+            sql += " AND (g.taxi_id, g.timestamp) > (%s, to_timestamp(%s) AT TIME ZONE 'UTC')"
+            params += list(after)
+        if limit is not None:
+            sql += " ORDER BY g.taxi_id, g.timestamp LIMIT %s"
+            params.append(limit)
+        return sql, params
+
+    def fetch_gps_page(self, exposure_geojson, start_time=None, end_time=None,
+                       after=None, limit=10000, layout='rows'):
+        """
+        分页获取曝光区域内的GPS点
+        @param after: 上一页返回的next游标 (taxi_id, epoch秒),None表示第一页
+        @param layout: rows 返回 [taxi_id, 时间, 经度, 纬度] 行数组; columnar 返回按列的数组
+        @return: {"layout", "count", "next", "data"},next为None表示没有下一页
+        """
+        geometry = self.exposure_geometry(exposure_geojson)
+        if geometry is None:
+            raise ValueError("曝光区域数据无效")
+        sql, params = self.exposure_points_query(geometry, start_time, end_time, after, limit)
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        next_cursor = f"{rows[-1][0]},{rows[-1][1]}" if len(rows) == limit else None
+        return {
+            "layout": layout,
+            "count": len(rows),
+            "next": next_cursor,
+            "data": format_gps_rows(rows, layout),
+        }
+
+    def stream_gps_in_exposure(self, exposure_geojson, start_time=None, end_time=None,
+                               layout='rows', chunk_size=5000):
+        """
+        使用服务端游标流式获取曝光区域内的GPS点
+        rows 布局逐点返回 [taxi_id, 时间, 经度, 纬度]; columnar 布局每chunk_size个点返回一个按列的对象
+        """
+        geometry = self.exposure_geometry(exposure_geojson)
+        if geometry is None:
+            raise ValueError("曝光区域数据无效")
+        sql, params = self.exposure_points_query(geometry, start_time, end_time)
+        rows = self.db.stream_rows(sql, params, itersize=chunk_size)
+        if layout != 'columnar':
+            return (format_gps_row(row) for row in rows)
+        return (format_gps_rows(chunk, 'columnar') for chunk in chunked(rows, chunk_size))
+
+    def temporal_stats(self, exposure_geojson, start_time=None, end_time=None, bin_unit=None, bin_minutes=None):
+        """
+        在数据库中按时间聚合曝光区域内的GPS点,只返回各时间段的点数和出租车数
+        @param bin_unit: 自定义时间段,date_trunc单位(minute/hour/day/week/month)
+        @param bin_minutes: 自定义时间段,按固定分钟数分段,与bin_unit二选一
+        @return: {
+            "total": 点数, "taxis": 出租车数,
+            "hourly": {"counts": [24], "taxis": [24]},       0-23时
+            "weekday": {"counts": [7], "taxis": [7]},       周一到周日
+            "bins": [{"start": 时间段起点, "count", "taxis"}]  仅指定自定义时间段时返回
+        }
+        """
+        geometry = self.exposure_geometry(exposure_geojson)
+        if geometry is None:
+            # 与 filter_gps_in_exposure 一致,没有曝光区域时返回空结果
+            return empty_temporal_stats(bin_unit is not None or bin_minutes is not None)
+        time_sql, time_params = self.time_filter(start_time, end_time, 'g.timestamp')
+
+        if bin_unit is not None:
+            bin_expr = "date_trunc(%s, timestamp)"
+            bin_params = [bin_unit]
+        elif bin_minutes is not None:
+            bin_expr = "to_timestamp(floor(extract(epoch FROM timestamp) / %s) * %s) AT TIME ZONE 'UTC'"
+            bin_params = [bin_minutes * 60, bin_minutes * 60]
+        else:
+            bin_expr = "NULL::timestamp"
+            bin_params = []
+        if bin_params:
+            grouping_sets = "(hour), (dow), (bin), ()"
+            bin_columns = "GROUPING(bin) = 0 AS by_bin, bin"
+        else:
+            grouping_sets = "(hour), (dow), ()"
+            bin_columns = "FALSE AS by_bin, NULL::timestamp AS bin"
+
+        # 一次扫描同时得到按小时、按星期、按自定义时间段和总计的分组结果
+        sql = f"""
+            WITH points AS (
+                SELECT g.taxi_id, g.timestamp
+                FROM gps g
+                WHERE ST_Intersects(g.geometry, ST_GeomFromGeoJSON(%s)){time_sql}
+            ),
+            keyed AS (
+                SELECT
+                    taxi_id,
+                    extract(hour FROM timestamp)::int AS hour,
+                    extract(isodow FROM timestamp)::int AS dow,
+                    {bin_expr} AS bin
+                FROM points
+            )
+            SELECT
+                GROUPING(hour) = 0 AS by_hour,
+                GROUPING(dow) = 0 AS by_dow,
+                hour, dow,
+                {bin_columns},
+                COUNT(*),
+                COUNT(DISTINCT taxi_id)
+            FROM keyed
+            GROUP BY GROUPING SETS ({grouping_sets})
+        """
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, [geometry] + time_params + bin_params)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+
+        stats = empty_temporal_stats()
+        bins = []
+        for by_hour, by_dow, hour, dow, by_bin, bin_start, count, taxis in rows:
+            if by_hour:
+                stats["hourly"]["counts"][hour] = count
+                stats["hourly"]["taxis"][hour] = taxis
+            elif by_dow:
+                stats["weekday"]["counts"][dow - 1] = count
+                stats["weekday"]["taxis"][dow - 1] = taxis
+            elif by_bin:
+                bins.append({"start": bin_start.isoformat(), "count": count, "taxis": taxis})
+            else:
+                stats["total"] = count
+                stats["taxis"] = taxis
+        if bin_params:
+            stats["bins"] = sorted(bins, key=lambda item: item["start"])
+        return stats
+
+    def temporal_stats_in_memory(self, exposure_geojson, start_time=None, end_time=None,
+                                 bin_unit=None, bin_minutes=None):
+        """
+        与 temporal_stats 相同的统计,使用进程内的GPS查询引擎计算,不访问PostGIS
+        首次调用时把gps表加载到内存,之后gps表变化时重新加载
+        """
+        geometry = self.exposure_geometry(exposure_geojson)
+        if geometry is None:
+            return empty_temporal_stats(bin_unit is not None or bin_minutes is not None)
+        engine = gps_engine_store.get(self.db)
+        return engine.temporal_stats(shapely.from_geojson(geometry),
+                                     to_epoch(start_time), to_epoch(end_time),
+                                     bin_unit, bin_minutes)
+
+    def count_in_areas(self, geometries, start_time=None, end_time=None, engine='postgis'):
+        """
+        统计多个区域内的GPS点数和出租车数
+        @param geometries: shapely几何列表
+        @param engine: postgis 一次查询统计全部区域; memory 使用进程内的GPS查询引擎
+        @return: 与geometries顺序一致的 [{"count", "taxis"}]
+        """
+        if engine == 'memory':
+            gps_engine = gps_engine_store.get(self.db)
+            counts = []
+            for geometry in geometries:
+                indices = gps_engine.query(geometry, to_epoch(start_time), to_epoch(end_time))
+                counts.append({
+                    "count": int(len(indices)),
+                    "taxis": int(len(np.unique(gps_engine.points.taxi_id[indices]))),
+                })
+            return counts
+
+        time_sql, time_params = self.time_filter(start_time, end_time, 'g.timestamp')
+        sql = f"""
+            WITH areas AS (
+                SELECT ord, ST_SetSRID(ST_GeomFromGeoJSON(geojson), 4326) AS geom
+                FROM unnest(%s::text[]) WITH ORDINALITY AS a(geojson, ord)
+            )
+            SELECT a.ord, COUNT(g.taxi_id), COUNT(DISTINCT g.taxi_id)
+            FROM areas a
+            LEFT JOIN gps g ON ST_Intersects(g.geometry, a.geom){time_sql}
+            GROUP BY a.ord
+            ORDER BY a.ord
+        """
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, [[shapely.to_geojson(geometry) for geometry in geometries]] + time_params)
+                return [{"count": count, "taxis": taxis} for _, count, taxis in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def stream_heatmap(self, cell_size=0.0001, start_time=None, end_time=None):
+        """
+        流式生成热力图数据,逐行返回 (geometry文本, properties文本),供 geojson_stream_response 使用
+        @param cell_size: 网格大小(经纬度),默认0.0001度(约10米)
+        @param start_time, end_time: 时间窗口,默认全部数据
+        """
+        time_sql, time_params = self.time_filter(start_time, end_time)
+        sql = f"""
+            WITH grid AS (
+                SELECT 
+                    ST_SnapToGrid(geometry, %s, %s) as geom,
+                    COUNT(*) as point_count
+                FROM gps
+                WHERE TRUE{time_sql}
+                GROUP BY ST_SnapToGrid(geometry, %s, %s)
+            )
+            SELECT 
+                ST_AsGeoJSON(ST_Centroid(geom)) as centroid,
+                json_build_object(
+                    'weight', point_count,
+                    'longitude', ST_X(ST_Centroid(geom)),
+                    'latitude', ST_Y(ST_Centroid(geom))
+                )::text as properties
+            FROM grid
+            WHERE point_count > 0
+        """
+        return self.db.stream_rows(sql, [cell_size, cell_size] + time_params + [cell_size, cell_size])
+
+    def generate_heatmap(self, cell_size=0.0001, start_time=None, end_time=None):
         """
-        生成热力图数据,计算全部GPS点的密度分布
+        生成热力图数据,计算GPS点的密度分布
         @param cell_size: 网格大小(经纬度),默认0.0001度(约10米)
+        @param start_time, end_time: 时间窗口,默认全部数据
         @return: GeoJSON格式的热力图数据
         """
         try:
@@ -93,12 +415,14 @@ class GPSAnalyzer:
             print(f"[INFO] 使用网格大小: {cell_size}度")
             
             # 使用ST_SnapToGrid进行网格化并计算每个网格的点密度
-            sql = """
+            time_sql, time_params = self.time_filter(start_time, end_time)
+            sql = f"""
                 WITH grid AS (
                     SELECT 
                         ST_SnapToGrid(geometry, %s, %s) as geom,
                         COUNT(*) as point_count
                     FROM gps
+                    WHERE TRUE{time_sql}
                     GROUP BY ST_SnapToGrid(geometry, %s, %s)
                 )
                 SELECT 
@@ -113,7 +437,7 @@ class GPSAnalyzer:
             conn = self.db.get_connection()
             try:
                 with conn.cursor() as cur:
-                    cur.execute(sql, (cell_size, cell_size, cell_size, cell_size))
+                    cur.execute(sql, [cell_size, cell_size] + time_params + [cell_size, cell_size])
                     grid_data = cur.fetchall()
                     
                 # 构建GeoJSON
@@ -0,0 +1,317 @@
+'''
+@zyh 2026-10-18
+GPS热力图金字塔
+预先按多级网格(0级网格边长base_cell度,每升一级边长加倍)统计GPS点数,保存在数据库中:
+    gps_heatmap: 每级网格每小时的点数,用于按时间窗口查询
+    gps_heatmap_total: 每级网格的总点数,用于不限时间的查询
+    gps_heatmap_state: 已统计到的时间水位和gps表行数
+gps表追加新数据后只重新统计水位所在小时及之后的数据;
+若行数对不上(如补录了更早的数据或重新导入),则全部重建
+查询时根据缩放级别选择网格级别,只读取视野范围内的网格
+网格划分与原热力图的 ST_SnapToGrid 一致: 坐标按网格边长四舍五入到最近的整数倍,网格中心为 编号*边长;
+1级及以上的网格由0级网格合并得到(编号 floor((k0 + 2^(l-1)) / 2^l)),边界按0级网格对齐,
+与直接按该级边长取整相比,边界附近的点最多偏移半个0级网格
+统计耗时较长,不在请求中执行: 启动时、用 scripts/build_heatmap_pyramid.py 或在后台线程中更新
+'''
+import math
+import threading
+import time
+
+from config.database import Database
+
+# 0级网格边长(度),约10米,与原热力图默认网格一致
+BASE_CELL = 0.0001
+# 网格级别数,最粗一级边长为 BASE_CELL * 2**(LEVELS-1)
+LEVELS = 8
+# 一个256像素的瓦片内希望显示的网格数,决定缩放级别与网格级别的对应关系
+CELLS_PER_TILE = 64
+
+
+class HeatmapPyramid:
+    def __init__(self, base_cell=BASE_CELL, levels=LEVELS, check_interval=60.0):
+        '''
+        base_cell: 0级网格边长(度)
+        levels: 网格级别数
+        check_interval: 两次检查gps表是否变化之间的最小间隔(秒)
+        '''
+        self.db = Database()
+        self.base_cell = base_cell
+        self.levels = levels
+        self.check_interval = check_interval
+        self._checked_at = None
+        self._refreshing = False
+        self._built = False
+        self._lock = threading.Lock()
+
+    def cell_size(self, level):
+        return self.base_cell * 2 ** level
+
+    def level_for_zoom(self, zoom):
+        """选择网格边长不小于 瓦片宽度/CELLS_PER_TILE 的最细网格级别"""
+        if zoom is None:
+            return 0
+        target = 360.0 / 2 ** zoom / CELLS_PER_TILE
+        level = math.ceil(math.log2(max(target / self.base_cell, 1.0)))
+        return min(level, self.levels - 1)
+
+    def create_tables(self, cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS gps_heatmap (
+                level SMALLINT,
+                cell_x INTEGER,
+                cell_y INTEGER,
+                hour TIMESTAMP,
+                count INTEGER,
+                PRIMARY KEY (level, cell_x, cell_y, hour)
+            );
+            CREATE INDEX IF NOT EXISTS gps_heatmap_hour_idx ON gps_heatmap (hour);
+            CREATE TABLE IF NOT EXISTS gps_heatmap_total (
+                level SMALLINT,
+                cell_x INTEGER,
+                cell_y INTEGER,
+                count BIGINT,
+                PRIMARY KEY (level, cell_x, cell_y)
+            );
+            CREATE TABLE IF NOT EXISTS gps_heatmap_state (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                watermark TIMESTAMP,
+                row_count BIGINT,
+                base_cell FLOAT,
+                levels INTEGER
+            );
+        """)
+
+    def _aggregate(self, cur, since):
+        '''
+        重新统计 since(含)之后各小时的网格点数,since为None时统计全部数据
+        先在临时表中得到新的小时统计,再用 新值-旧值 更新总表,最后替换小时表中对应的行
+        '''
+        time_sql = "WHERE timestamp >= %s" if since is not None else ""
+        params = [since] if since is not None else []
+        cur.execute(f"""
+            DROP TABLE IF EXISTS gps_heatmap_fresh;
+            CREATE TEMP TABLE gps_heatmap_fresh AS
+            SELECT 0::smallint AS level,
+                   round(longitude / %s)::int AS cell_x,
+                   round(latitude / %s)::int AS cell_y,
+                   date_trunc('hour', timestamp) AS hour,
+                   COUNT(*)::int AS count
+            FROM gps
+            {time_sql}
+            GROUP BY 2, 3, 4;
+        """, [self.base_cell, self.base_cell] + params)
+        # 边长加倍的网格编号为0级编号除以2的幂后四舍五入,网格中心仍为 编号*边长
+        cur.execute("""
+            INSERT INTO gps_heatmap_fresh (level, cell_x, cell_y, hour, count)
+            SELECT l,
+                   floor((f.cell_x + 2.0 ^ (l - 1)) / 2.0 ^ l)::int,
+                   floor((f.cell_y + 2.0 ^ (l - 1)) / 2.0 ^ l)::int,
+                   f.hour, SUM(f.count)::int
+            FROM gps_heatmap_fresh f, generate_series(1, %s) AS l
+            WHERE f.level = 0
+            GROUP BY 1, 2, 3, 4;
+        """, (self.levels - 1,))
+
+        old_sql = "WHERE hour >= %s" if since is not None else ""
+        cur.execute(f"""
+            INSERT INTO gps_heatmap_total (level, cell_x, cell_y, count)
+            SELECT level, cell_x, cell_y, SUM(delta) FROM (
+                SELECT level, cell_x, cell_y, -count::bigint AS delta FROM gps_heatmap {old_sql}
+                UNION ALL
+                SELECT level, cell_x, cell_y, count::bigint FROM gps_heatmap_fresh
+            ) changes
+            GROUP BY level, cell_x, cell_y
+            ON CONFLICT (level, cell_x, cell_y)
+            DO UPDATE SET count = gps_heatmap_total.count + EXCLUDED.count;
+            DELETE FROM gps_heatmap_total WHERE count = 0;
+            DELETE FROM gps_heatmap {old_sql};
+            INSERT INTO gps_heatmap (level, cell_x, cell_y, hour, count)
+            SELECT level, cell_x, cell_y, hour, count FROM gps_heatmap_fresh;
+            DROP TABLE gps_heatmap_fresh;
+        """, params * 2)
+
+    def refresh(self, full=False):
+        '''
+        更新热力图金字塔,gps表未变化时直接返回
+        full: 是否强制全部重建
+        OUTPUT:
+            'unchanged' / 'incremental' / 'full'
+        '''
+        start_time = time.time()
+        conn = self.db.get_connection()
+        cur = conn.cursor()
+        try:
+            # 多个进程同时刷新时排队执行
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('gps_heatmap'));")
+            self.create_tables(cur)
+            cur.execute("SELECT COUNT(*), MAX(timestamp) FROM gps;")
+            row_count, max_time = cur.fetchone()
+            cur.execute("SELECT watermark, row_count, base_cell, levels FROM gps_heatmap_state;")
+            state = cur.fetchone()
+
+            if (not full and state is not None and state[2] == self.base_cell and state[3] == self.levels
+                    and state[0] is not None and max_time is not None and max_time >= state[0]
+                    and row_count >= state[1]):
+                if row_count == state[1] and max_time == state[0]:
+                    conn.commit()
+                    self._built = True
+                    return 'unchanged'
+                # 水位所在小时可能只统计了一部分,从该小时开始重新统计
+                since = state[0].replace(minute=0, second=0, microsecond=0)
+                self._aggregate(cur, since)
+                cur.execute("SELECT COALESCE(SUM(count), 0) FROM gps_heatmap_total WHERE level = 0;")
+                mode = 'incremental' if cur.fetchone()[0] == row_count else 'full'
+            else:
+                mode = 'full'
+
+            if mode == 'full':
+                # 与批量导入一样使用DELETE,重建期间读取方仍能看到旧的统计结果
+                cur.execute("DELETE FROM gps_heatmap; DELETE FROM gps_heatmap_total;")
+                self._aggregate(cur, None)
+
+            cur.execute("""
+                INSERT INTO gps_heatmap_state (id, watermark, row_count, base_cell, levels)
+                VALUES (TRUE, %s, %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE SET
+                    watermark = EXCLUDED.watermark, row_count = EXCLUDED.row_count,
+                    base_cell = EXCLUDED.base_cell, levels = EXCLUDED.levels;
+            """, (max_time, row_count, self.base_cell, self.levels))
+            conn.commit()
+            self._built = True
+            print(f"[INFO] 热力图金字塔{'全部重建' if mode == 'full' else '增量更新'}完成, "
+                  f"gps表 {row_count} 条数据, 耗时: {time.time() - start_time:.2f} 秒")
+            return mode
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def is_built(self):
+        """是否已经按当前网格参数统计过热力图金字塔"""
+        if self._built:
+            return True
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('gps_heatmap_state') IS NOT NULL;")
+                if not cur.fetchone()[0]:
+                    return False
+                cur.execute("SELECT base_cell, levels FROM gps_heatmap_state;")
+                state = cur.fetchone()
+        finally:
+            conn.close()
+        self._built = state is not None and state[0] == self.base_cell and state[1] == self.levels
+        return self._built
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[ERROR] 更新热力图金字塔失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def ensure_fresh(self):
+        """
+        距上次检查超过check_interval时,在后台线程中检查gps表并按需更新
+        不等待更新完成,查询在更新提交前读取已有的统计结果
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+                return
+            self._refreshing = True
+            self._checked_at = now
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def _query_sql(self, bbox, zoom, start_time, end_time):
+        """生成查询视野范围内各网格点数的SQL,每行为 (cell_x, cell_y, count),返回 (sql, params, 网格级别, 网格边长)"""
+        level = self.level_for_zoom(zoom)
+        size = self.cell_size(level)
+
+        conditions, params = ["level = %s"], [level]
+        if bbox is not None:
+            # 网格k覆盖 [(k-0.5)*size, (k+0.5)*size)
+            min_lon, min_lat, max_lon, max_lat = bbox
+            conditions.append("cell_x BETWEEN %s AND %s AND cell_y BETWEEN %s AND %s")
+            params += [math.floor(min_lon / size + 0.5), math.floor(max_lon / size + 0.5),
+                       math.floor(min_lat / size + 0.5), math.floor(max_lat / size + 0.5)]
+        if start_time is None and end_time is None:
+            sql = f"SELECT cell_x, cell_y, count FROM gps_heatmap_total WHERE {' AND '.join(conditions)}"
+        else:
+            if start_time is not None:
+                conditions.append("hour >= date_trunc('hour', %s::timestamp)")
+                params.append(start_time)
+            if end_time is not None:
+                conditions.append("hour < %s")
+                params.append(end_time)
+            sql = f"""
+                SELECT cell_x, cell_y, SUM(count)
+                FROM gps_heatmap
+                WHERE {' AND '.join(conditions)}
+                GROUP BY cell_x, cell_y
+            """
+        return sql, params, level, size
+
+    def query(self, bbox=None, zoom=None, start_time=None, end_time=None):
+        '''
+        查询热力图
+        INPUT:
+            bbox: (min_lon, min_lat, max_lon, max_lat),None表示全部范围
+            zoom: 地图缩放级别,决定网格级别,None时使用最细的0级网格
+            start_time, end_time: 时间窗口 [start_time, end_time),按小时对齐
+        OUTPUT:
+            GeoJSON FeatureCollection,每个网格中心一个点要素,properties与原热力图一致(weight/longitude/latitude)
+        '''
+        self.ensure_fresh()
+        sql, params, level, size = self._query_sql(bbox, zoom, start_time, end_time)
+
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+
+        features = []
+        for cell_x, cell_y, count in rows:
+            longitude = cell_x * size
+            latitude = cell_y * size
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+                "properties": {
+                    "weight": int(count),
+                    "longitude": longitude,
+                    "latitude": latitude
+                }
+            })
+        return {
+            "type": "FeatureCollection",
+            "features": features,
+            "level": level,
+            "cell_size": size
+        }
+
+    def stream(self, bbox=None, zoom=None, start_time=None, end_time=None):
+        """
+        与query相同的查询,逐行返回 (geometry文本, properties文本),供 geojson_stream_response 使用
+        """
+        self.ensure_fresh()
+        sql, params, _, size = self._query_sql(bbox, zoom, start_time, end_time)
+        sql = f"""
+            SELECT
+                json_build_object('type', 'Point',
+                                  'coordinates', json_build_array(cell_x * %s, cell_y * %s))::text,
+                json_build_object('weight', count, 'longitude', cell_x * %s, 'latitude', cell_y * %s)::text
+            FROM ({sql}) cells (cell_x, cell_y, count)
+        """
+        return self.db.stream_rows(sql, [size] * 4 + params)
+
+
+# 全局共享的热力图金字塔
+heatmap_pyramid = HeatmapPyramid()
@@ -0,0 +1,198 @@
+'''
+@zyh 2026-10-18
+多进程并行计算遮挡区域
+父进程用空间索引找出每个广告牌曝光圆形区域内的候选建筑物,把 广告牌×候选建筑物 切分成若干分片交给进程池,
+每个分片只传递共享内存描述、广告牌中心点、圆形区域和建筑物序号
+建筑物的高度和外轮廓坐标放在 multiprocessing.shared_memory 中,所有工作进程只读共享同一份数据,
+建筑物数据重新加载后父进程换一组共享内存,工作进程按分片中的描述重新映射,不需要重启进程池
+进程池长期保留,进程数固定为CPU核数;请求中的workers只决定分片数,不会创建或销毁进程
+工作进程用spawn方式启动,不继承Flask的线程和数据库连接池中的连接
+同一时间只有一个请求使用进程池,进程池按分片顺序返回结果,输出与串行计算完全一致
+'''
+import atexit
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import threading
+
+import numpy as np
+
+# 每个分片至少包含的建筑物数,避免分片过小时进程间通信开销超过计算量
+MIN_SHARD_SIZE = 16
+
+# 父进程中长期保留的进程池和当前建筑物数据快照的共享内存
+_pool = None
+_shared = None
+_pool_lock = threading.Lock()
+
+# 工作进程中映射的共享内存,由分片中的描述决定
+_worker_descriptor = None
+_worker_blocks = []
+_worker_arrays = None
+_worker_occlusion_feature = None
+
+
+class SharedBuildings:
+    """
+    放在共享内存中的建筑物数据快照
+    heights: 建筑物高度; coords: 全部外轮廓顶点 (N,2); offsets: 第i个建筑物的顶点为 coords[offsets[i]:offsets[i+1]]
+    """
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        counts = [len(footprint) for footprint in snapshot.footprints]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        coords = (np.concatenate([np.asarray(footprint, dtype=float).reshape(-1, 2)
+                                  for footprint in snapshot.footprints])
+                  if counts else np.zeros((0, 2)))
+        self.blocks = []
+        layout = {}
+        for name, array in (('heights', np.asarray(snapshot.heights, dtype=float)),
+                            ('offsets', offsets),
+                            ('coords', coords)):
+            # 长度为0的共享内存无法创建,至少分配1字节
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            layout[name] = (block.name, array.shape, array.dtype.str)
+        self.descriptor = (str(snapshot.version), tuple(sorted(layout.items())))
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def _init_worker(occlusion_feature):
+    global _worker_occlusion_feature
+    _worker_occlusion_feature = occlusion_feature
+
+
+def _attach(descriptor):
+    """按描述映射共享内存中的建筑物数据,与已映射的相同时直接使用"""
+    global _worker_descriptor, _worker_blocks, _worker_arrays
+    if descriptor == _worker_descriptor:
+        return _worker_arrays
+    # 先释放数组再关闭旧的共享内存,否则关闭时报错
+    _worker_arrays = None
+    for block in _worker_blocks:
+        block.close()
+    _worker_blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in descriptor[1]:
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _worker_descriptor, _worker_arrays = descriptor, arrays
+    return arrays
+
+
+def _occlusion_shard(shard):
+    descriptor, billboard_center, circle_center, circle_radius, building_ids = shard
+    arrays = _attach(descriptor)
+    heights, offsets, coords = arrays['heights'], arrays['offsets'], arrays['coords']
+    features = []
+    for building_id in building_ids:
+        # 只包含遮挡计算用到的高度和第一个多边形外轮廓
+        building = {
+            "geometry": {"coordinates": [[coords[offsets[building_id]:offsets[building_id + 1]]]]},
+            "properties": {"height": heights[building_id]},
+        }
+        feature = _worker_occlusion_feature(billboard_center, building, circle_center, circle_radius)
+        if feature is not None:
+            features.append(feature)
+    return features
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _get_pool(analyzer):
+    """
+    获取进程池和当前建筑物数据快照的共享内存,需在持有_pool_lock时调用
+    OUTPUT:
+        (进程池, 共享内存描述)
+    """
+    global _pool, _shared
+    if _shared is None or _shared.snapshot is not analyzer.snapshot:
+        # 持有锁时没有正在执行的分片,可以直接释放旧的共享内存
+        if _shared is not None:
+            _shared.release()
+        _shared = SharedBuildings(analyzer.snapshot)
+    if _pool is None:
+        workers = default_workers()
+        print(f"[INFO] 创建 {workers} 个进程的遮挡区域计算进程池")
+        _pool = multiprocessing.get_context('spawn').Pool(
+            workers, initializer=_init_worker, initargs=(type(analyzer).occlusion_feature,))
+    return _pool, _shared.descriptor
+
+
+def shutdown_pool():
+    """关闭进程池并释放共享内存,进程退出时自动调用"""
+    global _pool, _shared
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool.join()
+        if _shared is not None:
+            _shared.release()
+        _pool, _shared = None, None
+
+
+atexit.register(shutdown_pool)
+
+
+def map_occlusions(analyzer, items, workers=None):
+    '''
+    并行计算多个广告牌的遮挡区域
+    INPUT:
+        analyzer: 已加载建筑物数据和空间索引的ExposureAnalyzer
+        items: [(广告牌中心点, 曝光圆形区域要素列表)]
+        workers: 期望使用的进程数,决定分片数,默认且最多为CPU核数
+    OUTPUT:
+        与items一一对应的遮挡区域要素列表
+    '''
+    workers = min(workers or default_workers(), default_workers())
+    snapshot = analyzer.snapshot
+
+    # 候选建筑物与串行计算时的顺序相同(空间索引的查询顺序)
+    candidates = []
+    for billboard_center, exposures in items:
+        for exposure in exposures:
+            circle_center = exposure['properties'].get('center', [])
+            circle_radius = exposure['properties'].get('radius', 0)
+            building_ids = list(snapshot.index.query_circle(circle_center, circle_radius))
+            candidates.append((billboard_center, circle_center, circle_radius, building_ids))
+    total = sum(len(candidate[3]) for candidate in candidates)
+    if total == 0:
+        return [[] for _ in items]
+
+    # 进程池、共享内存只在持有锁时创建、替换和使用,其他线程不会在计算过程中释放它们
+    with _pool_lock:
+        pool, descriptor = _get_pool(analyzer)
+
+        # 切分分片,每个进程大约分到8个分片以平衡负载
+        shard_size = max(MIN_SHARD_SIZE, total // (workers * 8))
+        shards, owners = [], []
+        for position, (billboard_center, circle_center, circle_radius, building_ids) in enumerate(candidates):
+            for start in range(0, len(building_ids), shard_size):
+                shards.append((descriptor, billboard_center, circle_center, circle_radius,
+                               building_ids[start:start + shard_size]))
+                owners.append(position)
+        shard_results = pool.map(_occlusion_shard, shards)
+
+    # 按原顺序把分片结果合并回对应的圆形区域,再合并到广告牌
+    circle_features = [[] for _ in candidates]
+    for position, features in zip(owners, shard_results):
+        circle_features[position].extend(features)
+    results = []
+    position = 0
+    for _, exposures in items:
+        features = []
+        for circle in circle_features[position:position + len(exposures)]:
+            features.extend(circle)
+        results.append(features)
+        position += len(exposures)
+    return results
@@ -0,0 +1,142 @@
+'''
+@zyh 2026-10-18
+常驻内存的路网图
+节点坐标和边权以CSR(压缩稀疏行)数组保存,最近节点查询使用STRtree空间索引,
+路网只在roads表发生变化时重新构建
+'''
+import json
+import time
+
+import numpy as np
+import shapely
+
+from analysis.geometry import haversine_distances
+from analysis.table_store import TableStore
+
+
+class RoadGraph:
+    def __init__(self, node_coords, indptr, indices, weights, version=None):
+        '''
+        node_coords: 节点坐标,(N,2)数组 [[lon, lat], ...]
+        indptr, indices, weights: CSR格式的邻接表,
+            节点u的邻居为 indices[indptr[u]:indptr[u+1]],对应边权为 weights[同一区间]
+        '''
+        self.version = version
+        self.node_coords = node_coords
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.tree = shapely.STRtree(shapely.points(node_coords))
+        # 最短路径搜索(analysis/routing.py)在Python循环中逐个访问邻接表,使用list比numpy下标访问快得多
+        self._indptr = indptr.tolist()
+        self._indices = indices.tolist()
+        self._weights = weights.tolist()
+
+    @classmethod
+    def from_rows(cls, roads_data, version=None):
+        """
+        根据道路数据构建路网
+        roads_data: 从数据库查询的道路数据列表
+        """
+        print("[INFO] 开始构建路网...")
+        segments = []
+        for road in roads_data:
+            # 解析geometry (此时已经是字符串)
+            geom = road['geometry']
+            if isinstance(geom, str):
+                geom = json.loads(geom)
+
+            if geom['type'] != 'MultiLineString':
+                continue
+
+            # 每条线段的相邻坐标构成一条边
+            for line_coords in geom['coordinates']:
+                line = np.asarray(line_coords, dtype=float)[:, :2]
+                if len(line) >= 2:
+                    segments.append(np.hstack([line[:-1], line[1:]]))
+
+        segments = np.vstack(segments) if segments else np.zeros((0, 4))
+
+        # 坐标完全相同的点视为同一个节点
+        node_coords, inverse = np.unique(segments.reshape(-1, 2), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1, 2)
+        weights = cls.edge_weights(node_coords[inverse[:, 0]], node_coords[inverse[:, 1]])
+
+        # 去掉自环,无向边拆成两个方向,重复边只保留权重最小的一条
+        keep = inverse[:, 0] != inverse[:, 1]
+        src = np.concatenate([inverse[keep, 0], inverse[keep, 1]])
+        dst = np.concatenate([inverse[keep, 1], inverse[keep, 0]])
+        weights = np.concatenate([weights[keep], weights[keep]])
+        order = np.lexsort((weights, dst, src))
+        src, dst, weights = src[order], dst[order], weights[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, weights = src[first], dst[first], weights[first]
+
+        indptr = np.zeros(len(node_coords) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(node_coords)), out=indptr[1:])
+
+        graph = cls(node_coords, indptr, dst.astype(np.int64), weights, version)
+        print(f"[INFO] 路网构建完成: {graph.node_count} 个节点, {graph.edge_count} 条边")
+        return graph
+
+    @staticmethod
+    def edge_weights(start, end):
+        """边权: 两端点间的球面距离(米)"""
+        return haversine_distances(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+
+    @property
+    def node_count(self):
+        return len(self.node_coords)
+
+    @property
+    def edge_count(self):
+        """无向边数量"""
+        return len(self.indices) // 2
+
+    def node_coordinate(self, node):
+        return tuple(self.node_coords[node].tolist())
+
+    def nearest_node(self, point, search_radius=0.01):
+        """
+        找到离给定点最近的路网节点
+        point: (lon, lat)
+        search_radius: 搜索范围(经纬度差值,约1公里),超出范围返回None
+        返回: (节点编号, 距离)
+        """
+        if self.node_count == 0:
+            return None, None
+
+        x, y = point
+        geom = shapely.Point(x, y)
+        # 全局最近的节点在搜索范围内时直接返回
+        nearest = self.tree.query_nearest(geom)
+        if len(nearest):
+            node = int(nearest[0])
+            dist = float(np.hypot(*(self.node_coords[node] - (x, y))))
+            if dist <= search_radius:
+                return node, dist
+
+        # 否则在搜索范围的矩形内查找(与逐个节点比较经纬度差值的规则一致)
+        candidates = self.tree.query(shapely.box(x - search_radius, y - search_radius,
+                                                 x + search_radius, y + search_radius))
+        if len(candidates) == 0:
+            return None, None
+        dists = np.hypot(self.node_coords[candidates, 0] - x, self.node_coords[candidates, 1] - y)
+        best = int(np.argmin(dists))
+        return int(candidates[best]), float(dists[best])
+
+
+class RoadGraphStore(TableStore):
+    def __init__(self, check_interval=5.0):
+        super().__init__('roads', check_interval)
+
+    def _load(self, db, version):
+        start_time = time.time()
+        graph = RoadGraph.from_rows(db.fetch_roads(), version)
+        print(f"[INFO] 路网数据加载成功, 耗时: {time.time() - start_time:.2f} 秒")
+        return graph
+
+
+# 全局共享的路网
+road_graph_store = RoadGraphStore()
@@ -0,0 +1,150 @@
+'''
+@zyh 2026-10-18
+路网最短路径搜索算法
+在RoadGraph的CSR邻接表上实现Dijkstra、A*(球面距离启发)和双向Dijkstra,
+边权为道路长度(米),每次搜索返回访问(确定最短距离)的节点数和耗时,便于比较各算法
+'''
+import heapq
+import time
+
+from analysis.geometry import haversine_distances
+
+ALGORITHMS = ('dijkstra', 'astar', 'bidirectional')
+
+
+def _build_path(prev, source, target):
+    path = [target]
+    while path[-1] != source:
+        path.append(prev[path[-1]])
+    path.reverse()
+    return path
+
+
+def dijkstra(graph, source, target):
+    """
+    Dijkstra最短路径
+    返回: (节点编号列表或None, 访问节点数)
+    """
+    indptr, indices, weights = graph._indptr, graph._indices, graph._weights
+    dist = {source: 0.0}
+    prev = {}
+    settled = set()
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target:
+            return _build_path(prev, source, target), len(settled)
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            nd = d + weights[k]
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                prev[v] = u
+                heapq.heappush(heap, (nd, v))
+    return None, len(settled)
+
+
+def astar(graph, source, target):
+    """
+    A*最短路径,启发函数为节点到终点的球面距离(米)
+    边权同样是球面距离,启发函数不会高估剩余距离,因此结果与Dijkstra一样是最短路径
+    返回: (节点编号列表或None, 访问节点数)
+    """
+    indptr, indices, weights = graph._indptr, graph._indices, graph._weights
+    target_lon, target_lat = graph.node_coords[target]
+    # 一次性计算所有节点到终点的距离作为启发值
+    heuristic = haversine_distances(graph.node_coords[:, 0], graph.node_coords[:, 1],
+                                    target_lon, target_lat).tolist()
+    dist = {source: 0.0}
+    prev = {}
+    settled = set()
+    heap = [(heuristic[source], source)]
+    while heap:
+        _, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target:
+            return _build_path(prev, source, target), len(settled)
+        d = dist[u]
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            nd = d + weights[k]
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                prev[v] = u
+                heapq.heappush(heap, (nd + heuristic[v], v))
+    return None, len(settled)
+
+
+def bidirectional_dijkstra(graph, source, target):
+    """
+    双向Dijkstra最短路径,从起点和终点同时搜索(路网为无向图,反向邻接表与正向相同)
+    返回: (节点编号列表或None, 访问节点数)
+    """
+    if source == target:
+        return [source], 1
+    indptr, indices, weights = graph._indptr, graph._indices, graph._weights
+    dists = ({source: 0.0}, {target: 0.0})
+    prevs = ({}, {})
+    settled = (set(), set())
+    heaps = ([(0.0, source)], [(0.0, target)])
+    best, meeting = float('inf'), None
+
+    while heaps[0] and heaps[1]:
+        # 两个方向队首距离之和不小于当前最优值时,最优路径已经确定
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        # 每次扩展队列较小的一侧
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        dist, prev, done, heap = dists[side], prevs[side], settled[side], heaps[side]
+        other_dist = dists[1 - side]
+
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            nd = d + weights[k]
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                prev[v] = u
+                heapq.heappush(heap, (nd, v))
+            if v in other_dist and nd + other_dist[v] < best:
+                best = nd + other_dist[v]
+                meeting = v
+
+    settled_count = len(settled[0]) + len(settled[1])
+    if meeting is None:
+        return None, settled_count
+    forward = _build_path(prevs[0], source, meeting)
+    backward = _build_path(prevs[1], target, meeting)
+    return forward + backward[-2::-1], settled_count
+
+
+def find_path(graph, source, target, algorithm='astar'):
+    """
+    使用指定算法计算最短路径
+    algorithm: 'dijkstra' | 'astar' | 'bidirectional'
+    返回: (节点编号列表或None, 统计信息)
+    """
+    search = {
+        'dijkstra': dijkstra,
+        'astar': astar,
+        'bidirectional': bidirectional_dijkstra,
+    }.get(algorithm)
+    if search is None:
+        raise ValueError(f"不支持的最短路径算法: {algorithm}, 可选: {', '.join(ALGORITHMS)}")
+
+    start_time = time.perf_counter()
+    path, settled_count = search(graph, source, target)
+    stats = {
+        "algorithm": algorithm,
+        "settled_nodes": settled_count,
+        "elapsed_ms": (time.perf_counter() - start_time) * 1000,
+    }
+    return path, stats
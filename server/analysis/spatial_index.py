@@ -0,0 +1,84 @@
+'''
+@zyh 2026-10-18
+建筑物空间索引
+使用STRtree对建筑物外包矩形建立索引,圆形范围查询先按外包矩形粗筛候选建筑物,
+再按"任意顶点到圆心的球面距离不超过半径"的规则精确判断,结果与逐个建筑物遍历完全一致
+'''
+import math
+
+import numpy as np
+import shapely
+
+from analysis.geometry import haversine_distances
+
+R = 6371000  # 地球平均半径(米),与haversine_distance保持一致
+
+
+class BuildingIndex:
+    def __init__(self, features):
+        '''
+        features: 建筑物GeoJSON要素列表(MultiPolygon)
+        '''
+        self.features = features
+        # 每个建筑物的全部顶点(包括所有多边形的所有环),按顺序保存以便精确判断
+        self.vertices = []
+        bounds = np.zeros((len(features), 4), dtype=float)
+        for i, feature in enumerate(features):
+            points = [point
+                      for polygon in feature["geometry"]["coordinates"]
+                      for ring in polygon
+                      for point in ring]
+            vertices = np.asarray(points, dtype=float).reshape(-1, 2)
+            self.vertices.append(vertices)
+            if len(vertices):
+                bounds[i] = [vertices[:, 0].min(), vertices[:, 1].min(),
+                             vertices[:, 0].max(), vertices[:, 1].max()]
+            else:
+                bounds[i] = np.nan
+        self.tree = shapely.STRtree(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+
+    def __len__(self):
+        return len(self.features)
+
+    @staticmethod
+    def circle_bounds(circle_center, circle_radius):
+        '''
+        计算球面圆的经纬度外包矩形(保守估计,保证圆内的点一定落在矩形内)
+        INPUT:
+            circle_center: 圆心坐标，格式为 [lon, lat]
+            circle_radius: 圆形半径(米)
+        OUTPUT:
+            (min_lon, min_lat, max_lon, max_lat)
+        '''
+        lon, lat = circle_center
+        # 留出少量余量,避免浮点误差把边界上的点排除在外
+        delta = circle_radius / R * (1 + 1e-6) + 1e-12
+        dlat = math.degrees(delta)
+
+        # 纬度差不会超过球面距离对应的圆心角
+        max_abs_lat = min(abs(math.radians(lat)) + delta, math.pi / 2)
+        cos_product = math.cos(math.radians(lat)) * math.cos(max_abs_lat)
+        if cos_product <= 0:
+            dlon = 180.0
+        else:
+            # haversine: sin²(Δλ/2)·cosφ1·cosφ2 <= sin²(δ/2)
+            s = math.sin(delta / 2) / math.sqrt(cos_product)
+            dlon = 180.0 if s >= 1 else math.degrees(2 * math.asin(s))
+        return (lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+
+    def query_circle(self, circle_center, circle_radius):
+        '''
+        查询圆形范围内的建筑物
+        OUTPUT:
+            按原始顺序排列的建筑物下标列表
+        '''
+        box = shapely.box(*self.circle_bounds(circle_center, circle_radius))
+        candidates = np.sort(self.tree.query(box))
+        if len(candidates) == 0:
+            return []
+
+        # 一次性计算所有候选建筑物顶点到圆心的距离
+        vertices = np.concatenate([self.vertices[i] for i in candidates])
+        owners = np.repeat(candidates, [len(self.vertices[i]) for i in candidates])
+        distances = haversine_distances(circle_center[0], circle_center[1], vertices[:, 0], vertices[:, 1])
+        return np.unique(owners[distances <= circle_radius]).tolist()
@@ -0,0 +1,48 @@
+'''
+@zyh 2026-10-18
+按数据表版本缓存的进程内数据
+首次访问时从数据库加载,之后仅在对应数据表发生变化时重新加载
+'''
+from abc import ABC, abstractmethod
+import threading
+import time
+
+
+class TableStore(ABC):
+    def __init__(self, table_name, check_interval=5.0, key_column='id'):
+        '''
+        table_name: 数据来源的数据表,用于检查版本
+        check_interval: 两次检查表版本之间的最小间隔(秒),避免每个请求都查询数据库
+        key_column: 计算表版本时取最大值的列
+        '''
+        self.table_name = table_name
+        self.key_column = key_column
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db):
+        """
+        获取当前数据快照,首次调用或数据表发生变化时重新加载
+        db: Database实例
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+
+            version = db.get_table_version(self.table_name, self.key_column)
+            self._checked_at = now
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._load(db, version)
+            return self._snapshot
+
+    def invalidate(self):
+        """强制下次访问时重新加载"""
+        with self._lock:
+            self._snapshot = None
+
+    @abstractmethod
+    def _load(self, db, version):
+        """从数据库加载数据,返回带有version属性的快照,子类必须实现"""
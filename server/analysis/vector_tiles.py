@@ -0,0 +1,115 @@
+'''
+@zyh 2026-10-18
+矢量切片(Mapbox Vector Tile)
+使用 ST_AsMVT/ST_AsMVTGeom 按 z/x/y 从 geojson、roads、poi、gps 表生成切片,
+线面要素按缩放级别简化,GPS点在低缩放级别按网格聚合
+'''
+from config.database import Database
+
+# 切片坐标范围(ST_AsMVT默认4096)和边缘缓冲
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Web墨卡托赤道周长(米)
+WEB_MERCATOR_CIRCUMFERENCE = 40075016.685578488
+
+# 图层配置
+# table: 数据表, columns: 写入切片的属性, min_zoom: 低于该级别返回空切片,
+# simplify: 是否按缩放级别简化几何, aggregate_below: 低于该级别时按网格聚合点要素
+LAYERS = {
+    'buildings': {
+        'table': 'geojson',
+        'columns': "t.height::float8 AS height, t.properties->>'name' AS name",
+        'min_zoom': 12,
+        'simplify': True,
+    },
+    'roads': {
+        'table': 'roads',
+        'columns': "t.properties->>'fclass' AS fclass, t.properties->>'name' AS name",
+        'min_zoom': 10,
+        'simplify': True,
+    },
+    'poi': {
+        'table': 'poi',
+        'columns': "t.name, t.category",
+        'min_zoom': 12,
+        'simplify': False,
+    },
+    'gps': {
+        'table': 'gps',
+        'columns': "t.taxi_id, extract(epoch FROM t.timestamp)::bigint AS epoch",
+        'min_zoom': 0,
+        'simplify': False,
+        'aggregate_below': 16,
+    },
+}
+
+
+class VectorTiles:
+    def __init__(self, simplify_units=4, aggregate_units=16):
+        '''
+        simplify_units: 简化容差(切片坐标单位,4096为一个切片宽度)
+        aggregate_units: 点聚合网格大小(切片坐标单位)
+        '''
+        self.db = Database()
+        self.simplify_units = simplify_units
+        self.aggregate_units = aggregate_units
+
+    @staticmethod
+    def tile_resolution(z):
+        """z级切片中一个切片坐标单位对应的Web墨卡托距离(米)"""
+        return WEB_MERCATOR_CIRCUMFERENCE / (TILE_EXTENT * 2 ** z)
+
+    def build_sql(self, layer, z):
+        """生成切片查询SQL,参数为 z, x, y"""
+        config = LAYERS[layer]
+        geom = "ST_Transform(t.geometry, 3857)"
+        columns = config['columns']
+        group_by = ""
+
+        if z < config.get('aggregate_below', -1):
+            # 点要素按网格聚合,输出网格内的点数
+            cell = self.tile_resolution(z) * self.aggregate_units
+            geom = f"ST_SnapToGrid({geom}, {cell})"
+            columns = "COUNT(*) AS count"
+            group_by = "GROUP BY 1"
+        elif config['simplify']:
+            tolerance = self.tile_resolution(z) * self.simplify_units
+            geom = f"ST_SimplifyPreserveTopology({geom}, {tolerance})"
+
+        return f"""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(%s, %s, %s) AS geom
+            ),
+            mvtgeom AS (
+                SELECT
+                    ST_AsMVTGeom({geom}, bounds.geom, {TILE_EXTENT}, {TILE_BUFFER}, true) AS geom,
+                    {columns}
+                FROM {config['table']} t, bounds
+                WHERE t.geometry && ST_Transform(bounds.geom, 4326)
+                {group_by}
+            )
+            SELECT ST_AsMVT(mvtgeom.*, %s, {TILE_EXTENT}, 'geom')
+            FROM mvtgeom
+            WHERE geom IS NOT NULL
+        """
+
+    def get_tile(self, layer, z, x, y):
+        """
+        获取矢量切片
+        返回: MVT二进制数据,缩放级别低于图层min_zoom时返回空切片
+        """
+        if layer not in LAYERS:
+            raise KeyError(f"未知的图层: {layer}")
+        if not (0 <= z <= 24 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"无效的切片坐标: {z}/{x}/{y}")
+        if z < LAYERS[layer]['min_zoom']:
+            return b''
+
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(self.build_sql(layer, z), (z, x, y, layer))
+                tile = cur.fetchone()[0]
+            return bytes(tile) if tile is not None else b''
+        finally:
+            conn.close()
@@ -0,0 +1,236 @@
+'''
+@zyh 2026-10-18
+角度扫描可见性算法
+高于广告牌的建筑物会完全挡住其后方的视线:把这些建筑物外轮廓朝向广告牌的边按相对广告牌的角度排序,
+沿角度扫描并按到广告牌的距离维护与当前射线相交的边,最近的边即为可见范围的边界,
+扫描一遍直接得到曝光圆形区域内的可见多边形,不需要为每个建筑物生成遮挡多边形再合并
+低于广告牌的建筑物只在其与地面投影之间形成有限的遮挡,其后方仍然可见,不能用单条射线上的最近交点表示,
+这部分仍按原有方式生成投影遮挡多边形,再从可见多边形中扣除
+互不相交的边在同一条射线上的远近顺序不随角度改变,因此活动边只需在加入时按距离二分插入、
+在结束角处二分查找移出,每个角度事件的最近边即为有序列表的第一个;
+多边形顶点只在事件角度处产生,两个事件之间沿最近的边为直线段。
+n条边共2n个事件,排序和二分查找共 O(n log n) 次比较
+'''
+import bisect
+import math
+import time
+
+import numpy as np
+import shapely
+
+from analysis.visible_area import combine, polygons_from_features, repair, subtract_occlusions
+
+# 与 points_at_distance 一致的经纬度与米的换算
+METERS_PER_DEGREE = 111000
+# 裁剪用的圆形多边形每个象限的线段数
+QUAD_SEGMENTS = 32
+# 扫描范围比圆形半径略大,最后裁剪到曝光区域多边形
+MARGIN = 1.01
+
+
+def _to_local(lon0, lat0, points):
+    """经纬度转换为以(lon0, lat0)为原点的平面坐标(米)"""
+    points = np.asarray(points, dtype=float)
+    scale = np.array([METERS_PER_DEGREE * np.cos(np.radians(lat0)), METERS_PER_DEGREE])
+    return (points - [lon0, lat0]) * scale
+
+
+def _to_lonlat(lon0, lat0, geometry):
+    scale = np.array([METERS_PER_DEGREE * np.cos(np.radians(lat0)), METERS_PER_DEGREE])
+    return shapely.transform(geometry, lambda coords: coords / scale + [lon0, lat0])
+
+
+def _edge_spans(edges):
+    '''
+    计算每条边相对原点覆盖的角度范围 [lo, hi]
+    跨过 ±pi 的边拆成两段,返回 (lo, hi, 边序号)
+    '''
+    a1 = np.arctan2(edges[:, 0, 1], edges[:, 0, 0])
+    a2 = np.arctan2(edges[:, 1, 1], edges[:, 1, 0])
+    diff = (a2 - a1 + np.pi) % (2 * np.pi) - np.pi
+    lo = np.where(diff >= 0, a1, a2)
+    hi = lo + np.abs(diff)
+    index = np.arange(len(edges))
+    wrap = hi > np.pi
+    return (np.concatenate([lo, np.full(wrap.sum(), -np.pi)]),
+            np.concatenate([np.where(wrap, np.pi, hi), hi[wrap] - 2 * np.pi]),
+            np.concatenate([index, index[wrap]]))
+
+
+def _ring_edges(rings):
+    """线环数组的全部边 (N,2,2),以及每条边所属线环的序号"""
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    same = index[:-1] == index[1:]
+    return np.stack([coords[:-1][same], coords[1:][same]], axis=1), index[:-1][same]
+
+
+def _blocking_edges(footprints):
+    """
+    高于广告牌的建筑物中可能挡住视线的边(平面坐标,以广告牌为原点)
+    相互重叠的外轮廓先合并,合并后的边界除端点外互不相交,满足角度扫描的要求;
+    从外部看,射线与合并后边界的第一个交点就是与各外轮廓的第一个交点,可见区域不变。
+    原点在合并后的多边形内部时(广告牌位于建筑物内)保留该多边形的全部边界
+    """
+    if not footprints:
+        return np.zeros((0, 2, 2))
+    coords = np.concatenate([np.asarray(footprint)[:, :2] for footprint in footprints])
+    indices = np.repeat(np.arange(len(footprints)), [len(footprint) for footprint in footprints])
+    polygons = repair(shapely.polygons(shapely.linearrings(coords, indices=indices)))
+    parts = shapely.get_parts(shapely.union_all(polygons))
+    parts = parts[(shapely.get_type_id(parts) == 3) & ~shapely.is_empty(parts)]
+    exteriors = shapely.get_exterior_ring(parts)
+    inside = shapely.contains_xy(shapely.polygons(exteriors), 0.0, 0.0)
+
+    # 原点在外轮廓之外: 任意射线与外轮廓的第一个交点都在朝向原点的边上,背面的边不需要参与扫描
+    # 逆时针外轮廓(面积为正)中朝向原点的边满足 cross < 0,顺时针相反
+    edges, ring = _ring_edges(exteriors[~inside])
+    cross = edges[:, 0, 0] * edges[:, 1, 1] - edges[:, 0, 1] * edges[:, 1, 0]
+    area = np.bincount(ring, weights=cross, minlength=(~inside).sum())
+    blocking = [edges[cross * np.sign(area[ring]) < 0]]
+
+    # 原点在外轮廓之内: 外轮廓和所有内环都可能挡住视线
+    for polygon in parts[inside]:
+        rings = [polygon.exterior] + list(polygon.interiors)
+        blocking.append(_ring_edges(np.array(rings, dtype=object))[0])
+    return np.concatenate(blocking)
+
+
+def sweep_visibility(edges, circle_center, radius):
+    '''
+    在以广告牌为原点的平面坐标(米)中,用角度扫描计算圆形区域内从原点可见的区域
+    INPUT:
+        edges: (N,2,2) 遮挡边数组,除端点外互不相交(见 _blocking_edges)
+        circle_center: 圆心 [x, y]
+        radius: 半径(米)
+    OUTPUT:
+        可见区域(shapely几何)
+    '''
+    circle_center = np.asarray(circle_center, dtype=float)
+    radius = radius * MARGIN
+    distance = np.hypot(*circle_center)
+    if distance > radius:
+        phi = np.arctan2(circle_center[1], circle_center[0])
+        half = np.arcsin(radius / distance)
+        range_lo, range_hi = phi - half, phi + half
+    else:
+        range_lo, range_hi = -np.pi, np.pi
+
+    # 把扫描范围旋转到(-pi, pi]内不跨越 ±pi 的位置
+    rotation = (range_lo + range_hi) / 2 if distance > radius else 0.0
+    cos_r, sin_r = np.cos(-rotation), np.sin(-rotation)
+    matrix = np.array([[cos_r, -sin_r], [sin_r, cos_r]])
+    range_lo, range_hi = range_lo - rotation, range_hi - rotation
+
+    # 去掉经过原点的退化边(广告牌贴在建筑物外墙上时)
+    edges = np.asarray(edges, dtype=float).reshape(-1, 2, 2)
+    if len(edges):
+        edges = edges @ matrix.T
+        direction = edges[:, 1] - edges[:, 0]
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        keep = length > 0
+        cross = np.abs(edges[:, 0, 0] * direction[:, 1] - edges[:, 0, 1] * direction[:, 0])
+        keep &= cross / np.where(length > 0, length, 1) > 1e-2
+        edges = edges[keep]
+
+    # 包围全部边和圆形区域的正方形作为最远的边,没有建筑物遮挡的方向止于正方形,最后裁剪到圆形区域
+    reach = 2 * max(distance + radius, np.abs(edges).max() if len(edges) else 0.0)
+    square = np.array([[-reach, -reach], [reach, -reach], [reach, reach], [-reach, reach], [-reach, -reach]])
+    edges = np.concatenate([edges, np.stack([square[:-1], square[1:]], axis=1)])
+
+    # 每条边的角度范围裁剪到扫描范围内,去掉宽度为0的范围
+    lo, hi, owner = _edge_spans(edges)
+    lo, hi = np.maximum(lo, range_lo), np.minimum(hi, range_hi)
+    inside = hi > lo
+    lo, hi, owner = lo[inside], hi[inside], owner[inside]
+
+    # 事件角度: 扫描范围两端和各边的起止角度;在两个相邻事件之间活动边集合与远近顺序都不变
+    angles = np.unique(np.concatenate([[range_lo, range_hi], lo, hi]))
+    starts = [[] for _ in angles]
+    ends = [[] for _ in angles]
+    for span, (start, end) in enumerate(zip(np.searchsorted(angles, lo), np.searchsorted(angles, hi))):
+        starts[start].append(int(owner[span]))
+        ends[end].append(int(owner[span]))
+    middles = ((angles[:-1] + angles[1:]) / 2).tolist()
+
+    # 射线 t*u 与边 p + s*d 的交点: t = (p×d)/(u×d)
+    px, py = edges[:, 0, 0], edges[:, 0, 1]
+    dx, dy = edges[:, 1, 0] - px, edges[:, 1, 1] - py
+    p_cross_d, dx, dy = (px * dy - py * dx).tolist(), dx.tolist(), dy.tolist()
+
+    def reach_at(angle):
+        cos_t, sin_t = math.cos(angle), math.sin(angle)
+        return lambda edge: p_cross_d[edge] / (cos_t * dy[edge] - sin_t * dx[edge])
+
+    # active: 与当前射线相交的边,按到原点的距离从近到远排列
+    active = []
+    ring = [] if distance <= radius else [(0.0, 0.0)]
+    angles = angles.tolist()
+    for k, theta in enumerate(angles):
+        cos_t, sin_t = math.cos(theta), math.sin(theta)
+        if k > 0:
+            # 事件之前的最近边在该角度处的交点
+            t = reach_at(theta)(active[0])
+            ring.append((t * cos_t, t * sin_t))
+        if k == len(angles) - 1:
+            break
+        if ends[k]:
+            # 在上一段角度中间查找要移出的边,此时顺序与插入时一致
+            key = reach_at(middles[k - 1])
+            for edge in ends[k]:
+                i = bisect.bisect_left(active, key(edge), key=key)
+                if i >= len(active) or active[i] != edge:
+                    i = active.index(edge)
+                del active[i]
+        if starts[k]:
+            key = reach_at(middles[k])
+            for edge in starts[k]:
+                bisect.insort(active, edge, key=key)
+        # 事件之后的最近边在该角度处的交点
+        t = reach_at(theta)(active[0])
+        point = (t * cos_t, t * sin_t)
+        if not ring or point != ring[-1]:
+            ring.append(point)
+
+    # 旋转回原来的方向后裁剪到圆形区域
+    polygon = repair(np.array([shapely.Polygon(np.asarray(ring) @ matrix)], dtype=object))[0]
+    circle = shapely.Point(circle_center).buffer(radius, quad_segs=QUAD_SEGMENTS)
+    return shapely.intersection(polygon, circle)
+
+
+def sweep_visible_area(analyzer, billboard_center, exposure_features, timings=None):
+    '''
+    用角度扫描计算单个广告牌的显示区域
+    INPUT:
+        analyzer: 已加载建筑物数据的ExposureAnalyzer
+        billboard_center: 广告牌中心点 [lon, lat, 高度]
+        exposure_features: 广告牌的曝光圆形区域要素
+        timings: 传入dict时按阶段累加耗时(秒),扫描耗时记为sweep
+    OUTPUT:
+        (显示区域(shapely几何), 低于广告牌的建筑物的投影遮挡要素)
+    '''
+    lon0, lat0, center_height = billboard_center
+    areas = []
+    occlusion_features = []
+    for exposure in exposure_features:
+        start = time.perf_counter()
+        circle_center = exposure['properties'].get('center', [])
+        circle_radius = exposure['properties'].get('radius', 0)
+        footprints = []
+        projections = []
+        for building in analyzer.buildings_in_exposure(exposure):
+            if float(building['properties'].get('height', 0)) > center_height:
+                footprints.append(_to_local(lon0, lat0, building['geometry']['coordinates'][0][0]))
+            else:
+                feature = analyzer.occlusion_feature(billboard_center, building, circle_center, circle_radius)
+                if feature is not None:
+                    projections.append(feature)
+        edges = _blocking_edges(footprints)
+        local = sweep_visibility(edges, _to_local(lon0, lat0, circle_center), circle_radius)
+        exposure_polygon = repair(polygons_from_features([exposure]))[0]
+        area = shapely.intersection(_to_lonlat(lon0, lat0, local), exposure_polygon)
+        if timings is not None:
+            timings['sweep'] = timings.get('sweep', 0.0) + time.perf_counter() - start
+
+        areas.append(subtract_occlusions(area, projections, timings))
+        occlusion_features.extend(projections)
+    return combine(areas, timings), occlusion_features
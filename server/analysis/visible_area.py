@@ -0,0 +1,127 @@
+'''
+@zyh 2026-10-18
+显示区域计算引擎
+每个广告牌单独计算: 遮挡多边形先裁剪到自己的曝光圆形区域内,再合并并从曝光区域中扣除,
+最后合并各广告牌的显示区域。几何构造、有效性检查、裁剪和合并都使用shapely 2的数组运算,
+只对无效的几何执行buffer(0)修复
+'''
+import time
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+# 各阶段名称,timings中按此顺序累加耗时(秒)
+PHASES = ('parse', 'repair', 'clip', 'union', 'difference', 'combine')
+
+
+def _add_time(timings, phase, start):
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def polygons_from_features(features):
+    """
+    把GeoJSON多边形要素批量转换为shapely几何数组
+    只有外环的Polygon一次性构造,其他几何类型逐个用shape()转换
+    """
+    rings = []
+    simple = []
+    for i, feature in enumerate(features):
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon' and len(geometry['coordinates']) == 1:
+            ring = np.asarray(geometry['coordinates'][0], dtype=float)
+            if len(ring) >= 3:
+                rings.append(ring[:, :2])
+                simple.append(i)
+
+    result = np.empty(len(features), dtype=object)
+    if rings:
+        indices = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+        result[simple] = shapely.polygons(shapely.linearrings(np.concatenate(rings), indices=indices))
+    others = np.setdiff1d(np.arange(len(features)), simple)
+    for i in others:
+        result[i] = shape(features[i]['geometry'])
+    return result
+
+
+def repair(geometries):
+    """只对无效的几何执行buffer(0)修复,与原有的修复方式一致"""
+    if not len(geometries):
+        return geometries
+    invalid = ~shapely.is_valid(geometries)
+    if invalid.any():
+        geometries = geometries.copy()
+        geometries[invalid] = shapely.buffer(geometries[invalid], 0)
+    return geometries
+
+
+def billboard_visible_area(exposure_features, occlusion_features, timings=None):
+    '''
+    计算单个广告牌的显示区域
+    INPUT:
+        exposure_features: 广告牌的曝光圆形区域要素
+        occlusion_features: 广告牌的遮挡区域要素
+        timings: 传入dict时按阶段累加耗时(秒)
+    OUTPUT:
+        显示区域(shapely几何)
+    '''
+    start = time.perf_counter()
+    exposures = polygons_from_features(exposure_features)
+    _add_time(timings, 'parse', start)
+
+    start = time.perf_counter()
+    exposures = repair(exposures)
+    _add_time(timings, 'repair', start)
+
+    start = time.perf_counter()
+    exposure = shapely.union_all(exposures) if len(exposures) > 1 else (
+        exposures[0] if len(exposures) else shapely.Polygon())
+    _add_time(timings, 'union', start)
+    return subtract_occlusions(exposure, occlusion_features, timings)
+
+
+def subtract_occlusions(area, occlusion_features, timings=None):
+    '''
+    从区域中扣除遮挡区域: 遮挡多边形先裁剪到区域内,合并后再扣除
+    INPUT:
+        area: 区域(shapely几何),通常为广告牌的曝光区域
+        occlusion_features: 遮挡区域要素
+        timings: 传入dict时按阶段累加耗时(秒)
+    '''
+    start = time.perf_counter()
+    occlusions = polygons_from_features(occlusion_features)
+    _add_time(timings, 'parse', start)
+
+    start = time.perf_counter()
+    occlusions = repair(occlusions)
+    _add_time(timings, 'repair', start)
+
+    start = time.perf_counter()
+    if len(occlusions):
+        # 只保留与区域相交的遮挡多边形并裁剪到区域内
+        shapely.prepare(area)
+        occlusions = occlusions[shapely.intersects(area, occlusions)]
+        occlusions = shapely.intersection(occlusions, area)
+    _add_time(timings, 'clip', start)
+
+    start = time.perf_counter()
+    occlusion = shapely.union_all(occlusions) if len(occlusions) else None
+    _add_time(timings, 'union', start)
+
+    start = time.perf_counter()
+    visible = area if occlusion is None or occlusion.is_empty else shapely.difference(area, occlusion)
+    visible = repair(np.array([visible], dtype=object))[0]
+    _add_time(timings, 'difference', start)
+    return visible
+
+
+def combine(areas, timings=None):
+    """合并各广告牌的显示区域"""
+    start = time.perf_counter()
+    if not len(areas):
+        geometry = shapely.Polygon()
+    else:
+        geometry = repair(np.array([shapely.union_all(np.asarray(areas, dtype=object))], dtype=object))[0]
+    _add_time(timings, 'combine', start)
+    return geometry
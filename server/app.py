@@ -1,10 +1,24 @@
-from flask import Flask,jsonify,request
+from flask import Flask,jsonify,request,Response
 from flask_cors import CORS  #跨域
 from config.database import Database
 from analysis.exposure import ExposureAnalyzer
+from analysis.exposure_cache import exposure_cache
+from analysis.parallel_occlusion import default_workers
+from analysis.building_store import building_store
 from analysis.gps_info import GPSAnalyzer
+from analysis.heatmap_pyramid import heatmap_pyramid
 from analysis.shortest_path import ShortestPath
+from analysis.routing import ALGORITHMS
+from analysis.road_graph import road_graph_store
+from analysis.contraction import contraction_store
+from analysis.vector_tiles import VectorTiles, LAYERS as TILE_LAYERS
+from utils.geojson_stream import geojson_stream_response
+from utils.ndjson_stream import ndjson_stream_response
+from utils.response_cache import cached_layer, response_cache
 import json
+import time
+from datetime import datetime
+import numpy as np
 import psycopg2
 
 app = Flask(__name__)
@@ -17,14 +31,39 @@ current_GEA = []
 current_IA = []
 current_VA = []
 
+def _stream_requested():
+    """请求参数 stream=1/true 时使用流式GeoJSON输出"""
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+def _time_window():
+    """
+    解析请求参数中的时间窗口 start/end (ISO格式,如 2008-02-02 或 2008-02-02T08:00:00)
+    返回: (start, end),未指定的一端为None;格式错误时抛出ValueError
+    """
+    window = []
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        window.append(datetime.fromisoformat(value) if value else None)
+    return tuple(window)
+
 @app.route('/')
 def hello_world():
     return 'Hello, World!'
 
 @app.route('/geojson')
+@cached_layer('geojson')
 def get_geojson():
     try:
         db = Database()
+        # aggregate=1 时由PostGIS一次生成完整的FeatureCollection, precision为坐标小数位数
+        if request.args.get('aggregate', '').lower() in ('1', 'true'):
+            precision = request.args.get('precision', 9, type=int)
+            if not 0 <= precision <= 15:
+                return jsonify({"error": "precision必须在0到15之间"}), 400
+            return Response(db.fetch_geojson_collection(precision), mimetype='application/json')
+        if _stream_requested():
+            return geojson_stream_response(db.stream_rows(
+                "SELECT ST_AsGeoJSON(geometry), properties::text FROM geojson"))
         rows = db.fetch_geojson()        
         features = []
         for row in rows:
@@ -132,9 +171,19 @@ def calculate_GEA():
 
 @app.route('/IA', methods=['GET'])
 def calculate_IA():
-    """计算所有广告牌的遮挡区域"""
+    """
+    计算所有广告牌的遮挡区域
+    参数 workers: 计算遮挡区域的进程数,默认1(串行),超过CPU核数时按CPU核数计算,结果与串行计算一致
+    """
     try:
-        analyzer = ExposureAnalyzer()
+        workers = request.args.get('workers', 1, type=int)
+        if workers < 1:
+            return jsonify({
+                "status": "error",
+                "message": "workers必须大于0"
+            }), 400
+        workers = min(workers, default_workers())
+        analyzer = ExposureAnalyzer(workers=workers)
         if not analyzer.load_buildings():
             return jsonify({
                 "status": "error",
@@ -158,10 +207,30 @@ def calculate_IA():
 
 @app.route('/VA', methods=['GET'])
 def calculate_VA():
-    """计算所有广告牌的显示区域"""
+    """
+    计算所有广告牌的显示区域
+    参数 by=billboard 时按广告牌id分别返回每个广告牌的显示区域,不改变当前保存的显示区域
+    参数 engine: global(默认) 原有的整体计算方式 / billboard 每个广告牌单独扣除自己的遮挡区域后合并
+    engine=billboard 时使用分析结果缓存,只计算新增或修改过的广告牌;
+    global 用全部遮挡区域的并集整体扣除,结果不能按广告牌拆分,每次都完整计算
+    """
     try:    
+        engine = request.args.get('engine', 'global')
+        if engine not in ('global', 'billboard'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的计算方式: {engine}, 可选: global, billboard"
+            }), 400
         analyzer = ExposureAnalyzer()
-        visible_area_geojson = analyzer.calculate_visible_area(current_GEA, current_IA)
+        if request.args.get('by') == 'billboard':
+            return jsonify(analyzer.calculate_visible_area(current_GEA, current_IA, by_billboard=True))
+        if engine == 'billboard' and not analyzer.load_buildings():
+            return jsonify({
+                "status": "error",
+                "message": "加载数据失败"
+            }), 500
+        visible_area_geojson = analyzer.calculate_visible_area(current_GEA, current_IA, engine=engine,
+                                                               billboards=current_billboards)
         global current_VA
         current_VA = visible_area_geojson  # 保存计算结果
         if visible_area_geojson is None:
@@ -176,20 +245,144 @@ def calculate_VA():
             "message": str(e)
         }), 500
 
+@app.route('/exposure', methods=['POST'])
+def calculate_exposure():
+    """
+    一次请求完成全部广告牌的 GEA -> IA -> VA -> GPS计数
+    请求体:
+        billboards: 广告牌FeatureCollection,或与 /save-billboards 相同的图层列表
+        gps: 是否统计显示区域内的GPS点,默认true
+        engine: GPS计数引擎 postgis(默认) / memory
+        start, end: GPS计数的时间窗口(ISO格式)
+        d, alpha: 曝光区域参数,默认0.01和3
+        workers: 计算遮挡区域的进程数,默认1(串行),最多为CPU核数
+        occlusion: 显示区域计算方式 polygon(默认,逐个建筑物生成遮挡多边形) / sweep(角度扫描)
+    返回每个广告牌的结果和全部广告牌合并的结果,合并结果同时保存为当前的GEA/IA/VA
+    未变化的广告牌(坐标、底高、高度和参数都相同)直接使用上次的计算结果
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        billboards = data.get('billboards')
+        if not billboards:
+            return jsonify({
+                "status": "error",
+                "message": "缺少广告牌数据"
+            }), 400
+        engine = data.get('engine', 'postgis')
+        if engine not in ('postgis', 'memory'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的统计引擎: {engine}, 可选: postgis, memory"
+            }), 400
+        try:
+            start_time, end_time = (datetime.fromisoformat(data[name]) if data.get(name) else None
+                                    for name in ('start', 'end'))
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                "status": "error",
+                "message": f"时间参数格式错误: {str(e)}"
+            }), 400
+        try:
+            d = float(data.get('d', 0.01))
+            alpha = float(data.get('alpha', 3))
+            workers = int(data.get('workers', 1))
+        except (TypeError, ValueError):
+            return jsonify({
+                "status": "error",
+                "message": "d、alpha和workers必须是数字"
+            }), 400
+        if workers < 1:
+            return jsonify({
+                "status": "error",
+                "message": "workers必须大于0"
+            }), 400
+        workers = min(workers, default_workers())
+        occlusion_engine = data.get('occlusion', 'polygon')
+        if occlusion_engine not in ('polygon', 'sweep'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的显示区域计算方式: {occlusion_engine}, 可选: polygon, sweep"
+            }), 400
+
+        analyzer = ExposureAnalyzer(d, alpha, workers=workers, occlusion_engine=occlusion_engine)
+        if not analyzer.load_buildings():
+            return jsonify({
+                "status": "error",
+                "message": "加载数据失败"
+            }), 500
+        gps_analyzer = GPSAnalyzer() if data.get('gps', True) else None
+        result = analyzer.analyze(billboards, gps_analyzer, engine, start_time, end_time)
+
+        # 保存为当前状态,/gps-info 等接口可以继续使用
+        global current_billboards, current_GEA, current_IA, current_VA
+        current_billboards = billboards
+        current_GEA = result["union"]["GEA"]
+        current_IA = result["union"]["IA"]
+        current_VA = result["union"]["VA"]
+        result["status"] = "success"
+        return jsonify(result)
+    except Exception as e:
+        print(f"曝光分析时发生错误: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 @app.route('/gps-info', methods=['GET'])
 def get_gps_info():
-    """获取曝光区域内的出租车GPS信息"""
+    """
+    获取曝光区域内的出租车GPS信息
+    可选参数:
+        start, end: 时间窗口
+        format=ndjson: 流式输出,每行一个点(或一个按列的数据块)
+        limit, after: 键集分页,after为上一页返回的next游标
+        layout=columnar: 按列输出 taxi_id/epoch/longitude/latitude 数组,默认为 [taxi_id, 时间, 经度, 纬度] 行数组
+    不带分页和流式参数时保持原有的一次性返回
+    """
     try:
         print("开始获取GPS信息...")
-        analyzer = GPSAnalyzer()
-        #加载GPS数据
-        if not analyzer.load_gps_data():
+        try:
+            start_time, end_time = _time_window()
+        except ValueError as e:
             return jsonify({
                 "status": "error",
-                "message": "加载GPS数据失败"
-            }), 500
-        #曝光区域
-        gps_data = analyzer.filter_gps_in_exposure(current_VA)
+                "message": f"时间参数格式错误: {str(e)}"
+            }), 400
+        layout = request.args.get('layout', 'rows')
+        if layout not in ('rows', 'columnar'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的输出布局: {layout}, 可选: rows, columnar"
+            }), 400
+        analyzer = GPSAnalyzer()
+
+        if request.args.get('format') == 'ndjson':
+            return ndjson_stream_response(
+                analyzer.stream_gps_in_exposure(current_VA, start_time, end_time, layout))
+
+        if 'limit' in request.args or 'after' in request.args:
+            try:
+                limit = int(request.args.get('limit', 10000))
+                after = request.args.get('after')
+                if after:
+                    taxi_id, epoch = after.split(',')
+                    after = (int(taxi_id), int(epoch))
+                else:
+                    after = None
+            except ValueError:
+                return jsonify({
+                    "status": "error",
+                    "message": "limit必须为整数, after格式应为 taxi_id,epoch"
+                }), 400
+            if not 1 <= limit <= 100000:
+                return jsonify({
+                    "status": "error",
+                    "message": "limit必须在1到100000之间"
+                }), 400
+            return jsonify(analyzer.fetch_gps_page(current_VA, start_time, end_time, after, limit, layout))
+
+        #曝光区域,只查询时间窗口内的分区
+        gps_data = analyzer.filter_gps_in_exposure(current_VA, start_time, end_time)
         
         if gps_data is None:
             print("GPS数据为空")
@@ -205,24 +398,128 @@ def get_gps_info():
             "message": str(e)
         }), 500
 
+@app.route('/gps-temporal', methods=['GET', 'POST'])
+def get_gps_temporal():
+    """
+    按时间统计曝光区域内的GPS点数和出租车数,聚合在数据库中完成
+    POST请求体可以传入 {"geometry": 区域GeoJSON},否则使用当前可视区域
+    可选参数:
+        start, end: 时间窗口
+        bin: 自定义时间段的date_trunc单位(minute/hour/day/week/month)
+        bin_minutes: 自定义时间段的分钟数,与bin二选一
+        engine: postgis(默认) 在数据库中统计; memory 使用进程内的GPS查询引擎
+    """
+    try:
+        try:
+            start_time, end_time = _time_window()
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": f"时间参数格式错误: {str(e)}"
+            }), 400
+
+        bin_unit = request.args.get('bin')
+        if bin_unit is not None and bin_unit not in ('minute', 'hour', 'day', 'week', 'month'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的时间段单位: {bin_unit}, 可选: minute, hour, day, week, month"
+            }), 400
+        # 无法转换为整数时为None
+        bin_minutes = request.args.get('bin_minutes', type=int)
+        if 'bin_minutes' in request.args and (bin_minutes is None or bin_minutes <= 0):
+            return jsonify({
+                "status": "error",
+                "message": "bin_minutes必须为正整数"
+            }), 400
+        if bin_unit is not None and bin_minutes is not None:
+            return jsonify({
+                "status": "error",
+                "message": "bin和bin_minutes只能指定一个"
+            }), 400
+
+        area = current_VA
+        if request.method == 'POST':
+            area = (request.get_json(silent=True) or {}).get('geometry', current_VA)
+
+        engine = request.args.get('engine', 'postgis')
+        if engine not in ('postgis', 'memory'):
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的统计引擎: {engine}, 可选: postgis, memory"
+            }), 400
+
+        analyzer = GPSAnalyzer()
+        if engine == 'memory':
+            stats = analyzer.temporal_stats_in_memory(area, start_time, end_time, bin_unit, bin_minutes)
+        else:
+            stats = analyzer.temporal_stats(area, start_time, end_time, bin_unit, bin_minutes)
+        return jsonify(stats)
+    except Exception as e:
+        print(f"获取GPS时间统计时发生错误: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 @app.route('/heatmap', methods=['GET'])
 def get_heatmap():
-    """获取热力图"""
+    """
+    获取热力图,默认从预先统计的热力图金字塔中读取
+    可选参数:
+        bbox: min_lon,min_lat,max_lon,max_lat 视野范围
+        zoom: 地图缩放级别,决定网格大小
+        start, end: 时间窗口(按小时对齐)
+        cell_size: 指定网格大小(度)时按原方式实时统计gps表
+        stream: 1/true 时使用流式GeoJSON输出
+    """
     try:    
         print("开始获取热力图...")
-        analyzer = GPSAnalyzer()
-        if not analyzer.load_gps_data():
+        try:
+            start_time, end_time = _time_window()
+        except ValueError as e:
             return jsonify({
                 "status": "error",
-                "message": "加载GPS数据失败"
-            }), 500
-        heatmap_data = analyzer.generate_heatmap()
-        if heatmap_data is None:
+                "message": f"时间参数格式错误: {str(e)}"
+            }), 400
+
+        cell_size = request.args.get('cell_size', type=float)
+        if cell_size is not None:
+            analyzer = GPSAnalyzer()
+            if _stream_requested():
+                return geojson_stream_response(analyzer.stream_heatmap(cell_size, start_time, end_time))
+            heatmap_data = analyzer.generate_heatmap(cell_size, start_time, end_time)
+            if heatmap_data is None:
+                return jsonify({
+                    "status": "error",
+                    "message": "获取热力图失败"
+                }), 500
+            return jsonify(heatmap_data)
+
+        bbox = request.args.get('bbox')
+        if bbox:
+            try:
+                bbox = [float(value) for value in bbox.split(',')]
+            except ValueError:
+                bbox = []
+            if len(bbox) != 4:
+                return jsonify({
+                    "status": "error",
+                    "message": "bbox格式应为 min_lon,min_lat,max_lon,max_lat"
+                }), 400
+        else:
+            bbox = None
+        zoom = request.args.get('zoom', type=float)
+
+        # 金字塔在启动时或后台线程中统计,尚未统计完成时不在请求中统计
+        if not heatmap_pyramid.is_built():
+            heatmap_pyramid.ensure_fresh()
             return jsonify({
                 "status": "error",
-                "message": "获取热力图失败"
-            }), 500
-        return jsonify(heatmap_data)
+                "message": "热力图金字塔正在统计,请稍后重试或指定cell_size实时统计"
+            }), 503
+        if _stream_requested():
+            return geojson_stream_response(heatmap_pyramid.stream(bbox, zoom, start_time, end_time))
+        return jsonify(heatmap_pyramid.query(bbox, zoom, start_time, end_time))
     except Exception as e:
         print(f"获取热力图时发生错误: {str(e)}")
         return jsonify({
@@ -254,6 +551,14 @@ def get_shortest_path():
             
         print(f"[INFO] 起点坐标: {start_coords}, 终点坐标: {end_coords}")
         
+        # 最短路径算法,可选 dijkstra / astar / bidirectional
+        algorithm = request.args.get('algorithm', 'astar')
+        if algorithm not in ALGORITHMS:
+            return jsonify({
+                "status": "error",
+                "message": f"不支持的最短路径算法: {algorithm}, 可选: {', '.join(ALGORITHMS)}"
+            }), 400
+            
         # 初始化并加载路网
         sp = ShortestPath()
         if not sp.load_roads(sp.db):
@@ -263,7 +568,7 @@ def get_shortest_path():
             }), 500
             
         # 计算最短路径
-        path = sp.get_shortest_path(start_coords, end_coords)
+        path = sp.get_shortest_path(start_coords, end_coords, algorithm)
         if path is None:
             return jsonify({
                 "status": "error",
@@ -282,14 +587,89 @@ def get_shortest_path():
             "message": str(e)
         }), 500
 
+@app.route('/distance-matrix', methods=['POST'])
+def get_distance_matrix():
+    """
+    批量计算多个起点到多个终点的路网距离(米)
+    请求体: {"sources": [[lon, lat], ...], "targets": [[lon, lat], ...]}
+           或用 "target_category": POI类别 代替targets,以该类别的所有POI作为终点
+    """
+    try:
+        data = request.json or {}
+        sources = data.get('sources', [])
+        targets = data.get('targets', [])
+        target_category = data.get('target_category')
+
+        db = Database()
+        if target_category:
+            with db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT ST_X(geometry), ST_Y(geometry)
+                        FROM poi
+                        WHERE category = %s;
+                    """, (target_category,))
+                    targets = [list(row) for row in cur.fetchall()]
+
+        if not sources or not targets:
+            return jsonify({
+                "status": "error",
+                "message": "需要至少一个起点和一个终点"
+            }), 400
+
+        # 将坐标映射到最近的路网节点
+        graph = road_graph_store.get(db)
+        # 收缩层次由同一路网快照构建,节点编号一致;尚未预处理完成时不在请求中构建
+        ch = contraction_store.get(graph)
+        if ch is None:
+            return jsonify({
+                "status": "error",
+                "message": "路网收缩预处理尚未完成,请稍后重试"
+            }), 503
+        source_nodes = [graph.nearest_node(tuple(map(float, coords[:2])))[0] for coords in sources]
+        target_nodes = [graph.nearest_node(tuple(map(float, coords[:2])))[0] for coords in targets]
+
+        start_time = time.perf_counter()
+        valid_sources = [i for i, node in enumerate(source_nodes) if node is not None]
+        valid_targets = [j for j, node in enumerate(target_nodes) if node is not None]
+        matrix = ch.many_to_many([source_nodes[i] for i in valid_sources],
+                                 [target_nodes[j] for j in valid_targets])
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        print(f"[INFO] 计算 {len(sources)}x{len(targets)} 距离矩阵, 耗时 {elapsed_ms:.2f} 毫秒")
+
+        # 无法映射到路网或不可达的位置返回null
+        distances = [[None] * len(targets) for _ in sources]
+        for row, i in enumerate(valid_sources):
+            for col, j in enumerate(valid_targets):
+                if np.isfinite(matrix[row, col]):
+                    distances[i][j] = float(matrix[row, col])
+
+        return jsonify({
+            "status": "success",
+            "data": {
+                "sources": sources,
+                "targets": targets,
+                "distances": distances,
+                "elapsed_ms": elapsed_ms
+            }
+        })
+
+    except Exception as e:
+        print(f"[ERROR] 距离矩阵计算失败: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 @app.route('/poi/categories', methods=['GET'])
 def get_poi_categories():
     """获取所有POI类别"""
     try:
         db = Database()
-        cur = db.get_connection().cursor()
-        cur.execute("SELECT DISTINCT category FROM poi WHERE category IS NOT NULL ORDER BY category;")
-        categories = [row[0] for row in cur.fetchall()]
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT category FROM poi WHERE category IS NOT NULL ORDER BY category;")
+                categories = [row[0] for row in cur.fetchall()]
         return jsonify({
             "status": "success",
             "data": categories
@@ -302,10 +682,20 @@ def get_poi_categories():
         }), 500
 
 @app.route('/poi/<category>', methods=['GET'])
+@cached_layer('poi')
 def get_poi_by_category(category):
     """根据类别获取POI数据"""
     try:
         db = Database()
+        if _stream_requested():
+            return geojson_stream_response(db.stream_rows("""
+                SELECT
+                    ST_AsGeoJSON(geometry),
+                    (jsonb_build_object('name', name, 'category', category)
+                     || COALESCE(properties, '{}'::jsonb))::text
+                FROM poi
+                WHERE category = %s;
+            """, (category,)))
         conn = db.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         
@@ -357,10 +747,18 @@ def get_poi_by_category(category):
             conn.close()
 
 @app.route('/regions', methods=['GET'])
+@cached_layer('region')
 def get_regions():
     """获取所有区域数据"""
     try:
         db = Database()
+        if _stream_requested():
+            return geojson_stream_response(db.stream_rows("""
+                SELECT
+                    ST_AsGeoJSON(geometry),
+                    (jsonb_build_object('name', name) || COALESCE(properties, '{}'::jsonb))::text
+                FROM region;
+            """))
         conn = db.get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         
@@ -408,5 +806,67 @@ def get_regions():
         if 'conn' in locals():
             conn.close()
 
+@app.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+@cached_layer(lambda layer, **kwargs: (TILE_LAYERS[layer]['table'], 'timestamp' if layer == 'gps' else 'id')
+              if layer in TILE_LAYERS else (None, None))
+def get_vector_tile(layer, z, x, y):
+    """获取矢量切片, layer可选 buildings / roads / poi / gps"""
+    try:
+        if layer not in TILE_LAYERS:
+            return jsonify({
+                "status": "error",
+                "message": f"未知的图层: {layer}, 可选: {', '.join(TILE_LAYERS)}"
+            }), 404
+        tile = VectorTiles().get_tile(layer, z, x, y)
+        return Response(tile, mimetype='application/vnd.mapbox-vector-tile')
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        print(f"[ERROR] 获取矢量切片{layer}/{z}/{x}/{y}失败: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route('/db/pool-stats', methods=['GET'])
+def get_pool_stats():
+    """获取数据库连接池使用情况"""
+    try:
+        return jsonify({
+            "status": "success",
+            "data": Database().pool_stats()
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """获取图层响应缓存和广告牌分析结果缓存使用情况"""
+    return jsonify({
+        "status": "success",
+        "data": response_cache.stats(),
+        "exposure": exposure_cache.stats()
+    })
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=3000)
\ No newline at end of file
+    # 启动时初始化数据库表和数据(只执行一次),导入本模块时不访问数据库
+    Database().init_database()
+    # 启动时预先加载建筑物数据,后续请求直接复用
+    try:
+        building_store.get(Database())
+    except Exception as e:
+        print(f"[WARNING] 预加载建筑物数据失败: {str(e)}")
+    # 在后台检查gps表并按需统计热力图金字塔
+    heatmap_pyramid.ensure_fresh()
+    # 读取路网收缩预处理结果,没有与当前路网一致的结果时在后台开始预处理
+    try:
+        contraction_store.get(road_graph_store.get(Database()))
+    except Exception as e:
+        print(f"[WARNING] 加载路网收缩预处理结果失败: {str(e)}")
+    app.run(debug=True, host='0.0.0.0', port=3000)
\ No newline at end of file
@@ -0,0 +1,111 @@
+'''
+@zyh 2026-10-18
+GeoJSON要素批量导入
+要素几何在Python中批量转换为EWKB(十六进制),与其它字段一起通过 COPY ... FROM STDIN
+写入临时的暂存表,最后在同一个事务中删除目标表的旧数据并从暂存表整体插入,
+避免逐行 INSERT + ST_GeomFromGeoJSON 的开销。
+删除旧数据使用DELETE而不是TRUNCATE: TRUNCATE会持有ACCESS EXCLUSIVE锁直到提交,期间读取方被阻塞;
+DELETE不阻塞读取,提交前读取方看到完整的旧数据,提交后看到完整的新数据
+'''
+from io import StringIO
+import json
+import time
+
+import shapely
+
+# 单个几何类型提升为对应的多几何类型
+_MULTI_TYPES = {
+    'MultiPolygon': ('Polygon', shapely.MultiPolygon),
+    'MultiLineString': ('LineString', shapely.MultiLineString),
+    'MultiPoint': ('Point', shapely.MultiPoint),
+}
+
+
+def features_to_ewkb(features, geometry_type=None, srid=4326):
+    """
+    将GeoJSON要素的几何批量转换为十六进制EWKB
+    geometry_type: 目标列的几何类型,为多几何类型时把单个几何提升为多几何
+    """
+    geometries = shapely.from_geojson([json.dumps(feature['geometry']) for feature in features])
+    if geometry_type in _MULTI_TYPES:
+        single_type, multi_class = _MULTI_TYPES[geometry_type]
+        geometries = [multi_class([geom]) if geom is not None and geom.geom_type == single_type else geom
+                      for geom in geometries]
+    geometries = shapely.set_srid(geometries, srid)
+    return shapely.to_wkb(geometries, hex=True, include_srid=True)
+
+
+def _copy_value(value):
+    """转换为COPY文本格式的字段值"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_rows(cur, table, columns, rows):
+    """通过 COPY ... FROM STDIN 写入一批行"""
+    buffer = StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def bulk_load_features(conn, table, features, columns, values_of,
+                       geometry_type=None, batch_size=5000):
+    '''
+    批量导入GeoJSON要素,替换目标表中的全部数据
+    INPUT:
+        conn: 数据库连接,函数结束时提交事务
+        table: 目标表
+        features: GeoJSON要素列表
+        columns: 要写入的列,其中名为geometry的列写入要素几何
+        values_of: 函数,返回要素在geometry以外各列的取值 {列名: 值}
+        geometry_type: 目标几何列类型,如 'MultiPolygon'
+        batch_size: 每批转换和COPY的要素数
+    OUTPUT:
+        导入的行数
+    '''
+    start_time = time.time()
+    staging = f"{table}_staging"
+    cur = conn.cursor()
+    try:
+        # 暂存表只包含需要写入的列,不带默认值和索引
+        cur.execute(f"""
+            DROP TABLE IF EXISTS {staging};
+            CREATE TEMP TABLE {staging} AS
+            SELECT {', '.join(columns)} FROM {table} WITH NO DATA;
+        """)
+
+        for offset in range(0, len(features), batch_size):
+            batch = features[offset:offset + batch_size]
+            geometries = features_to_ewkb(batch, geometry_type)
+            rows = []
+            for feature, geometry in zip(batch, geometries):
+                values = values_of(feature)
+                rows.append([geometry if column == 'geometry' else values.get(column)
+                             for column in columns])
+            copy_rows(cur, staging, columns, rows)
+
+        # 在同一个事务中替换目标表数据,提交前读取方仍看到旧数据
+        cur.execute(f"""
+            DELETE FROM {table};
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {staging};
+            DROP TABLE {staging};
+        """)
+        conn.commit()
+        print(f"[INFO] {table}表批量导入 {len(features)} 条数据, 耗时: {time.time() - start_time:.2f} 秒")
+        return len(features)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -2,10 +2,20 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import json
 import os
-import pandas as pd
-from io import StringIO
+import threading
+import uuid
+
+from config.bulk_load import bulk_load_features
+from config.gps_load import load_gps, migrate_gps
+from config.pool import ConnectionPool
 
 class Database:
+    # 进程内共享的连接池,以及数据库是否已完成初始化
+    _pool = None
+    _pool_lock = threading.Lock()
+    _initialized = False
+    _init_lock = threading.Lock()
+
     def __init__(self):
         self.config = {
             "dbname": "adv",
@@ -14,28 +24,63 @@ class Database:
             "host": "localhost",
             "port": "5432"
         }
-        # 初始化所有表和数据
-        self.init_database()
+        self.pool_config = {
+            "minconn": 1,
+            "maxconn": 10,
+            "timeout": 30.0,
+            "health_check_interval": 30.0
+        }
+
+    @property
+    def pool(self):
+        """获取进程内共享的连接池(fork出的子进程会重新创建)"""
+        pool = Database._pool
+        if pool is None or pool.pid != os.getpid():
+            with Database._pool_lock:
+                pool = Database._pool
+                if pool is None or pool.pid != os.getpid():
+                    pool = ConnectionPool(self.config, **self.pool_config)
+                    Database._pool = pool
+        return pool
     
     def get_connection(self):
+        """从连接池中取出连接,调用conn.close()即归还"""
         try:
-            conn = psycopg2.connect(**self.config)
+            conn = self.pool.getconn()
             return conn
         except Exception as e:
             print(f"数据库连接错误: {str(e)}")
             raise e
 
+    def connection(self):
+        """
+        以上下文管理器方式取用连接
+        with db.connection() as conn:
+            ...
+        """
+        return self.pool.connection()
+
+    def pool_stats(self):
+        """连接池使用情况"""
+        return self.pool.stats()
+
     def init_database(self):
-        """初始化数据库的所有表和数据"""
-        # 创建扩展
-        self.create_extensions()
-        # 初始化各个表和数据
-        self.init_geojson_data()
-        self.init_gps_data()
-        self.init_roads_data()
-        self.init_poi_data()
-        self.init_region_data()
-        print("数据库初始化完成")
+        """初始化数据库的所有表和数据,每个进程只执行一次"""
+        if Database._initialized:
+            return
+        with Database._init_lock:
+            if Database._initialized:
+                return
+            # 创建扩展
+            self.create_extensions()
+            # 初始化各个表和数据
+            self.init_geojson_data()
+            self.init_gps_data()
+            self.init_roads_data()
+            self.init_poi_data()
+            self.init_region_data()
+            Database._initialized = True
+            print("数据库初始化完成")
 
     def create_extensions(self):
         """创建必要的PostgreSQL扩展"""
@@ -85,19 +130,16 @@ class Database:
             with open(geojson_path, 'r', encoding='utf-8') as f:
                 geojson_data = json.load(f)
             
-            # 插入数据
-            for feature in geojson_data['features']:
-                geometry = json.dumps(feature['geometry'])
-                properties = json.dumps(feature['properties'])
-                height = feature['properties'].get('height', 0)
-                
-                insert_sql = """
-                INSERT INTO geojson (height, geometry, properties)
-                VALUES (%s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s::jsonb);
-                """
-                cursor.execute(insert_sql, (height, geometry, properties))
-            
-            conn.commit()
+            # 批量导入数据
+            bulk_load_features(
+                conn, 'geojson', geojson_data['features'],
+                columns=['height', 'geometry', 'properties'],
+                values_of=lambda feature: {
+                    'height': feature['properties'].get('height', 0),
+                    'properties': feature['properties']
+                },
+                geometry_type='MultiPolygon'
+            )
             print("geojson数据导入成功！")
 
         except (psycopg2.Error, json.JSONDecodeError, FileNotFoundError) as e:
@@ -111,74 +153,36 @@ class Database:
     def init_gps_data(self):
         """初始化gps表和数据"""
         if self.check_table_has_data('gps'):
+            # 旧版本创建的单表gps迁移为按天分区的表
+            conn = self.get_connection()
+            try:
+                migrate_gps(conn)
+            except Exception as e:
+                print(f"迁移gps表错误: {str(e)}")
+            finally:
+                conn.close()
             print("gps表已存在且包含数据，跳过初始化")
             return
 
+        # 读取并导入数据
+        gps_path = os.path.join(os.path.dirname(__file__),
+                              'db_data',
+                              'taxi_GPS.csv')
+
+        if not os.path.exists(gps_path):
+            print(f"找不到GPS数据文件: {gps_path}")
+            return
+
         conn = self.get_connection()
         try:
-            cur = conn.cursor()
-            # 创建gps表
-            cur.execute("""
-                DROP TABLE IF EXISTS gps;
-                CREATE TABLE gps (
-                    taxi_id INTEGER,
-                    timestamp TIMESTAMP,
-                    longitude FLOAT,
-                    latitude FLOAT,
-                    geometry GEOMETRY(POINT, 4326),
-                    PRIMARY KEY (taxi_id, timestamp)
-                );
-            """)
-            
-            # 创建索引
-            cur.execute("CREATE INDEX IF NOT EXISTS gps_geometry_idx ON gps USING GIST (geometry);")
-            cur.execute("CREATE INDEX IF NOT EXISTS gps_taxi_id_idx ON gps (taxi_id);")
-            cur.execute("CREATE INDEX IF NOT EXISTS gps_timestamp_idx ON gps (timestamp);")
-            
-            conn.commit()
-            
-            # 读取并导入数据
-            gps_path = os.path.join(os.path.dirname(__file__), 
-                                  'db_data', 
-                                  'taxi_GPS.csv')
-            
-            if not os.path.exists(gps_path):
-                print(f"找不到GPS数据文件: {gps_path}")
-                return
-            
-            # 读取CSV文件，只读取需要的列，并去除重复记录
-            df = pd.read_csv(gps_path, 
-                           usecols=['taxi_id', 'timestamp', 'longitude', 'latitude'])
-            df = df.drop_duplicates(subset=['taxi_id', 'timestamp'])
-            
-            # 将DataFrame转换为内存中的CSV格式
-            output = StringIO()
-            df.to_csv(output, index=False, header=False)
-            output.seek(0)
-            
-            # 使用COPY命令快速导入数据
-            cur.copy_from(
-                output,
-                'gps',
-                sep=',',
-                columns=('taxi_id', 'timestamp', 'longitude', 'latitude')
-            )
-            
-            # 更新几何字段
-            cur.execute("""
-                UPDATE gps 
-                SET geometry = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-                WHERE geometry IS NULL;
-            """)
-            
-            conn.commit()
+            # 分块读取CSV,几何列随COPY一起写入,导入完成后再建立索引
+            load_gps(conn, gps_path)
             print("gps数据初始化成功")
-            
+
         except Exception as e:
             print(f"初始化gps表错误: {str(e)}")
             raise e
         finally:
-            cur.close()
             conn.close()
 
     def check_table_has_data(self, table_name):
@@ -209,6 +213,24 @@ class Database:
             cur.close()
             conn.close()
 
+    def get_table_version(self, table_name, key_column='id'):
+        """
+        获取表的版本号(行数, 最大主键),用于判断表数据是否发生变化
+        导入脚本会清空后重新插入,SERIAL主键会继续增长,因此重新导入后版本号必然改变
+        """
+        conn = self.get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"SELECT COUNT(*), MAX({key_column}) FROM {table_name};")
+            count, max_key = cur.fetchone()
+            return (count, str(max_key))
+        except Exception as e:
+            print(f"获取{table_name}表版本错误: {str(e)}")
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+
     def create_roads_table(self):
         conn = self.get_connection()
         try:
@@ -232,21 +254,17 @@ class Database:
     def import_roads_geojson(self, features):
         conn = self.get_connection()
         try:
-            cur = conn.cursor()
-            for feature in features:
-                geometry = feature['geometry']
-                properties = feature['properties']
-                # 插入数据
-                cur.execute("""
-                    INSERT INTO roads (geometry, properties)
-                    VALUES (ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s);
-                """, (json.dumps(geometry), json.dumps(properties)))
-            conn.commit()
+            # 批量导入数据
+            bulk_load_features(
+                conn, 'roads', features,
+                columns=['geometry', 'properties'],
+                values_of=lambda feature: {'properties': feature['properties']},
+                geometry_type='MultiLineString'
+            )
         except Exception as e:
             print(f"导入roads数据错误: {str(e)}")
             raise e
         finally:
-            cur.close()
             conn.close()
 
     def check_roads_table(self):
@@ -320,6 +338,51 @@ class Database:
             cur.close()
             conn.close()
 
+    def fetch_geojson_collection(self, precision=9):
+        """
+        由PostGIS直接生成完整的建筑物FeatureCollection文本
+        precision: 坐标保留的小数位数(ST_AsGeoJSON的maxdecimaldigits),6位约为0.1米
+        """
+        conn = self.get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT json_build_object(
+                    'type', 'FeatureCollection',
+                    'features', COALESCE(json_agg(json_build_object(
+                        'type', 'Feature',
+                        'geometry', ST_AsGeoJSON(geometry, %s)::json,
+                        'properties', properties
+                    )), '[]'::json)
+                )::text
+                FROM geojson
+            """, (precision,))
+            return cur.fetchone()[0]
+        except Exception as e:
+            print(f"查询错误: {str(e)}")
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+
+    def stream_rows(self, sql, params=None, itersize=2000):
+        """
+        使用服务端命名游标逐行返回查询结果,每次只从数据库取itersize行
+        返回生成器,遍历结束或生成器关闭时归还连接
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = itersize
+                cur.execute(sql, params)
+                for row in cur:
+                    yield row
+        except Exception as e:
+            print(f"流式查询错误: {str(e)}")
+            raise e
+        finally:
+            conn.close()
+
     def fetch_gps(self):
         conn = self.get_connection()
         try:
@@ -416,19 +479,19 @@ class Database:
             with open(poi_path, 'r', encoding='utf-8') as f:
                 poi_data = json.load(f)
 
-            # 插入数据
-            for feature in poi_data['features']:
-                geometry = feature['geometry']
-                properties = feature['properties']
-                name = properties.get('NAME')
-                category = properties.get('CATEGORY')
-
-                cur.execute("""
-                    INSERT INTO poi (name, category, geometry, properties)
-                    VALUES (%s, %s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s);
-                """, (name, category, json.dumps(geometry), json.dumps(properties)))
-
             conn.commit()
+
+            # 批量导入数据
+            bulk_load_features(
+                conn, 'poi', poi_data['features'],
+                columns=['name', 'category', 'geometry', 'properties'],
+                values_of=lambda feature: {
+                    'name': feature['properties'].get('NAME'),
+                    'category': feature['properties'].get('CATEGORY'),
+                    'properties': feature['properties']
+                },
+                geometry_type='Point'
+            )
             print("poi数据初始化成功")
 
         except Exception as e:
@@ -516,18 +579,18 @@ class Database:
             with open(region_path, 'r', encoding='utf-8') as f:
                 region_data = json.load(f)
 
-            # 插入数据
-            for feature in region_data['features']:
-                geometry = feature['geometry']
-                properties = feature['properties']
-                name = properties.get('name')
-
-                cur.execute("""
-                    INSERT INTO region (name, geometry, properties)
-                    VALUES (%s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s);
-                """, (name, json.dumps(geometry), json.dumps(properties)))
-
             conn.commit()
+
+            # 批量导入数据
+            bulk_load_features(
+                conn, 'region', region_data['features'],
+                columns=['name', 'geometry', 'properties'],
+                values_of=lambda feature: {
+                    'name': feature['properties'].get('name'),
+                    'properties': feature['properties']
+                },
+                geometry_type='MultiPolygon'
+            )
             print("region数据初始化成功")
 
         except Exception as e:
@@ -536,4 +599,4 @@ class Database:
             raise e
         finally:
             cur.close()
-            conn.close()
\ No newline at end of file
+            conn.close()
\ No newline at end of file
@@ -0,0 +1,206 @@
+'''
+@zyh 2026-10-18
+出租车GPS数据流式导入
+按块读取CSV(或ingest_taxi_GPS.py输出的Parquet分区目录),在Python中批量生成点几何的十六进制EWKB,
+与其它字段一起通过 COPY 写入不记日志的暂存表,避免导入后再对全表执行 UPDATE 生成几何;
+全部写入后在数据库中去重插入gps表,最后再建立主键和索引。
+每次只在内存中保留一个数据块,内存占用与文件大小无关
+
+gps表按timestamp以天为单位做范围分区,按时间过滤的查询只扫描相关分区;
+写入时每个分区内的数据按小时和geohash排序,使时间和空间上相邻的点存放在相邻的数据页中,
+因此时间和几何列使用体积很小的BRIN索引即可
+'''
+from datetime import timedelta
+from io import StringIO
+import os
+import time
+
+import pandas as pd
+import shapely
+
+GPS_COLUMNS = ['taxi_id', 'timestamp', 'longitude', 'latitude']
+
+
+def iter_gps_chunks(path, chunksize=500_000):
+    """按块读取GPS数据,path为CSV文件或Parquet分区目录"""
+    if os.path.isdir(path):
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        for batch in dataset.to_batches(columns=GPS_COLUMNS, batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=GPS_COLUMNS, chunksize=chunksize)
+
+
+def points_to_ewkb(longitude, latitude, srid=4326):
+    """将经纬度数组批量转换为点几何的十六进制EWKB"""
+    points = shapely.set_srid(shapely.points(longitude, latitude), srid)
+    return shapely.to_wkb(points, hex=True, include_srid=True)
+
+
+def copy_gps_chunk(cur, table, df):
+    """将一块GPS数据连同几何列通过COPY写入表中"""
+    df = df[GPS_COLUMNS].dropna()
+    df = df.assign(geometry=points_to_ewkb(df['longitude'].to_numpy(), df['latitude'].to_numpy()))
+    buffer = StringIO()
+    df.to_csv(buffer, sep='\t', header=False, index=False, date_format='%Y-%m-%d %H:%M:%S')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(GPS_COLUMNS)}, geometry) FROM STDIN", buffer)
+    return len(df)
+
+
+def create_gps_table(cur, first_day=None, last_day=None):
+    '''
+    创建按天分区的gps表
+    first_day, last_day: 需要创建分区的日期范围(含两端),范围外的数据写入默认分区
+    '''
+    cur.execute("""
+        CREATE TABLE gps (
+            taxi_id INTEGER NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            longitude FLOAT,
+            latitude FLOAT,
+            geometry GEOMETRY(POINT, 4326)
+        ) PARTITION BY RANGE (timestamp);
+        CREATE TABLE gps_default PARTITION OF gps DEFAULT;
+    """)
+    if first_day is not None:
+        create_gps_partitions(cur, first_day, last_day)
+
+
+def create_gps_partitions(cur, first_day, last_day):
+    """为 [first_day, last_day] 中的每一天创建gps分区,已存在的分区跳过"""
+    day = first_day
+    while day <= last_day:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS gps_{day:%Y%m%d} PARTITION OF gps
+            FOR VALUES FROM (%s) TO (%s);
+        """, (day, day + timedelta(days=1)))
+        day += timedelta(days=1)
+
+
+def fill_gps_table(cur, source_sql):
+    '''
+    将查询结果写入gps表,按小时和geohash排序以便BRIN索引生效
+    source_sql: 返回 taxi_id, timestamp, longitude, latitude, geometry 的查询
+    OUTPUT:
+        写入的行数
+    '''
+    cur.execute(f"""
+        INSERT INTO gps (taxi_id, timestamp, longitude, latitude, geometry)
+        SELECT taxi_id, timestamp, longitude, latitude, geometry
+        FROM ({source_sql}) source
+        ORDER BY date_trunc('hour', timestamp), ST_GeoHash(geometry, 7);
+    """)
+    return cur.rowcount
+
+
+def create_gps_indexes(cur):
+    """数据写入后建立主键和BRIN索引,在分区表上创建的索引会自动建到每个分区"""
+    cur.execute("""
+        ALTER TABLE gps ADD PRIMARY KEY (taxi_id, timestamp);
+        CREATE INDEX gps_timestamp_brin ON gps USING BRIN (timestamp);
+        CREATE INDEX gps_geometry_brin ON gps USING BRIN (geometry);
+        ANALYZE gps;
+    """)
+
+
+def gps_is_partitioned(cur):
+    """gps表是否已是分区表,表不存在时返回None"""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('gps');")
+    row = cur.fetchone()
+    return None if row is None else row[0] == 'p'
+
+
+def migrate_gps(conn):
+    '''
+    将旧的单表gps迁移为按天分区的gps表,迁移后删除旧表
+    OUTPUT:
+        迁移的行数,gps表不存在或已是分区表时返回None
+    '''
+    start_time = time.time()
+    cur = conn.cursor()
+    try:
+        if gps_is_partitioned(cur) is not False:
+            return None
+        print("[INFO] 开始将gps表迁移为按天分区的表...")
+        # 旧表的主键和索引名与新表冲突,且迁移时只需顺序读取,先删除
+        cur.execute("""
+            ALTER TABLE gps RENAME TO gps_legacy;
+            ALTER TABLE gps_legacy DROP CONSTRAINT IF EXISTS gps_pkey;
+            DROP INDEX IF EXISTS gps_geometry_idx, gps_taxi_id_idx, gps_timestamp_idx;
+        """)
+        cur.execute("SELECT min(timestamp)::date, max(timestamp)::date FROM gps_legacy;")
+        first_day, last_day = cur.fetchone()
+        create_gps_table(cur, first_day, last_day)
+        count = fill_gps_table(cur, """
+            SELECT taxi_id, timestamp, longitude, latitude,
+                   COALESCE(geometry, ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) AS geometry
+            FROM gps_legacy
+        """)
+        create_gps_indexes(cur)
+        cur.execute("DROP TABLE gps_legacy;")
+        conn.commit()
+        print(f"[INFO] gps表迁移完成, 共 {count} 条数据, 耗时: {time.time() - start_time:.2f} 秒")
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def load_gps(conn, path, chunksize=500_000):
+    '''
+    重建gps表并流式导入GPS数据
+    INPUT:
+        conn: 数据库连接,函数结束时提交事务
+        path: CSV文件(包含 taxi_id,timestamp,longitude,latitude 列)或Parquet分区目录
+        chunksize: 每块读取的行数
+    OUTPUT:
+        导入的行数(去重后)
+    '''
+    start_time = time.time()
+    cur = conn.cursor()
+    try:
+        # 暂存表不记日志、不带约束和索引,只用于接收COPY数据
+        cur.execute("""
+            DROP TABLE IF EXISTS gps_staging;
+            CREATE UNLOGGED TABLE gps_staging (
+                taxi_id INTEGER,
+                timestamp TIMESTAMP,
+                longitude FLOAT,
+                latitude FLOAT,
+                geometry GEOMETRY(POINT, 4326)
+            );
+        """)
+
+        copied = 0
+        for chunk in iter_gps_chunks(path, chunksize):
+            copied += copy_gps_chunk(cur, 'gps_staging', chunk)
+            print(f"[INFO] 已写入 {copied} 条GPS数据, {copied / (time.time() - start_time):.0f} 行/秒")
+
+        cur.execute("SELECT min(timestamp)::date, max(timestamp)::date FROM gps_staging;")
+        first_day, last_day = cur.fetchone()
+
+        # 先建表、去重插入,再建立主键和索引,避免插入过程中逐行维护索引
+        cur.execute("DROP TABLE IF EXISTS gps CASCADE;")
+        create_gps_table(cur, first_day, last_day)
+        count = fill_gps_table(cur, """
+            SELECT DISTINCT ON (taxi_id, timestamp) taxi_id, timestamp, longitude, latitude, geometry
+            FROM gps_staging
+            ORDER BY taxi_id, timestamp
+        """)
+        cur.execute("DROP TABLE gps_staging;")
+        # 数据整体替换,热力图金字塔需要全部重建
+        cur.execute("DROP TABLE IF EXISTS gps_heatmap_state;")
+        print(f"[INFO] 写入 {copied} 条, 去除 {copied - count} 条重复记录, 开始建立索引...")
+        create_gps_indexes(cur)
+        conn.commit()
+        print(f"[INFO] gps表导入 {count} 条数据, 耗时: {time.time() - start_time:.2f} 秒")
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
@@ -0,0 +1,217 @@
+'''
+@zyh 2026-10-18
+数据库连接池
+有上限、线程安全的psycopg2连接池,支持取出时健康检查、上下文管理器方式取用连接,
+并统计连接池饱和情况(等待次数、超时次数、峰值占用等)
+'''
+from collections import deque
+from contextlib import contextmanager
+import os
+import threading
+import time
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    """等待空闲连接超时"""
+
+
+class PooledConnection:
+    """
+    连接池中取出的连接
+    除close()外的所有属性和方法都转发给实际的psycopg2连接,
+    close()不会真正关闭连接,而是将其归还给连接池,因此原有的conn.close()写法无需修改
+    忘记close()的连接被垃圾回收时交给连接池回收,避免永久占用连接数
+    """
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, pool._leaked.append, conn)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._finalizer.detach()
+            self._pool.putconn(conn)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        # 与psycopg2连接一致: with conn 表示一个事务
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+
+
+class ConnectionPool:
+    def __init__(self, config, minconn=1, maxconn=10, timeout=30.0, health_check_interval=30.0):
+        '''
+        config: psycopg2.connect参数
+        minconn: 预先创建的连接数
+        maxconn: 最大连接数(同时被取出的连接不超过该值)
+        timeout: 连接全部被占用时等待的最长时间(秒)
+        health_check_interval: 空闲超过该时间(秒)的连接在取出时先执行 SELECT 1 检查
+        '''
+        self.config = config
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+
+        self._idle = []  # [(conn, 归还时间)]
+        # 未close()就被垃圾回收的连接,下次取用连接时归还
+        # 垃圾回收可能发生在持有锁的线程中,这里只追加到deque,不在回调中加锁
+        self._leaked = deque()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "discarded": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time": 0.0,
+            "in_use": 0,
+            "peak_in_use": 0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.config)
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reclaim_leaked(self):
+        while True:
+            try:
+                conn = self._leaked.popleft()
+            except IndexError:
+                return
+            print("[WARNING] 回收未归还的数据库连接")
+            self.putconn(conn)
+
+    def getconn(self):
+        """取出一个连接,连接全部被占用时最多等待timeout秒"""
+        self._reclaim_leaked()
+        if not self._slots.acquire(blocking=False):
+            start_time = time.monotonic()
+            acquired = False
+            # 分段等待,期间被垃圾回收的连接可以及时归还
+            while not acquired:
+                remaining = start_time + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    break
+                acquired = self._slots.acquire(timeout=min(remaining, 1.0))
+                if not acquired:
+                    self._reclaim_leaked()
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.monotonic() - start_time
+                if not acquired:
+                    self._stats["timeouts"] += 1
+            if not acquired:
+                print(f"[ERROR] 等待数据库连接超时({self.timeout}秒), 连接池已满: {self.maxconn}")
+                raise PoolTimeout(f"等待数据库连接超时({self.timeout}秒)")
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    conn = self._connect()
+                elif self._is_healthy(*item):
+                    conn = item[0]
+                else:
+                    print("[WARNING] 丢弃失效的数据库连接")
+                    self._discard(item[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+        return PooledConnection(self, conn)
+
+    def putconn(self, conn):
+        """归还连接,未结束的事务会被回滚"""
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """以上下文管理器方式取用连接,退出时自动归还"""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """连接池使用情况"""
+        self._reclaim_leaked()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["maxconn"] = self.maxconn
+        stats["saturation"] = stats["in_use"] / self.maxconn
+        return stats
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
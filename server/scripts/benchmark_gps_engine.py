@@ -0,0 +1,72 @@
+'''
+@zyh 2026-10-18
+对比进程内GPS查询引擎与PostGIS查询的曝光统计耗时
+在GPS数据范围内随机生成不同半径的圆形区域,分别用两种方式计算按小时/星期的统计,
+检查结果一致并输出各半径下的耗时中位数
+'''
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config.database import Database
+from analysis.gps_engine import gps_engine_store
+from analysis.gps_info import GPSAnalyzer
+
+# 1度纬度约111公里
+METERS_PER_DEGREE = 111320.0
+
+
+def benchmark(radii, queries, seed=0):
+    db = Database()
+    analyzer = GPSAnalyzer()
+
+    start_time = time.time()
+    engine = gps_engine_store.get(db)
+    print(f"[INFO] 引擎加载 {len(engine)} 条GPS数据, 耗时: {time.time() - start_time:.2f} 秒")
+    if not len(engine):
+        print("[ERROR] gps表中没有数据")
+        return
+
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = engine.points.bounds
+    print(f"{'半径(米)':>10} {'平均点数':>12} {'PostGIS(ms)':>12} {'内存引擎(ms)':>14} {'加速比':>8}")
+    for radius in radii:
+        postgis_times, engine_times, totals = [], [], []
+        for _ in range(queries):
+            center = shapely.Point(rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+            area = center.buffer(radius / METERS_PER_DEGREE)
+            geometry = json.loads(shapely.to_geojson(area))
+
+            start_time = time.perf_counter()
+            expected = analyzer.temporal_stats(geometry)
+            postgis_times.append((time.perf_counter() - start_time) * 1000)
+
+            start_time = time.perf_counter()
+            result = engine.temporal_stats(area)
+            engine_times.append((time.perf_counter() - start_time) * 1000)
+
+            if result != expected:
+                print(f"[WARNING] 结果不一致: PostGIS {expected['total']} 个点, 内存引擎 {result['total']} 个点")
+            totals.append(result['total'])
+
+        postgis_ms = statistics.median(postgis_times)
+        engine_ms = statistics.median(engine_times)
+        print(f"{radius:>10.0f} {statistics.mean(totals):>12.0f} {postgis_ms:>12.1f} {engine_ms:>14.1f} "
+              f"{postgis_ms / max(engine_ms, 1e-6):>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='对比内存GPS引擎与PostGIS的曝光统计性能')
+    parser.add_argument('--radius', type=float, nargs='+', default=[100, 300, 1000, 3000],
+                        help='查询圆形区域的半径(米)')
+    parser.add_argument('--queries', type=int, default=20, help='每个半径的查询次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+    benchmark(args.radius, args.queries, args.seed)
@@ -0,0 +1,96 @@
+'''
+@zyh 2026-10-18
+对比两种显示区域计算方式的耗时和结果
+在建筑物数据范围内随机生成广告牌,分别用遮挡多边形合并(polygon)和角度扫描(sweep)计算显示区域,
+输出每个广告牌的耗时中位数,以及两种结果的面积比和交并比(IoU)
+'''
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.exposure import ExposureAnalyzer
+
+# 1度纬度约111公里
+METERS_PER_DEGREE = 111000.0
+
+
+def random_billboards(bounds, count, base, height, width=10.0, seed=0):
+    """在范围内随机生成朝向随机的广告牌要素"""
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = bounds
+    features = []
+    for i in range(count):
+        lon, lat = rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)
+        angle = rng.uniform(0, 2 * np.pi)
+        dx = width / 2 * np.cos(angle) / (METERS_PER_DEGREE * np.cos(np.radians(lat)))
+        dy = width / 2 * np.sin(angle) / METERS_PER_DEGREE
+        start, end = [lon - dx, lat - dy], [lon + dx, lat + dy]
+        # 与前端绘制的广告牌一样,在垂直方向上给一个很小的厚度
+        offset = [-dy * 1e-3, dx * 1e-3]
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[start, end, [end[0] + offset[0], end[1] + offset[1]],
+                                 [start[0] + offset[0], start[1] + offset[1]], start]]
+            },
+            "properties": {"billboard_id": f"benchmark-{i}", "base": base, "height": base + height}
+        })
+    return features
+
+
+def benchmark(count, base, height, seed=0):
+    analyzers = {engine: ExposureAnalyzer(cache=None, occlusion_engine=engine) for engine in ('polygon', 'sweep')}
+    start_time = time.time()
+    for analyzer in analyzers.values():
+        if not analyzer.load_buildings():
+            print("[ERROR] 加载建筑物数据失败")
+            return
+    print(f"[INFO] 加载 {len(analyzers['polygon'].buildings)} 个建筑物, 耗时: {time.time() - start_time:.2f} 秒")
+
+    bounds = shapely.total_bounds(analyzers['polygon'].snapshot.geometries)
+    features = random_billboards(bounds, count, base, height, seed=seed)
+
+    times = {engine: [] for engine in analyzers}
+    areas = {engine: [] for engine in analyzers}
+    for feature in features:
+        for engine, analyzer in analyzers.items():
+            # 几何计算函数会输出大量调试信息,测试时不显示
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                results, _ = analyzer.billboard_results([feature])
+                times[engine].append((time.perf_counter() - start) * 1000)
+            areas[engine].append(results[0].visible_area)
+
+    ratios, ious = [], []
+    for polygon_area, sweep_area in zip(areas['polygon'], areas['sweep']):
+        union = polygon_area.union(sweep_area).area
+        if union > 0:
+            ratios.append(sweep_area.area / max(polygon_area.area, 1e-18))
+            ious.append(polygon_area.intersection(sweep_area).area / union)
+
+    print(f"{'计算方式':>10} {'耗时中位数(ms)':>16} {'耗时均值(ms)':>14}")
+    for engine in analyzers:
+        print(f"{engine:>10} {statistics.median(times[engine]):>16.1f} {statistics.mean(times[engine]):>14.1f}")
+    if ious:
+        print(f"[INFO] 面积比(sweep/polygon) 中位数: {statistics.median(ratios):.3f}")
+        print(f"[INFO] IoU 均值: {statistics.mean(ious):.3f}, 中位数: {statistics.median(ious):.3f}, "
+              f"最小值: {min(ious):.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='对比遮挡多边形合并与角度扫描两种显示区域计算方式')
+    parser.add_argument('--billboards', type=int, default=50, help='随机生成的广告牌数')
+    parser.add_argument('--base', type=float, default=30, help='广告牌底部距地面高度(米)')
+    parser.add_argument('--height', type=float, default=30, help='广告牌高度(米)')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+    benchmark(args.billboards, args.base, args.height, args.seed)
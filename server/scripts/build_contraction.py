@@ -0,0 +1,25 @@
+'''
+@zyh 2026-10-18
+路网收缩预处理
+从数据库读取当前路网,构建收缩层次并保存到 config/db_data/cache/road_ch.npz,
+服务启动或路网变化后直接读取与当前路网版本一致的结果,不需要在请求中预处理
+'''
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config.database import Database
+from analysis.road_graph import road_graph_store
+from analysis.contraction import contraction_store
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    try:
+        graph = road_graph_store.get(Database())
+        contraction_store.build(graph)
+    except Exception as e:
+        print(f"[ERROR] 路网收缩预处理失败: {str(e)}")
+        sys.exit(1)
+    print(f"[SUCCESS] 路网收缩预处理结果已保存到 {contraction_store.cache_path}, 总耗时: {time.time() - start_time:.2f} 秒")
@@ -0,0 +1,24 @@
+'''
+@zyh 2026-10-18
+统计GPS热力图金字塔
+导入或追加GPS数据后运行,gps表只追加了新数据时增量更新,否则全部重建;
+--full 强制全部重建
+'''
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.heatmap_pyramid import heatmap_pyramid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='统计GPS热力图金字塔')
+    parser.add_argument('--full', action='store_true', help='强制全部重建')
+    args = parser.parse_args()
+    try:
+        mode = heatmap_pyramid.refresh(full=args.full)
+    except Exception as e:
+        print(f"[ERROR] 统计热力图金字塔失败: {str(e)}")
+        sys.exit(1)
+    print(f"[SUCCESS] 热力图金字塔统计完成: {mode}")
@@ -0,0 +1,194 @@
+'''
+@zyh 2026-10-18
+检查几何计算的数组版本与逐点循环版本结果一致
+保留原有逐点循环实现作为参照,在随机生成的广告牌、建筑物和圆形区域上分别计算,
+比较 haversine距离、地面交点、圆形多边形、投影遮挡多边形和圆弧遮挡多边形,以及标量包装函数
+全部一致时返回0,否则输出不一致的项目并返回1
+'''
+import argparse
+import contextlib
+import io
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analysis.geometry import (haversine_distance, haversine_distances, calculate_ground_intersection,
+                               calculate_ground_intersections, points_at_distance, create_circle_polygon,
+                               create_IA_polygon, calculate_IA_arc)
+
+# 数组版本与逐点版本允许的误差(math与numpy的三角函数可能相差几个最低有效位)
+RTOL = 1e-9
+ATOL = 1e-12
+
+
+# ---------- 原有的逐点循环实现 ----------
+
+def loop_haversine_distance(lon1, lat1, lon2, lat2):
+    R = 6371000
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    return R * 2 * math.asin(math.sqrt(a))
+
+
+def loop_ground_intersection(billboard_pos, building_vertex, height):
+    x1, y1, z1 = billboard_pos
+    x2, y2 = building_vertex
+    z2 = height
+    if z1 == z2:
+        z2 = z2 - 1
+    t = -z1/(z2-z1)
+    return [x1 + t*(x2-x1), y1 + t*(y2-y1)]
+
+
+def loop_point_at_distance(center_lon, center_lat, angle, distance):
+    lat_offset = (distance * np.sin(angle)) / 111000
+    lon_offset = (distance * np.cos(angle)) / (111000 * np.cos(np.radians(center_lat)))
+    return [center_lon + lon_offset, center_lat + lat_offset]
+
+
+def loop_circle_polygon(center, radius, num_points=64):
+    coordinates = []
+    for i in range(num_points):
+        angle = (i * 2 * math.pi) / num_points
+        dx = radius * math.cos(angle)
+        dy = radius * math.sin(angle)
+        lat = center[1] + (dy / 111000)
+        lon = center[0] + (dx / (111000 * math.cos(math.radians(center[1]))))
+        coordinates.append([lon, lat])
+    coordinates.append(coordinates[0])
+    return coordinates
+
+
+def loop_IA_polygon(billboard_pos, building_vertices, height):
+    points_data = []
+    billboard_xy = np.array(billboard_pos[:2])
+    for vertex in building_vertices:
+        ground_point = loop_ground_intersection(billboard_pos, vertex, height)
+        vertex_vector = np.array(vertex) - billboard_xy
+        ground_vector = np.array(ground_point) - billboard_xy
+        points_data.append({
+            'vertex': vertex,
+            'ground_point': ground_point,
+            'vertex_angle': np.arctan2(vertex_vector[1], vertex_vector[0]),
+            'ground_angle': np.arctan2(ground_vector[1], ground_vector[0])
+        })
+    points_data.sort(key=lambda x: x['ground_angle'])
+    polygon_coords = [point_data['ground_point'] for point_data in points_data]
+    for point_data in sorted(points_data, key=lambda x: x['vertex_angle'], reverse=True):
+        polygon_coords.append(point_data['vertex'])
+    polygon_coords.append(polygon_coords[0])
+    return polygon_coords
+
+
+def loop_IA_arc(billboard_pos, building_points, circle_center, circle_radius):
+    arc_points = []
+    for building_point in building_points:
+        dx = loop_haversine_distance(billboard_pos[0], billboard_pos[1], building_point[0], billboard_pos[1])
+        dy = loop_haversine_distance(billboard_pos[0], billboard_pos[1], billboard_pos[0], building_point[1])
+        if building_point[0] < billboard_pos[0]:
+            dx = -dx
+        if building_point[1] < billboard_pos[1]:
+            dy = -dy
+        angle = np.arctan2(dy, dx)
+        distance_to_center = loop_haversine_distance(billboard_pos[0], billboard_pos[1],
+                                                     circle_center[0], circle_center[1])
+        dx_center = loop_haversine_distance(billboard_pos[0], billboard_pos[1], circle_center[0], billboard_pos[1])
+        dy_center = loop_haversine_distance(billboard_pos[0], billboard_pos[1], billboard_pos[0], circle_center[1])
+        if circle_center[0] < billboard_pos[0]:
+            dx_center = -dx_center
+        if circle_center[1] < billboard_pos[1]:
+            dy_center = -dy_center
+        angle_to_center = np.arctan2(dy_center, dx_center)
+        d = distance_to_center * np.sin(angle - angle_to_center)
+        if abs(d) <= circle_radius:
+            arc_points.append({'building_point': building_point, 'angle': angle})
+
+    if len(arc_points) < 2:
+        return None
+    arc_points.sort(key=lambda x: x['angle'])
+    occlusion_polygon = [arc_points[0]['building_point']]
+    start_angle = arc_points[0]['angle']
+    end_angle = arc_points[-1]['angle']
+    if end_angle < start_angle:
+        end_angle += 2*np.pi
+    num_points = 32
+    for i in range(num_points + 1):
+        angle = start_angle + i*(end_angle-start_angle)/num_points
+        occlusion_polygon.append(loop_point_at_distance(circle_center[0], circle_center[1], angle, circle_radius))
+    occlusion_polygon.append(arc_points[-1]['building_point'])
+    occlusion_polygon.append(occlusion_polygon[0])
+    return occlusion_polygon
+
+
+# ---------- 比较 ----------
+
+def _close(expected, actual):
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    expected, actual = np.asarray(expected, dtype=float), np.asarray(actual, dtype=float)
+    return expected.shape == actual.shape and np.allclose(expected, actual, rtol=RTOL, atol=ATOL)
+
+
+def check(trials, seed=0):
+    rng = np.random.default_rng(seed)
+    failures = {}
+
+    def compare(name, expected, actual):
+        if not _close(expected, actual):
+            failures[name] = failures.get(name, 0) + 1
+
+    for _ in range(trials):
+        # 北京范围内的广告牌、建筑物和曝光圆形区域
+        lon, lat = rng.uniform(116.2, 116.6), rng.uniform(39.8, 40.0)
+        billboard = [lon, lat, rng.uniform(5, 80)]
+        count = rng.integers(3, 12)
+        vertices = np.column_stack([lon + rng.uniform(-0.003, 0.003, count),
+                                    lat + rng.uniform(-0.003, 0.003, count)]).tolist()
+        height = rng.choice([rng.uniform(1, 100), billboard[2]])
+        circle_center = [lon + rng.uniform(-0.004, 0.004), lat + rng.uniform(-0.004, 0.004)]
+        circle_radius = rng.uniform(50, 500)
+
+        points = np.asarray(vertices)
+        compare('haversine_distances',
+                [loop_haversine_distance(lon, lat, x, y) for x, y in vertices],
+                haversine_distances(lon, lat, points[:, 0], points[:, 1]))
+        compare('haversine_distance',
+                loop_haversine_distance(lon, lat, *vertices[0]), haversine_distance(lon, lat, *vertices[0]))
+        compare('calculate_ground_intersections',
+                [loop_ground_intersection(billboard, vertex, height) for vertex in vertices],
+                calculate_ground_intersections(billboard, vertices, height))
+        compare('calculate_ground_intersection',
+                loop_ground_intersection(billboard, vertices[0], height),
+                calculate_ground_intersection(billboard, vertices[0], height))
+        angles = rng.uniform(-np.pi, np.pi, 16)
+        compare('points_at_distance',
+                [loop_point_at_distance(*circle_center, angle, circle_radius) for angle in angles],
+                points_at_distance(*circle_center, angles, circle_radius))
+        compare('create_circle_polygon',
+                loop_circle_polygon(circle_center, circle_radius), create_circle_polygon(circle_center, circle_radius))
+        compare('create_IA_polygon',
+                loop_IA_polygon(billboard, vertices, height), create_IA_polygon(billboard, vertices, height))
+        compare('calculate_IA_arc',
+                loop_IA_arc(billboard[:2], vertices, circle_center, circle_radius),
+                calculate_IA_arc(billboard[:2], vertices, circle_center, circle_radius))
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='检查几何计算的数组版本与逐点循环版本结果一致')
+    parser.add_argument('--trials', type=int, default=1000, help='随机测试次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+    # 几何计算函数会输出调试信息,检查时不显示
+    with contextlib.redirect_stdout(io.StringIO()):
+        failures = check(args.trials, args.seed)
+    if failures:
+        for name, count in failures.items():
+            print(f"[ERROR] {name}: {count}/{args.trials} 次结果不一致")
+        sys.exit(1)
+    print(f"[SUCCESS] {args.trials} 次随机测试中数组版本与逐点版本结果全部一致")
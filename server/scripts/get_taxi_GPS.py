@@ -4,12 +4,13 @@
 已知大量出租车txt文件，每个txt文件中包含一个时间段内的出租车GPS数据
 1,2008-02-02 15:36:08,116.51172,39.92123
 已知北京东城区的geojson文件，筛选出位于该区域的出租车GPS数据
+大批量处理请使用 ingest_taxi_GPS.py (多进程并行,按日期分区输出)
 '''
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
 
-def filter_taxi_GPS(txt_file, geojson_file, output_file):
+def filter_taxi_GPS(txt_file, geojson_file, output_file, write_header=False):
     '''
     筛选出位于指定区域内的出租车GPS数据
     '''
@@ -25,8 +26,8 @@ def filter_taxi_GPS(txt_file, geojson_file, output_file):
     # output_file: 输出文件路径
     # mode='a': 追加模式写入文件
     # index=False: 不保存DataFrame的索引
-    # header=not bool(i-1): 仅在第一次写入时(i=1)添加表头,后续追加时不再添加表头
-    filtered_gdf.to_csv(output_file, mode='a', index=False, header=not bool(i-1))
+    # header=write_header: 仅在第一次写入时添加表头,后续追加时不再添加表头
+    filtered_gdf.to_csv(output_file, mode='a', index=False, header=write_header)
 
 
 if __name__ == '__main__':
@@ -36,7 +37,7 @@ if __name__ == '__main__':
     geojson_file = 'data/beijing_dongcheng.geojson'
     for i in range(1, 10358):
         txt_file = f'data/taxi_GPS/{i}.txt'
-        filter_taxi_GPS(txt_file, geojson_file, output_file)
+        filter_taxi_GPS(txt_file, geojson_file, output_file, write_header=(i == 1))
         print(f'已处理{i}个txt文件')
     print('所有txt文件处理完毕')
 
@@ -6,8 +6,12 @@
 import psycopg2
 import json
 import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config.bulk_load import bulk_load_features
+
 def create_table():
     """创建geojson表"""
     conn = None
@@ -64,24 +68,17 @@ def import_geojson(file_path):
             host="localhost",
             port="5432"
         )
-        cursor = conn.cursor()
-        
-        # 清空现有数据
-        cursor.execute("TRUNCATE TABLE geojson;")
         
-        # 插入数据
-        for feature in geojson_data['features']:
-            geometry = json.dumps(feature['geometry'])
-            properties = json.dumps(feature['properties'])
-            height = feature['properties'].get('height', 0)
-            
-            insert_sql = """
-            INSERT INTO geojson (height, geometry, properties)
-            VALUES (%s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s::jsonb);
-            """
-            cursor.execute(insert_sql, (height, geometry, properties))
-        
-        conn.commit()
+        # 批量导入数据(替换现有数据)
+        bulk_load_features(
+            conn, 'geojson', geojson_data['features'],
+            columns=['height', 'geometry', 'properties'],
+            values_of=lambda feature: {
+                'height': feature['properties'].get('height', 0),
+                'properties': feature['properties']
+            },
+            geometry_type='MultiPolygon'
+        )
         print("数据导入成功！")
         
     except (psycopg2.Error, json.JSONDecodeError, FileNotFoundError) as e:
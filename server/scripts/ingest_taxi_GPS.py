@@ -0,0 +1,149 @@
+'''
+@zyh 2026-10-18
+并行筛选北京市东城区内的出租车GPS数据(T-Drive数据集)
+多进程并行读取大量出租车txt文件,每行格式为
+1,2008-02-02 15:36:08,116.51172,39.92123
+先按区域外包矩形粗筛,再用预处理(prepared)后的区域多边形做点在面内判断,
+结果按日期分区写出为列式文件(Parquet或Feather): 输出目录/date=2008-02-02/part-00000.parquet
+并实时输出处理进度和吞吐量
+'''
+import argparse
+from glob import glob
+import json
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# 子进程中使用的区域几何及其外包矩形
+_region = None
+_bounds = None
+
+
+def load_region(geojson_file):
+    """读取区域geojson文件,合并为一个几何"""
+    with open(geojson_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    geometries = shapely.from_geojson([json.dumps(feature['geometry']) for feature in data['features']])
+    return shapely.union_all(geometries)
+
+
+def init_worker(geojson_file):
+    global _region, _bounds
+    _region = load_region(geojson_file)
+    shapely.prepare(_region)
+    _bounds = _region.bounds
+
+
+def filter_file(txt_file):
+    '''
+    筛选单个txt文件中位于区域内的GPS点
+    OUTPUT:
+        (读取行数, 区域内的DataFrame)
+    '''
+    try:
+        df = pd.read_csv(txt_file, header=None, names=['taxi_id', 'timestamp', 'longitude', 'latitude'],
+                         dtype={'taxi_id': np.int32, 'longitude': np.float64, 'latitude': np.float64})
+    except pd.errors.EmptyDataError:
+        return 0, None
+    total = len(df)
+
+    # 外包矩形粗筛
+    min_lon, min_lat, max_lon, max_lat = _bounds
+    lon = df['longitude'].to_numpy()
+    lat = df['latitude'].to_numpy()
+    in_box = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+    df = df[in_box]
+    if df.empty:
+        return total, None
+
+    # 点在多边形内的精确判断
+    inside = shapely.contains_xy(_region, df['longitude'].to_numpy(), df['latitude'].to_numpy())
+    df = df[inside]
+    if df.empty:
+        return total, None
+    df = df.assign(timestamp=pd.to_datetime(df['timestamp'], errors='coerce')).dropna(subset=['timestamp'])
+    return total, df
+
+
+class PartitionWriter:
+    """按日期分区缓存并写出列式文件"""
+    def __init__(self, output_dir, file_format='parquet', flush_rows=1_000_000):
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.flush_rows = flush_rows
+        self.buffers = {}
+        self.buffered_rows = {}
+        self.part_numbers = {}
+        self.written_rows = 0
+
+    def add(self, df):
+        for day, part in df.groupby(df['timestamp'].dt.date):
+            self.buffers.setdefault(day, []).append(part)
+            self.buffered_rows[day] = self.buffered_rows.get(day, 0) + len(part)
+            if self.buffered_rows[day] >= self.flush_rows:
+                self.flush(day)
+
+    def flush(self, day):
+        parts = self.buffers.pop(day, [])
+        self.buffered_rows.pop(day, None)
+        if not parts:
+            return
+        df = pd.concat(parts, ignore_index=True).sort_values(['taxi_id', 'timestamp'])
+        partition_dir = os.path.join(self.output_dir, f"date={day.isoformat()}")
+        os.makedirs(partition_dir, exist_ok=True)
+        number = self.part_numbers.get(day, 0)
+        self.part_numbers[day] = number + 1
+        path = os.path.join(partition_dir, f"part-{number:05d}.{self.file_format}")
+        if self.file_format == 'feather':
+            df.reset_index(drop=True).to_feather(path)
+        else:
+            df.to_parquet(path, index=False)
+        self.written_rows += len(df)
+
+    def close(self):
+        for day in list(self.buffers):
+            self.flush(day)
+
+
+def ingest(input_dir, geojson_file, output_dir, workers=None, file_format='parquet', report_every=100):
+    txt_files = sorted(glob(os.path.join(input_dir, '*.txt')),
+                       key=lambda path: (len(os.path.basename(path)), os.path.basename(path)))
+    if not txt_files:
+        print(f"[ERROR] 在 {input_dir} 中找不到txt文件")
+        return
+
+    workers = workers or os.cpu_count()
+    print(f"[INFO] 共 {len(txt_files)} 个txt文件, 使用 {workers} 个进程")
+    writer = PartitionWriter(output_dir, file_format)
+    start_time = time.time()
+    total_rows = kept_rows = 0
+
+    with Pool(workers, initializer=init_worker, initargs=(geojson_file,)) as pool:
+        for done, (rows, df) in enumerate(pool.imap_unordered(filter_file, txt_files, chunksize=16), 1):
+            total_rows += rows
+            if df is not None:
+                kept_rows += len(df)
+                writer.add(df)
+            if done % report_every == 0 or done == len(txt_files):
+                elapsed = time.time() - start_time
+                print(f"[INFO] 已处理 {done}/{len(txt_files)} 个文件, "
+                      f"读取 {total_rows} 行, 保留 {kept_rows} 行, "
+                      f"{done / elapsed:.1f} 文件/秒, {total_rows / elapsed:.0f} 行/秒")
+
+    writer.close()
+    print(f"[SUCCESS] 处理完毕, 共写出 {writer.written_rows} 行到 {output_dir}, 耗时: {time.time() - start_time:.2f} 秒")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='并行筛选区域内的出租车GPS数据')
+    parser.add_argument('--input-dir', default='data/taxi_GPS', help='T-Drive txt文件目录')
+    parser.add_argument('--region', default='data/beijing_dongcheng.geojson', help='区域geojson文件')
+    parser.add_argument('--output', default='data/taxi_GPS_dongcheng', help='输出目录(按日期分区)')
+    parser.add_argument('--workers', type=int, default=None, help='进程数,默认为CPU核数')
+    parser.add_argument('--format', choices=['parquet', 'feather'], default='parquet', help='输出文件格式')
+    args = parser.parse_args()
+    ingest(args.input_dir, args.region, args.output, args.workers, args.format)
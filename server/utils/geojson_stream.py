@@ -0,0 +1,44 @@
+'''
+@zyh 2026-10-18
+GeoJSON流式输出
+数据库逐行返回 ST_AsGeoJSON 文本和属性JSON文本,直接拼接进FeatureCollection输出流,
+不在Python中解析再序列化,内存占用与图层大小无关
+'''
+from itertools import chain
+
+from flask import Response
+
+
+def stream_feature_collection(rows, chunk_size=500):
+    """
+    将 (geometry文本, properties文本) 行拼接为FeatureCollection文本片段
+    rows: 可迭代的行,通常来自 Database.stream_rows
+    chunk_size: 每次输出的要素数
+    """
+    rows = iter(rows)
+    # 先取第一行再输出头部,查询出错时可以在开始响应前抛出异常
+    first = next(rows, None)
+    yield '{"type": "FeatureCollection", "features": ['
+    if first is None:
+        yield ']}'
+        return
+
+    buffer = []
+    for i, (geometry, properties) in enumerate(chain([first], rows)):
+        buffer.append('%s{"type": "Feature", "geometry": %s, "properties": %s}'
+                      % (',' if i else '', geometry or 'null', properties or 'null'))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    buffer.append(']}')
+    yield ''.join(buffer)
+
+
+def geojson_stream_response(rows, chunk_size=500):
+    """
+    生成流式GeoJSON响应
+    查询在返回响应前执行,出错时抛出异常,由调用方按原有方式返回错误信息
+    """
+    chunks = stream_feature_collection(rows, chunk_size)
+    head = next(chunks)
+    return Response(chain([head], chunks), mimetype='application/json')
@@ -0,0 +1,37 @@
+'''
+@zyh 2026-10-18
+NDJSON流式输出
+每条记录序列化为一行JSON,客户端可以边接收边逐行解析,内存占用与结果大小无关
+'''
+from itertools import chain
+import json
+
+from flask import Response
+
+
+def stream_ndjson(records, chunk_size=1000):
+    """
+    将记录逐行序列化为NDJSON文本片段
+    records: 可JSON序列化的记录,通常由 Database.stream_rows 的结果转换而来
+    chunk_size: 每次输出的行数
+    """
+    buffer = []
+    for record in records:
+        buffer.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        if len(buffer) >= chunk_size:
+            buffer.append('')
+            yield '\n'.join(buffer)
+            buffer = []
+    if buffer:
+        buffer.append('')
+        yield '\n'.join(buffer)
+
+
+def ndjson_stream_response(records, chunk_size=1000):
+    """
+    生成流式NDJSON响应
+    先取出第一个片段,查询出错时在开始响应前抛出异常,由调用方按原有方式返回错误信息
+    """
+    chunks = stream_ndjson(records, chunk_size)
+    head = next(chunks, '')
+    return Response(chain([head], chunks), mimetype='application/x-ndjson')
@@ -0,0 +1,151 @@
+'''
+@zyh 2026-10-18
+图层接口响应缓存
+按 (接口路径, 请求参数, 数据表版本) 缓存序列化后的响应体及其gzip压缩结果,
+超出字节上限时按LRU淘汰,并支持 ETag / If-None-Match 返回304
+'''
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import Response, request
+
+from config.database import Database
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'gzip_body', 'etag', 'mimetype'])
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, version_check_interval=5.0):
+        '''
+        max_bytes: 缓存的响应体总字节数上限(原始+压缩)
+        version_check_interval: 数据表版本的缓存时间(秒),避免每个请求都查询数据库
+        '''
+        self.max_bytes = max_bytes
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._size = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry.body) + len(entry.gzip_body)
+
+    def table_version(self, db, table_name, key_column='id'):
+        """获取数据表版本,短时间内重复查询直接返回缓存值"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(table_name)
+        if cached is not None and now - cached[1] < self.version_check_interval:
+            return cached[0]
+        version = db.get_table_version(table_name, key_column)
+        with self._lock:
+            self._versions[table_name] = (version, now)
+        return version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        entry = CachedResponse(
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=6),
+            etag=hashlib.sha1(body).hexdigest(),
+            mimetype=mimetype,
+        )
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= self._entry_size(old)
+            self._entries[key] = entry
+            self._size += size
+            # 超出上限时淘汰最久未使用的条目
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self._entry_size(evicted)
+                self._stats["evictions"] += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def respond(self, entry):
+        """根据 If-None-Match 和 Accept-Encoding 生成响应"""
+        if request.if_none_match.contains(entry.etag):
+            with self._lock:
+                self._stats["not_modified"] += 1
+            response = Response(status=304)
+        elif 'gzip' in request.accept_encodings:
+            response = Response(entry.gzip_body, mimetype=entry.mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # 浏览器可以缓存,但每次使用前需要用ETag向服务器确认
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+# 全局共享的响应缓存
+response_cache = ResponseCache()
+
+
+def cached_layer(table_name, key_column='id'):
+    '''
+    图层接口缓存装饰器
+    table_name: 图层数据所在的数据表,也可以是根据路由参数返回 (表名, 主键列) 的函数,
+                函数返回的表名为None时(如未知的图层)不使用缓存,直接交给接口处理
+    只缓存状态码为200的非流式响应,表数据变化后版本号改变,旧条目自然失效
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if callable(table_name):
+                table, column = table_name(**kwargs)
+            else:
+                table, column = table_name, key_column
+            if table is None:
+                return view(*args, **kwargs)
+            try:
+                version = response_cache.table_version(Database(), table, column)
+            except Exception as e:
+                print(f"[WARNING] 获取{table}表版本失败,跳过缓存: {str(e)}")
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), table, version)
+            entry = response_cache.get(key)
+            if entry is None:
+                response = view(*args, **kwargs)
+                if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = response_cache.put(key, response.get_data(), response.mimetype)
+            return response_cache.respond(entry)
+        return wrapper
+    return decorator